@@ -67,7 +67,9 @@ class Datasource:
 
     def on_connect(self, client, userdata, flags, rc):
         Logger.debug(f"Connected with result code {rc}")
-        self.client.subscribe("processed_agent_data")
+        # The edge publishes to processed_agent_data/<user_id % partitions>,
+        # or to plain processed_agent_data with partitioning disabled
+        self.client.subscribe([("processed_agent_data", 0), ("processed_agent_data/+", 0)])
 
     def on_message(self, client, userdata, msg):
         try:
@@ -82,7 +84,13 @@ class Datasource:
         
         if isinstance(data, str):
             data = json.loads(data)
-        
+
+        # The edge publishes batches as JSON arrays of records
+        if isinstance(data, list):
+            for record in data:
+                self.handle_received_data(record)
+            return
+
         if "road_state" in data and "agent_data" in data:
             agent_data = data["agent_data"]
             gps_data = agent_data.get("gps", {})
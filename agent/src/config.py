@@ -16,3 +16,6 @@ MQTT_TOPIC = os.environ.get("MQTT_TOPIC") or "agent"
 
 # Delay for sending data to mqtt in seconds
 DELAY = try_parse(float, os.environ.get("DELAY")) or 1
+
+# Serialization of published data: "json" or "msgpack"
+WIRE_FORMAT = os.environ.get("WIRE_FORMAT") or "json"
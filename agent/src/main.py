@@ -1,7 +1,7 @@
 from paho.mqtt import client as mqtt_client
 import json
 import time
-from schema.aggregated_data_schema import AggregatedDataSchema
+from schema import wire_format
 from file_datasource import FileDatasource
 import config
 
@@ -29,7 +29,7 @@ def publish(client, topic, datasource, delay):
     while True:
         time.sleep(delay)
         data = datasource.read()
-        msg = AggregatedDataSchema().dumps(data)
+        msg = wire_format.dumps(data, config.WIRE_FORMAT)
         result = client.publish(topic, msg)
         # result: [0, 1]
         status = result[0]
@@ -0,0 +1,29 @@
+from datetime import timezone
+
+import msgpack
+from domain.aggregated_data import AggregatedData
+from schema.aggregated_data_schema import AggregatedDataSchema
+
+# JSON stays the default. MessagePack uses a compact positional array:
+#   [user_id, x, y, z, latitude, longitude, timestamp]
+# with the timestamp as a MessagePack Timestamp (naive values are UTC).
+# Parking data is not part of it, as the edge does not use it.
+JSON = "json"
+MSGPACK = "msgpack"
+
+
+def dumps(data: AggregatedData, wire_format: str = JSON):
+    if wire_format != MSGPACK:
+        return AggregatedDataSchema().dumps(data)
+    timestamp = data.timestamp
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return msgpack.packb([
+        data.user_id,
+        data.accelerometer.x,
+        data.accelerometer.y,
+        data.accelerometer.z,
+        data.gps.latitude,
+        data.gps.longitude,
+        msgpack.Timestamp.from_datetime(timestamp),
+    ])
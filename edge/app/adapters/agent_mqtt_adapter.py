@@ -1,12 +1,32 @@
 import logging
+import threading
+from typing import Dict, List
+
 import paho.mqtt.client as mqtt
 from app.interfaces.agent_gateway import AgentGateway
-from app.entities.agent_data import AgentData, GpsData
-from app.usecases.data_processing import process_agent_data
+from app.adapters.wire_format import decode_agent_data, decode_agent_data_batch
 from app.interfaces.hub_gateway import HubGateway
+from app.usecases.event_compressor import EventCompressor
+from app.usecases.road_classifier import RoadClassifier
+from app.usecases.work_queue import BatchingWorkQueue, DROP_OLDEST
 
 
 class AgentMQTTAdapter(AgentGateway):
+    """
+    The MQTT network thread only puts agent messages on a bounded work
+    queue. A pool of workers takes them in micro-batches of up to
+    batch_size, at the latest max_linger seconds after the first one
+    arrived, validates each batch at once, classifies it with the
+    streaming road classifier and sends it to the hub gateway with a
+    single save_batch call, so a slow hub does not keep the client from
+    reading the socket. When queue_capacity messages
+    are waiting, overflow decides between blocking the network thread and
+    dropping messages (see app.usecases.work_queue). With a compressor
+    only readings that carry new information are sent. Workers validate
+    and send concurrently, but classify and compress one batch at a time
+    in arrival order, so per-user state sees every user's data in order.
+    """
+
     def __init__(
         self,
         broker_host,
@@ -14,8 +34,13 @@ class AgentMQTTAdapter(AgentGateway):
         topic,
         hub_gateway: HubGateway,
         batch_size=5,
+        max_linger=0.2,
+        workers=2,
+        queue_capacity=10000,
+        overflow=DROP_OLDEST,
+        classifier: RoadClassifier = None,
+        compressor: EventCompressor = None,
     ):
-        self.batch_size = batch_size
         # MQTT
         self.broker_host = broker_host
         self.broker_port = broker_port
@@ -23,6 +48,18 @@ class AgentMQTTAdapter(AgentGateway):
         self.client = mqtt.Client()
         # Hub
         self.hub_gateway = hub_gateway
+        # Keeps per-user state across batches
+        self.classifier = classifier or RoadClassifier()
+        self.compressor = compressor
+        # Receive -> processing
+        self.work_queue = BatchingWorkQueue(
+            self.process_batch,
+            capacity=queue_capacity,
+            overflow=overflow,
+            workers=workers,
+            batch_size=batch_size,
+            max_linger=max_linger,
+        )
 
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
@@ -32,22 +69,39 @@ class AgentMQTTAdapter(AgentGateway):
             logging.info(f"Failed to connect to MQTT broker with code: {rc}")
 
     def on_message(self, client, userdata, msg):
+        """Hand the message over to the workers"""
+        self.work_queue.put(msg.payload)
+
+    def process_batch(self, payloads: List[bytes]):
         """Processing agent data and sent it to hub gateway"""
         try:
-            payload: str = msg.payload.decode("utf-8")
-            # Create AgentData instance with the received data
-            agent_data = AgentData.model_validate_json(payload, strict=True)
-            # Process the received data (you can call a use case here if needed)
-            processed_data = process_agent_data(agent_data)
-
-          
-            # Store the agent_data in the database (you can send it to the data processing module)
-            if not self.hub_gateway.save_data(processed_data):
+            # Validate the whole batch at once (JSON or MessagePack)
+            agent_data_batch = decode_agent_data_batch(payloads)
+        except Exception:
+            # Find the invalid messages and keep the rest
+            agent_data_batch = []
+            for payload in payloads:
+                try:
+                    agent_data_batch.append(decode_agent_data(payload))
+                except Exception as e:
+                    logging.info(f"Error processing MQTT message: {e}")
+        if not agent_data_batch:
+            return
+        try:
+            # The classifier and the compressor keep per-user state, so they
+            # get the batches in the order the messages arrived
+            with self.work_queue.in_order():
+                processed_data_batch = self.classifier.process_batch(agent_data_batch)
+                if self.compressor is not None:
+                    processed_data_batch = self.compressor.compress(processed_data_batch)
+            if not processed_data_batch:
+                return
+            if not self.hub_gateway.save_batch(processed_data_batch):
                 logging.error("Hub is not available")
             else:
-                logging.info("Data sent to Hub successfully")
+                logging.info(f"Sent {len(processed_data_batch)} records to Hub successfully")
         except Exception as e:
-            logging.info(f"Error processing MQTT message: {e}")
+            logging.info(f"Error sending data to Hub: {e}")
 
     def connect(self):
         self.client.on_connect = self.on_connect
@@ -55,26 +109,41 @@ class AgentMQTTAdapter(AgentGateway):
         self.client.connect(self.broker_host, self.broker_port, 60)
 
     def start(self):
+        self.work_queue.start()
         self.client.loop_start()
 
     def stop(self):
+        """Stop receiving; returns once the messages already received are sent."""
+        self.client.disconnect()
         self.client.loop_stop()
+        self.work_queue.stop()
+
+    def is_ready(self) -> bool:
+        return self.client.is_connected()
+
+    def metrics(self) -> Dict[str, float]:
+        metrics = self.work_queue.metrics()
+        if self.compressor is not None:
+            metrics["forwarded_total"] = self.compressor.forwarded
+            metrics["suppressed_total"] = self.compressor.suppressed
+        return metrics
 
 
 # Usage example:
 if __name__ == "__main__":
+    from app.adapters.hub_http_adapter import HubHttpAdapter
+
     broker_host = "localhost"
     broker_port = 1883
     topic = "agent_data_topic"
-    # Assuming you have implemented the StoreGateway and passed it to the adapter
-    store_gateway = HubGateway()
-    adapter = AgentMQTTAdapter(broker_host, broker_port, topic, store_gateway)
+    hub_gateway = HubHttpAdapter("http://localhost:12000")
+    adapter = AgentMQTTAdapter(broker_host, broker_port, topic, hub_gateway)
     adapter.connect()
     adapter.start()
     try:
-        # Keep the adapter running in the background
-        while True:
-            pass
+        # Sleep until interrupted instead of spinning
+        threading.Event().wait()
     except KeyboardInterrupt:
         adapter.stop()
+        hub_gateway.close()
         logging.info("Adapter stopped.")
@@ -0,0 +1,103 @@
+import logging
+import threading
+import time
+from typing import Dict, List
+
+from app.adapters.offline_buffer import OfflineBuffer
+from app.adapters.wire_format import decode_processed_agent_data_batch, encode_processed_agent_data
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.hub_gateway import HubGateway
+
+
+class BufferedHubAdapter(HubGateway):
+    """
+    Store-and-forward in front of another hub gateway (HubMqttAdapter or
+    HubHttpAdapter). Data the gateway fails to send, by returning False or
+    raising, goes to an OfflineBuffer on disk instead of being lost. After
+    a failure the gateway is left alone for retry_interval seconds. A
+    background thread sends the backlog in batches of drain_batch once
+    the hub is back. While there is a backlog new data is appended to it,
+    so the hub gets everything in order.
+    """
+
+    def __init__(
+        self,
+        gateway: HubGateway,
+        buffer: OfflineBuffer,
+        drain_batch: int = 500,
+        retry_interval: float = 5.0,
+    ):
+        self.gateway = gateway
+        self.buffer = buffer
+        self.drain_batch = drain_batch
+        self.retry_interval = retry_interval
+        self._retry_at = 0.0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="hub-buffer-drain", daemon=True)
+        self._thread.start()
+
+    def save_data(self, processed_data: ProcessedAgentData) -> bool:
+        return self.save_batch([processed_data])
+
+    def save_batch(self, processed_data_batch: List[ProcessedAgentData]) -> bool:
+        """
+        Send the data to the Hub, or buffer it for later.
+        Returns:
+            bool: True if the data is sent, False if it was buffered.
+        """
+        if not self.buffer.pending_records and time.monotonic() >= self._retry_at:
+            if self._send(processed_data_batch):
+                return True
+        self.buffer.append([encode_processed_agent_data(processed_data) for processed_data in processed_data_batch])
+        logging.warning(
+            f"Buffered {len(processed_data_batch)} records for the Hub, {self.buffer.pending_records} pending"
+        )
+        return False
+
+    def drain(self) -> int:
+        """Send one batch of the backlog; the number sent, 0 on failure."""
+        payloads, last_id = self.buffer.peek(self.drain_batch)
+        if not payloads:
+            return 0
+        try:
+            processed_data_batch = decode_processed_agent_data_batch(payloads)
+        except ValueError as e:
+            # Would block the backlog forever
+            logging.error(f"Dropping {len(payloads)} unreadable buffered records: {e}")
+            self.buffer.commit(last_id)
+            return 0
+        if not self._send(processed_data_batch):
+            return 0
+        self.buffer.commit(last_id)
+        return len(payloads)
+
+    def metrics(self) -> Dict[str, float]:
+        return {"backlog_records": self.buffer.pending_records, "backlog_bytes": self.buffer.pending_bytes}
+
+    def is_ready(self) -> bool:
+        return self.gateway.is_ready()
+
+    def close(self):
+        # The backlog stays on disk for the next start
+        self._stopped.set()
+        self._thread.join()
+        self.gateway.close()
+        self.buffer.close()
+
+    def _send(self, processed_data_batch: List[ProcessedAgentData]) -> bool:
+        try:
+            if self.gateway.save_batch(processed_data_batch):
+                return True
+        except Exception as e:
+            logging.error(f"Error sending data to Hub: {e}")
+        self._retry_at = time.monotonic() + self.retry_interval
+        return False
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if time.monotonic() < self._retry_at or not self.buffer.pending_records:
+                self._stopped.wait(self.retry_interval)
+                continue
+            sent = self.drain()
+            if sent:
+                logging.info(f"Sent {sent} buffered records to Hub, {self.buffer.pending_records} left")
@@ -0,0 +1,78 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+
+class HealthServer:
+    """
+    Minimal HTTP health surface for orchestrators:
+      GET /health - 200 while the process is running
+      GET /ready  - 200 when every readiness check passes, 503 otherwise,
+                    with the result of each check as JSON
+      GET /metrics - current values of metrics as JSON, e.g. queue depth
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        checks: Dict[str, Callable[[], bool]],
+        metrics: Optional[Callable[[], Dict[str, float]]] = None,
+    ):
+        self.checks = checks
+        self.metrics = metrics
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def ready(self) -> Dict[str, bool]:
+        results = {}
+        for name, check in self.checks.items():
+            try:
+                results[name] = bool(check())
+            except Exception:
+                results[name] = False
+        return results
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="health-server", daemon=True)
+        self._thread.start()
+        logging.info(f"Health server listening on port {self._server.server_address[1]}")
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _handler(self):
+        health_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/health":
+                    self._respond(200, {"status": "ok"})
+                elif self.path == "/ready":
+                    checks = health_server.ready()
+                    self._respond(200 if all(checks.values()) else 503, checks)
+                elif self.path == "/metrics":
+                    self._respond(200, health_server.metrics() if health_server.metrics else {})
+                else:
+                    self._respond(404, {"detail": "Not Found"})
+
+            def _respond(self, status: int, body: dict):
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                # Probes every few seconds would flood the log
+                pass
+
+        return Handler
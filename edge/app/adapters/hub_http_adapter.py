@@ -2,13 +2,27 @@ import logging
 
 import requests as requests
 
+from typing import List, Optional, Tuple
+
+from app.adapters.wire_format import (
+    CONTENT_TYPES,
+    JSON,
+    encode_processed_agent_data,
+    encode_processed_agent_data_batch,
+)
 from app.entities.processed_agent_data import ProcessedAgentData
 from app.interfaces.hub_gateway import HubGateway
 
 
 class HubHttpAdapter(HubGateway):
-    def __init__(self, api_base_url):
+    def __init__(self, api_base_url, wire_format=JSON, timeout: Tuple[float, float] = (3.0, 10.0)):
         self.api_base_url = api_base_url
+        self.wire_format = wire_format
+        # (connect, read) seconds; a Hub that does not answer in time counts
+        # as a failed delivery, so the data is buffered instead of blocking a worker
+        self.timeout = timeout
+        # Keep-alive connection reused for every request
+        self.session = requests.Session()
 
     def save_data(self, processed_data: ProcessedAgentData):
         """
@@ -20,11 +34,44 @@ class HubHttpAdapter(HubGateway):
         """
         url = f"{self.api_base_url}/processed_agent_data/"
 
-        response = requests.post(url, data=processed_data.model_dump_json())
-        
+        response = self._post(url, encode_processed_agent_data(processed_data, self.wire_format))
+        if response is None:
+            return False
         if response.status_code != 200:
             logging.info(
                 f"Invalid Hub response\nData: {processed_data.model_dump_json()}\nResponse: {response}"
             )
             return False
         return True
+
+    def save_batch(self, processed_data_batch: List[ProcessedAgentData]):
+        """
+        Save several processed road data to the Hub in one request.
+        Parameters:
+            processed_data_batch (List[ProcessedAgentData]): Processed road data to be saved.
+        Returns:
+            bool: True if the data is successfully saved, False otherwise.
+        """
+        url = f"{self.api_base_url}/processed_agent_data/batch"
+        response = self._post(url, encode_processed_agent_data_batch(processed_data_batch, self.wire_format))
+        if response is None:
+            return False
+        if response.status_code != 200:
+            logging.info(f"Invalid Hub response for a batch of {len(processed_data_batch)}\nResponse: {response}")
+            return False
+        return True
+
+    def _post(self, url: str, data: bytes) -> Optional[requests.Response]:
+        try:
+            return self.session.post(
+                url,
+                data=data,
+                headers={"Content-Type": CONTENT_TYPES[self.wire_format]},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            logging.error(f"Error sending data to Hub: {e}")
+            return None
+
+    def close(self):
+        self.session.close()
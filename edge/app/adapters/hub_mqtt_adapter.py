@@ -1,17 +1,24 @@
 import logging
+from collections import defaultdict
+from typing import List
 
 import requests as requests
 from paho.mqtt import client as mqtt_client
 
+from app.adapters.wire_format import JSON, encode_processed_agent_data, encode_processed_agent_data_batch
 from app.entities.processed_agent_data import ProcessedAgentData
 from app.interfaces.hub_gateway import HubGateway
 
 
 class HubMqttAdapter(HubGateway):
-    def __init__(self, broker, port, topic):
+    def __init__(self, broker, port, topic, wire_format=JSON, partitions=0):
         self.broker = broker
         self.port = port
         self.topic = topic
+        self.wire_format = wire_format
+        # Data of a vehicle always goes to <topic>/<user_id % partitions>, so
+        # the Hub can spread partitions over workers and keep per-vehicle order
+        self.partitions = partitions
         self.mqtt_client = self._connect_mqtt(broker, port)
 
     def save_data(self, processed_data: ProcessedAgentData):
@@ -22,16 +29,48 @@ class HubMqttAdapter(HubGateway):
         Returns:
             bool: True if the data is successfully saved, False otherwise.
         """
-        msg = processed_data.model_dump_json()
+        msg = encode_processed_agent_data(processed_data, self.wire_format)
        
-        result = self.mqtt_client.publish(self.topic, msg)
+        return self._publish(self._topic(processed_data.agent_data.user_id), msg)
+
+    def save_batch(self, processed_data_batch: List[ProcessedAgentData]):
+        """
+        Save several processed road data to the Hub, one message per partition.
+        Parameters:
+            processed_data_batch (List[ProcessedAgentData]): Processed road data to be saved.
+        Returns:
+            bool: True if all the data is successfully saved, False otherwise.
+        """
+        by_topic = defaultdict(list)
+        for processed_data in processed_data_batch:
+            by_topic[self._topic(processed_data.agent_data.user_id)].append(processed_data)
+        return all([
+            self._publish(topic, encode_processed_agent_data_batch(batch, self.wire_format))
+            for topic, batch in by_topic.items()
+        ])
+
+    def _topic(self, user_id: int) -> str:
+        if self.partitions:
+            return f"{self.topic}/{user_id % self.partitions}"
+        return self.topic
+
+    def _publish(self, topic: str, msg) -> bool:
+        result = self.mqtt_client.publish(topic, msg)
         status = result[0]
         if status == 0:
             return True
         else:
-            print(f"Failed to send message to topic {self.topic}")
+            print(f"Failed to send message to topic {topic}")
             return False
 
+    def is_ready(self) -> bool:
+        return self.mqtt_client.is_connected()
+
+    def close(self):
+        # Messages published before the disconnect are still sent
+        self.mqtt_client.disconnect()
+        self.mqtt_client.loop_stop()
+
     @staticmethod
     def _connect_mqtt(broker, port):
         """Create MQTT client"""
@@ -46,6 +85,8 @@ class HubMqttAdapter(HubGateway):
 
         client = mqtt_client.Client()
         client.on_connect = on_connect
-        client.connect(broker, port)
+        # Connects (and reconnects) in the network loop, so the edge also
+        # starts while the broker is unreachable
+        client.connect_async(broker, port)
         client.loop_start()
         return client
@@ -0,0 +1,89 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import List, Tuple
+
+
+class OfflineBuffer:
+    """
+    Bounded FIFO of serialized records on disk, in an SQLite database in
+    WAL mode, so appends are cheap and survive a crash or a restart.
+    When the records take more than max_bytes, the oldest are deleted;
+    SQLite reuses the freed pages, so the file stays about that size,
+    plus a write-ahead log of up to a few MB.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Used by the edge workers and the drain thread, always under the lock
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # Committed records survive a crash of the process, a power loss may
+        # cost the last ones
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        # Truncates the write-ahead log back after a burst of writes
+        self._connection.execute(f"PRAGMA journal_size_limit={4 * 1024 * 1024}")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS backlog (id INTEGER PRIMARY KEY AUTOINCREMENT, payload BLOB NOT NULL)"
+        )
+        self.pending_records, self.pending_bytes = self._connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM backlog"
+        ).fetchone()
+        if self.pending_records:
+            logging.info(f"Recovered {self.pending_records} buffered records from {path}")
+
+    def append(self, payloads: List[bytes]):
+        with self._lock:
+            # One transaction, i.e. one sync, per batch
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT INTO backlog (payload) VALUES (?)", [(payload,) for payload in payloads]
+                )
+            self.pending_records += len(payloads)
+            self.pending_bytes += sum(len(payload) for payload in payloads)
+            if self.pending_bytes > self.max_bytes:
+                self._drop_oldest()
+
+    def peek(self, max_records: int) -> Tuple[List[bytes], int]:
+        """Up to max_records oldest records and the id of the last one."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, payload FROM backlog ORDER BY id LIMIT ?", (max_records,)
+            ).fetchall()
+        return [payload for _, payload in rows], rows[-1][0] if rows else 0
+
+    def commit(self, last_id: int):
+        """Delete the records up to last_id (as returned by peek)."""
+        with self._lock:
+            self._delete_through(last_id)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _drop_oldest(self):
+        cursor = self._connection.execute("SELECT id, LENGTH(payload) FROM backlog ORDER BY id")
+        excess = self.pending_bytes - self.max_bytes
+        for last_id, size in cursor:
+            excess -= size
+            if excess <= 0:
+                break
+        cursor.close()
+        dropped = self._delete_through(last_id)
+        logging.error(f"Offline buffer is over {self.max_bytes} bytes, dropped the {dropped} oldest records")
+
+    def _delete_through(self, last_id: int) -> int:
+        with self._connection:
+            count, size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM backlog WHERE id <= ?", (last_id,)
+            ).fetchone()
+            self._connection.execute("DELETE FROM backlog WHERE id <= ?", (last_id,))
+        self.pending_records -= count
+        self.pending_bytes -= size
+        return count
@@ -0,0 +1,92 @@
+from datetime import datetime, timezone
+from typing import List
+
+import msgpack
+from pydantic import TypeAdapter
+
+from app.entities.agent_data import AgentData
+from app.entities.processed_agent_data import ProcessedAgentData
+
+# JSON stays the default. MessagePack uses compact positional arrays, with
+# timestamps as MessagePack Timestamps (naive values are UTC):
+#   agent data:     [user_id, x, y, z, latitude, longitude, timestamp]
+#   processed data: [road_state, user_id, x, y, z, latitude, longitude, timestamp]
+JSON = "json"
+MSGPACK = "msgpack"
+CONTENT_TYPES = {JSON: "application/json", MSGPACK: "application/msgpack"}
+
+# fixarray of 7 elements
+_AGENT_DATA_HEADER = b"\x97"
+
+_agent_data_batch = TypeAdapter(List[AgentData])
+_processed_agent_data_batch = TypeAdapter(List[ProcessedAgentData])
+
+
+def decode_agent_data(payload: bytes) -> AgentData:
+    """
+    MQTT has no content type, so the format is told by the first byte:
+    a MessagePack agent record starts with its array header.
+    """
+    if not payload.startswith(_AGENT_DATA_HEADER):
+        return AgentData.model_validate_json(payload, strict=True)
+    user_id, x, y, z, latitude, longitude, timestamp = msgpack.unpackb(payload, timestamp=3)
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.replace(tzinfo=None)
+    return AgentData.model_validate(
+        {
+            "user_id": user_id,
+            "accelerometer": {"x": x, "y": y, "z": z},
+            "gps": {"latitude": latitude, "longitude": longitude},
+            "timestamp": timestamp,
+        },
+        strict=True,
+    )
+
+
+def decode_agent_data_batch(payloads: List[bytes]) -> List[AgentData]:
+    """
+    Validate a batch of messages at once: JSON messages in a single
+    TypeAdapter pass over the list, others one by one. Raises ValueError
+    if any of them is invalid.
+    """
+    if any(payload.startswith(_AGENT_DATA_HEADER) for payload in payloads):
+        return [decode_agent_data(payload) for payload in payloads]
+    batch = _agent_data_batch.validate_json(b"[" + b",".join(payloads) + b"]", strict=True)
+    if len(batch) != len(payloads):
+        raise ValueError("Every message should hold exactly one record")
+    return batch
+
+
+def _processed_agent_data_values(processed_data: ProcessedAgentData) -> list:
+    agent_data = processed_data.agent_data
+    timestamp = agent_data.timestamp
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return [
+        processed_data.road_state,
+        agent_data.user_id,
+        agent_data.accelerometer.x,
+        agent_data.accelerometer.y,
+        agent_data.accelerometer.z,
+        agent_data.gps.latitude,
+        agent_data.gps.longitude,
+        msgpack.Timestamp.from_datetime(timestamp),
+    ]
+
+
+def encode_processed_agent_data(processed_data: ProcessedAgentData, wire_format: str = JSON) -> bytes:
+    if wire_format != MSGPACK:
+        return processed_data.model_dump_json().encode()
+    return msgpack.packb(_processed_agent_data_values(processed_data))
+
+
+def encode_processed_agent_data_batch(processed_data_batch: List[ProcessedAgentData], wire_format: str = JSON) -> bytes:
+    """A JSON array or a MessagePack array of records, as the Hub's batch endpoint takes."""
+    if wire_format != MSGPACK:
+        return _processed_agent_data_batch.dump_json(processed_data_batch)
+    return msgpack.packb([_processed_agent_data_values(processed_data) for processed_data in processed_data_batch])
+
+
+def decode_processed_agent_data_batch(payloads: List[bytes]) -> List[ProcessedAgentData]:
+    """Records encoded one by one as JSON with encode_processed_agent_data."""
+    return _processed_agent_data_batch.validate_json(b"[" + b",".join(payloads) + b"]")
@@ -1,15 +1,39 @@
+from typing import List
+
+import numpy as np
+
 from app.entities.agent_data import AgentData
 from app.entities.processed_agent_data import ProcessedAgentData
 
+# Upper bounds of |z| for "good" and "average" road; anything above is "poor".
+# In g; the streaming RoadClassifier applies them to the RMS of filtered z.
+GOOD_THRESHOLD = 0.05
+AVERAGE_THRESHOLD = 0.15
+
+
 def process_agent_data(agent_data: AgentData) -> ProcessedAgentData:
     z_acceleration = agent_data.accelerometer.z
      
-    if abs(z_acceleration) < 0.05:
+    if abs(z_acceleration) < GOOD_THRESHOLD:
         road_state = "good" 
-    elif abs(z_acceleration) < 0.15:
+    elif abs(z_acceleration) < AVERAGE_THRESHOLD:
         road_state = "average" 
     else:
         road_state = "poor" 
 
     processed_data = ProcessedAgentData(road_state=road_state, agent_data=agent_data)
     return processed_data
+
+
+def process_agent_data_batch(agent_data_batch: List[AgentData]) -> List[ProcessedAgentData]:
+    """Same classification as process_agent_data, in one vectorized pass over the batch."""
+    z_acceleration = np.abs(np.fromiter(
+        (agent_data.accelerometer.z for agent_data in agent_data_batch), dtype=np.float64, count=len(agent_data_batch)
+    ))
+    road_states = np.select(
+        [z_acceleration < GOOD_THRESHOLD, z_acceleration < AVERAGE_THRESHOLD], ["good", "average"], "poor"
+    )
+    return [
+        ProcessedAgentData(road_state=road_state, agent_data=agent_data)
+        for road_state, agent_data in zip(road_states.tolist(), agent_data_batch)
+    ]
@@ -0,0 +1,131 @@
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.usecases.road_classifier import BUMP, POTHOLE
+
+EARTH_RADIUS = 6371000.0  # m
+ANOMALIES = (POTHOLE, BUMP)
+
+
+def distance(start: Tuple[float, float], end: Tuple[float, float]) -> float:
+    """Metres between two (latitude, longitude) points, for short distances."""
+    latitude = math.radians((start[0] + end[0]) / 2)
+    north = math.radians(end[0] - start[0])
+    east = math.radians(end[1] - start[1]) * math.cos(latitude)
+    return EARTH_RADIUS * math.hypot(north, east)
+
+
+def heading(start: Tuple[float, float], end: Tuple[float, float]) -> float:
+    """Direction from start to end in degrees, clockwise from north."""
+    latitude = math.radians((start[0] + end[0]) / 2)
+    north = end[0] - start[0]
+    east = (end[1] - start[1]) * math.cos(latitude)
+    return math.degrees(math.atan2(east, north)) % 360
+
+
+class _Track:
+    """What the hub last got from a user."""
+
+    def __init__(self, road_state: str, sent_at: datetime, position: Tuple[float, float]):
+        self.road_state = road_state
+        self.sent_at = sent_at
+        self.position = position
+        self.heading: Optional[float] = None
+        # Last reading dropped since the hub got one, ends the current run
+        self.held: Optional[ProcessedAgentData] = None
+
+
+class EventCompressor:
+    """
+    Drops readings that tell the hub nothing new. Of each user's readings
+    only these are forwarded:
+      - the first one and, at every change of road state, the first and
+        last reading of the run, so the state of a dropped reading is
+        that of the last forwarded one before it and each run is drawn
+        to where it ended;
+      - anomalies (potholes and bumps), always;
+      - a heartbeat when nothing was forwarded for heartbeat_interval
+        seconds of data;
+      - the GPS track, decimated: a point max_distance metres from the
+        last forwarded one, or one where the heading turned by
+        heading_change degrees or more; moves under min_distance metres
+        are GPS noise and do not count as a turn.
+    State is kept for the max_users most recent users.
+    """
+
+    def __init__(
+        self,
+        heartbeat_interval: float = 30.0,
+        min_distance: float = 5.0,
+        max_distance: float = 100.0,
+        heading_change: float = 30.0,
+        max_users: int = 10000,
+    ):
+        self.heartbeat_interval = heartbeat_interval
+        self.min_distance = min_distance
+        self.max_distance = max_distance
+        self.heading_change = heading_change
+        self.max_users = max_users
+        self._tracks: "OrderedDict[int, _Track]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.forwarded = 0
+        self.suppressed = 0
+
+    def compress(self, processed_data_batch: List[ProcessedAgentData]) -> List[ProcessedAgentData]:
+        """The readings of the batch to forward, in their order."""
+        with self._lock:
+            forwarded = []
+            for processed_data in processed_data_batch:
+                forwarded.extend(self._forward(processed_data))
+            # A run's last reading may come from an earlier batch, where it was counted as suppressed
+            self.forwarded += len(forwarded)
+            self.suppressed += len(processed_data_batch) - len(forwarded)
+        return forwarded
+
+    def _forward(self, processed_data: ProcessedAgentData) -> List[ProcessedAgentData]:
+        """processed_data if it is forwarded, preceded by the end of the run it starts."""
+        agent_data = processed_data.agent_data
+        position = (agent_data.gps.latitude, agent_data.gps.longitude)
+        anomaly = processed_data.road_state in ANOMALIES
+        track = self._tracks.get(agent_data.user_id)
+        if track is None:
+            # Anomalies are not a road state; the next reading sets it
+            self._tracks[agent_data.user_id] = _Track(
+                None if anomaly else processed_data.road_state, agent_data.timestamp, position
+            )
+            if len(self._tracks) > self.max_users:
+                self._tracks.popitem(last=False)
+            return [processed_data]
+        self._tracks.move_to_end(agent_data.user_id)
+        moved = distance(track.position, position)
+        direction = heading(track.position, position) if moved >= self.min_distance else None
+        turned = (
+            direction is not None
+            and track.heading is not None
+            and abs((direction - track.heading + 180) % 360 - 180) >= self.heading_change
+        )
+        transition = not anomaly and processed_data.road_state != track.road_state
+        if not (
+            anomaly
+            or transition
+            or turned
+            or moved >= self.max_distance
+            or (agent_data.timestamp - track.sent_at).total_seconds() >= self.heartbeat_interval
+        ):
+            track.held = processed_data
+            return []
+        forwarded = [processed_data]
+        if transition and track.held is not None:
+            forwarded.insert(0, track.held)
+        track.held = None
+        if not anomaly:
+            track.road_state = processed_data.road_state
+        track.sent_at = agent_data.timestamp
+        track.position = position
+        if direction is not None:
+            track.heading = direction
+        return forwarded
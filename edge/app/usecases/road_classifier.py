@@ -0,0 +1,152 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from app.entities.agent_data import AgentData
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.usecases.data_processing import AVERAGE_THRESHOLD, GOOD_THRESHOLD
+
+GOOD = "good"
+AVERAGE = "average"
+POOR = "poor"
+# Road events, reported on the sample where they start, i.e. with its location
+POTHOLE = "pothole"
+BUMP = "bump"
+
+
+class RingBuffer:
+    """The last capacity samples of a stream, in a fixed NumPy array."""
+
+    def __init__(self, capacity: int, fill: float = 0.0):
+        self._data = np.full(max(capacity, 1), fill, dtype=np.float64)
+        # Where the next sample goes, i.e. the oldest one
+        self._next = 0
+
+    def extend(self, values: np.ndarray):
+        capacity = len(self._data)
+        if len(values) >= capacity:
+            self._data[:] = values[-capacity:]
+            self._next = 0
+            return
+        head = min(len(values), capacity - self._next)
+        self._data[self._next:self._next + head] = values[:head]
+        self._data[:len(values) - head] = values[head:]
+        self._next = (self._next + len(values)) % capacity
+
+    def last(self, count: int) -> np.ndarray:
+        """The newest count samples, oldest first."""
+        return self._data.take(np.arange(self._next - count, self._next), mode="wrap")
+
+
+class _Track:
+    """Filter and detector state of one user's stream."""
+
+    def __init__(self, first_z: float, high_pass_window: int, window: int):
+        # Starting from the first sample avoids a step at the start of the stream
+        self.raw = RingBuffer(high_pass_window - 1, fill=first_z)
+        self.filtered = RingBuffer(window - 1)
+        self.samples = 0
+        # Samples before this one belong to the event in progress
+        self.event_until = 0
+
+
+class RoadClassifier:
+    """
+    Streaming road classifier over the vertical (z) acceleration of each
+    user_id. A moving average over high_pass_window samples is subtracted
+    from z, which removes gravity and slow changes such as slopes and
+    turns. Over a sliding window of the last window filtered samples:
+      - RMS below GOOD_THRESHOLD g is "good", below AVERAGE_THRESHOLD g
+        "average", anything above "poor";
+      - a peak-to-peak of event_threshold g or more makes a "good"
+        window "average", as isolated jolts barely move the RMS.
+    A filtered sample of event_threshold g or more starts a road event,
+    which lasts until event_gap samples in a row stay below it. The first
+    sample of an event is labelled "pothole" if the road dropped away
+    first (acceleration below the baseline, relative to gravity) and
+    "bump" otherwise, so every event is reported once, with its location.
+
+    Samples are in units of scale per g, e.g. 16384 for the raw readings
+    of a +-2 g accelerometer. State is kept for the max_users most recent
+    users. Batches of a user are expected in time order.
+    """
+
+    def __init__(
+        self,
+        window: int = 32,
+        high_pass_window: int = 16,
+        event_threshold: float = 0.5,
+        event_gap: int = 8,
+        scale: float = 1.0,
+        max_users: int = 10000,
+    ):
+        self.window = window
+        self.high_pass_window = high_pass_window
+        self.event_gap = event_gap
+        self.max_users = max_users
+        self._good = GOOD_THRESHOLD * scale
+        self._average = AVERAGE_THRESHOLD * scale
+        self._event = event_threshold * scale
+        self._tracks: "OrderedDict[int, _Track]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def classify(self, user_id: int, z: np.ndarray) -> np.ndarray:
+        """Road state of each of the next samples of user_id."""
+        track = self._track(user_id, z[0])
+        # Trailing moving average, from cumulative sums over history + samples
+        raw = np.concatenate((track.raw.last(self.high_pass_window - 1), z))
+        sums = np.cumsum(raw)
+        window_sums = sums[self.high_pass_window - 1:] - np.concatenate(([0.0], sums[:-self.high_pass_window]))
+        baseline = window_sums / self.high_pass_window
+        filtered = z - baseline
+        windows = sliding_window_view(
+            np.concatenate((track.filtered.last(self.window - 1), filtered)), self.window
+        )
+        rms = np.sqrt(np.einsum("ij,ij->i", windows, windows) / self.window)
+        peak_to_peak = windows.max(axis=1) - windows.min(axis=1)
+        states = np.select([rms < self._good, rms < self._average], [GOOD, AVERAGE], POOR)
+        states[(states == GOOD) & (peak_to_peak >= self._event)] = AVERAGE
+        # Few samples cross the threshold, so events are tracked one by one
+        for index in np.flatnonzero(np.abs(filtered) >= self._event).tolist():
+            sample = track.samples + index
+            if sample >= track.event_until:
+                # With the sensor upside down gravity is negative
+                drop = filtered[index] < 0 if baseline[index] >= 0 else filtered[index] > 0
+                states[index] = POTHOLE if drop else BUMP
+            track.event_until = sample + self.event_gap + 1
+        track.raw.extend(z)
+        track.filtered.extend(filtered)
+        track.samples += len(z)
+        return states
+
+    def process_batch(self, agent_data_batch: List[AgentData]) -> List[ProcessedAgentData]:
+        by_user: Dict[int, List[int]] = {}
+        for index, agent_data in enumerate(agent_data_batch):
+            by_user.setdefault(agent_data.user_id, []).append(index)
+        road_states = [POOR] * len(agent_data_batch)
+        # Batches can be processed by several workers at once
+        with self._lock:
+            for user_id, indexes in by_user.items():
+                indexes.sort(key=lambda index: agent_data_batch[index].timestamp)
+                z = np.fromiter(
+                    (agent_data_batch[index].accelerometer.z for index in indexes), dtype=np.float64, count=len(indexes)
+                )
+                for index, road_state in zip(indexes, self.classify(user_id, z).tolist()):
+                    road_states[index] = road_state
+        return [
+            ProcessedAgentData(road_state=road_state, agent_data=agent_data)
+            for road_state, agent_data in zip(road_states, agent_data_batch)
+        ]
+
+    def _track(self, user_id: int, first_z: float) -> _Track:
+        track = self._tracks.get(user_id)
+        if track is None:
+            track = self._tracks[user_id] = _Track(first_z, self.high_pass_window, self.window)
+            if len(self._tracks) > self.max_users:
+                self._tracks.popitem(last=False)
+        else:
+            self._tracks.move_to_end(user_id)
+        return track
@@ -0,0 +1,192 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, List, Set
+
+# What put does when the queue is full
+BLOCK = "block"  # wait for space: back-pressure on the caller
+DROP_OLDEST = "drop_oldest"  # make room by discarding the oldest item
+DROP_NEWEST = "drop_newest"  # discard the new item
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+
+class BatchingWorkQueue:
+    """
+    Bounded FIFO queue between a producer (the MQTT network thread) and a
+    pool of worker threads. Workers take items in batches of up to
+    batch_size, at the latest max_linger seconds after the oldest one was
+    queued, and pass them to handler. When capacity items are waiting, the
+    overflow policy decides between blocking the producer and dropping.
+
+    With more than one worker, batches are handled concurrently and can
+    finish in any order. Stages that keep state across batches (e.g. per
+    user) run inside in_order(), which lets batches through one at a time
+    in the order they were taken.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List], None],
+        capacity: int = 10000,
+        overflow: str = DROP_OLDEST,
+        workers: int = 2,
+        batch_size: int = 50,
+        max_linger: float = 0.2,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow}, expected one of {OVERFLOW_POLICIES}")
+        self.handler = handler
+        self.capacity = capacity
+        self.overflow = overflow
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_linger = max_linger
+        self._items: Deque = deque()
+        self._first_queued = 0.0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._stopped = False
+        self._threads: List[threading.Thread] = []
+        # Batches are numbered as they are taken; _turn is the next one
+        # in_order() lets through, _done those that passed or skipped it
+        self._sequence = 0
+        self._turn = 0
+        self._done: Set[int] = set()
+        self._turn_changed = threading.Condition(self._lock)
+        self._local = threading.local()
+        # Metrics
+        self._dropped = 0
+        self._processed = 0
+        self._busy = 0
+        self._max_depth = 0
+
+    def put(self, item) -> bool:
+        """Queue an item; False if it or an older one had to be dropped."""
+        with self._lock:
+            accepted = True
+            if len(self._items) >= self.capacity:
+                if self.overflow == BLOCK:
+                    while len(self._items) >= self.capacity and not self._stopped:
+                        self._not_full.wait()
+                elif self.overflow == DROP_OLDEST:
+                    self._items.popleft()
+                    self._drop()
+                    accepted = False
+                else:
+                    self._drop()
+                    return False
+            if not self._items:
+                self._first_queued = time.monotonic()
+            self._items.append(item)
+            self._max_depth = max(self._max_depth, len(self._items))
+            # Wake a worker to start the linger timer or take a full batch
+            if len(self._items) == 1 or len(self._items) >= self.batch_size:
+                self._not_empty.notify()
+            return accepted
+
+    def metrics(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "queue_depth": len(self._items),
+                "queue_max_depth": self._max_depth,
+                "queue_capacity": self.capacity,
+                "dropped_total": self._dropped,
+                "processed_total": self._processed,
+                "busy_workers": self._busy,
+                "workers": self.workers,
+            }
+
+    @contextmanager
+    def in_order(self):
+        """
+        Run the enclosed block for the current batch after it has run for
+        every batch taken before it; use it in the handler, at most once
+        per batch.
+        """
+        sequence = self._local.sequence
+        with self._lock:
+            while self._turn != sequence:
+                self._turn_changed.wait()
+        try:
+            yield
+        finally:
+            self._pass(sequence)
+
+    def start(self):
+        self._stopped = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f"edge-worker-{index}", daemon=True)
+            for index in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Process what is queued, then stop the workers."""
+        with self._lock:
+            self._stopped = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _drop(self):
+        self._dropped += 1
+        if self._dropped % 1000 == 1:
+            logging.warning(f"Work queue is full ({self.capacity} items), {self._dropped} dropped so far")
+
+    def _next_batch(self) -> List:
+        """Wait until a batch is full or has lingered; empty once stopped and drained."""
+        with self._lock:
+            while not self._stopped:
+                if len(self._items) >= self.batch_size:
+                    break
+                if self._items:
+                    remaining = self._first_queued + self.max_linger - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._not_empty.wait(remaining)
+                else:
+                    self._not_empty.wait()
+            batch = [self._items.popleft() for _ in range(min(self.batch_size, len(self._items)))]
+            if self._items:
+                # The rest was queued later; this bounds its wait
+                self._first_queued = time.monotonic()
+                self._not_empty.notify()
+            if batch:
+                self._busy += 1
+                self._local.sequence = self._sequence
+                self._sequence += 1
+                self._not_full.notify_all()
+            return batch
+
+    def _pass(self, sequence: int):
+        with self._lock:
+            self._local.sequence = None
+            self._done.add(sequence)
+            # Also moves past later batches that skipped in_order()
+            while self._turn in self._done:
+                self._done.remove(self._turn)
+                self._turn += 1
+            self._turn_changed.notify_all()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            try:
+                self.handler(batch)
+            except Exception as e:
+                logging.error(f"Error processing a batch of {len(batch)}: {e}")
+            finally:
+                if self._local.sequence is not None:
+                    # The handler did not use in_order() for this batch
+                    self._pass(self._local.sequence)
+                with self._lock:
+                    self._busy -= 1
+                    self._processed += len(batch)
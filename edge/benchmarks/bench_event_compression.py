@@ -0,0 +1,95 @@
+"""
+Uplink reduction of the "events" forward mode (EventCompressor).
+
+Simulates vehicles driving at 10 Hz, mostly on good road with a few rough
+stretches, potholes, bumps and turns, classifies the readings with the
+RoadClassifier and reports:
+  readings  - readings classified
+  forwarded - readings the compressor lets through
+  bytes     - JSON bytes sent to the hub with and without compression
+  lost      - readings whose road state cannot be told from the forwarded
+              ones (the state of the last forwarded reading before them)
+
+Run from the edge directory:
+    python benchmarks/bench_event_compression.py
+"""
+import math
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.adapters.wire_format import encode_processed_agent_data  # noqa: E402
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData  # noqa: E402
+from app.usecases.event_compressor import ANOMALIES, EventCompressor  # noqa: E402
+from app.usecases.road_classifier import RoadClassifier  # noqa: E402
+
+USERS = 10
+MINUTES = 10
+RATE = 10  # readings per second
+SPEED = 15.0  # m/s
+BATCH_SIZE = 50
+SCALE = 16384.0
+
+
+def drive(user_id: int, rng: np.random.Generator):
+    count = MINUTES * 60 * RATE
+    noise = np.full(count, 0.01)
+    # Rough stretches of 20 to 60 seconds
+    for start in rng.integers(0, count, 4):
+        noise[start:start + rng.integers(20, 60) * RATE] = 0.2
+    z = SCALE * (1 + rng.normal(0, 1, count) * noise)
+    for start in rng.integers(0, count - 4, 15):
+        z[start:start + 4] += rng.choice([-1, 1]) * np.array([0.8, 1.0, 0.4, -0.5]) * SCALE
+    # Turns of 90 degrees every minute or so
+    headings = np.cumsum(np.where(rng.random(count) < 1 / (60 * RATE), math.pi / 2, 0.0))
+    step = SPEED / RATE / 6371000.0
+    latitudes = 50.45 + np.degrees(np.cumsum(np.cos(headings) * step))
+    longitudes = 30.52 + np.degrees(np.cumsum(np.sin(headings) * step) / math.cos(math.radians(50.45)))
+    started_at = datetime(2024, 1, 1)
+    return [
+        AgentData(
+            user_id=user_id,
+            accelerometer=AccelerometerData(x=0.0, y=0.0, z=z[index]),
+            gps=GpsData(latitude=latitudes[index], longitude=longitudes[index]),
+            timestamp=started_at + timedelta(seconds=index / RATE),
+        )
+        for index in range(count)
+    ]
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    drives = [drive(user_id, rng) for user_id in range(USERS)]
+    # Interleaved as they would arrive
+    readings = [agent_data for step in zip(*drives) for agent_data in step]
+    classifier = RoadClassifier(scale=SCALE)
+    compressor = EventCompressor()
+    processed, forwarded = [], []
+    elapsed = 0.0
+    for start in range(0, len(readings), BATCH_SIZE):
+        batch = classifier.process_batch(readings[start:start + BATCH_SIZE])
+        started = time.process_time()
+        forwarded.extend(compressor.compress(batch))
+        elapsed += time.process_time() - started
+        processed.extend(batch)
+    forwarded_ids = {id(processed_data) for processed_data in forwarded}
+    states, lost = {}, 0
+    for processed_data in processed:
+        user_id = processed_data.agent_data.user_id
+        if id(processed_data) in forwarded_ids:
+            if processed_data.road_state not in ANOMALIES:
+                states[user_id] = processed_data.road_state
+        elif processed_data.road_state in ANOMALIES or states.get(user_id) != processed_data.road_state:
+            lost += 1
+    all_bytes = sum(len(encode_processed_agent_data(processed_data)) for processed_data in processed)
+    sent_bytes = sum(len(encode_processed_agent_data(processed_data)) for processed_data in forwarded)
+    print(f"readings   {len(processed):>10,}")
+    print(f"forwarded  {len(forwarded):>10,}  ({len(processed) / len(forwarded):.1f}x fewer)")
+    print(f"bytes      {all_bytes:>10,} -> {sent_bytes:,}")
+    print(f"lost       {lost:>10,}")
+    print(f"cpu        {elapsed / len(processed) * 1e6:>10.2f} us/reading")
@@ -0,0 +1,72 @@
+"""
+Throughput benchmark for the streaming road classifier, on one core.
+
+Reports samples per second of:
+  classify - RoadClassifier.classify on chunks of one user's z samples
+             (filtering, RMS, peak-to-peak and event detection only)
+  batch    - RoadClassifier.process_batch on micro-batches of AgentData
+             from several users, as the edge workers call it (includes
+             grouping by user and building ProcessedAgentData)
+
+Run from the edge directory:
+    python benchmarks/bench_road_classifier.py
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData  # noqa: E402
+from app.usecases.road_classifier import RoadClassifier  # noqa: E402
+
+SAMPLES = 200000
+USERS = 10
+BATCH_SIZE = 50
+SCALE = 16384.0
+
+
+def make_z(count: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    z = SCALE + rng.normal(0, 0.03 * SCALE, count)
+    # A pothole or a bump every 500 samples or so
+    for start in rng.integers(0, count - 4, count // 500):
+        z[start:start + 4] += rng.choice([-1, 1]) * np.array([0.8, 1.0, 0.4, -0.5]) * SCALE
+    return z
+
+
+def bench_classify(z: np.ndarray, chunk: int) -> float:
+    classifier = RoadClassifier(scale=SCALE)
+    started = time.process_time()
+    for start in range(0, len(z), chunk):
+        classifier.classify(start // chunk % USERS, z[start:start + chunk])
+    return len(z) / (time.process_time() - started)
+
+
+def bench_batch(z: np.ndarray) -> float:
+    started_at = datetime(2024, 1, 1)
+    records = [
+        AgentData(
+            user_id=index % USERS,
+            accelerometer=AccelerometerData(x=0.0, y=0.0, z=value),
+            gps=GpsData(latitude=50.45, longitude=30.52),
+            timestamp=started_at + timedelta(milliseconds=index),
+        )
+        for index, value in enumerate(z.tolist())
+    ]
+    classifier = RoadClassifier(scale=SCALE)
+    started = time.process_time()
+    for start in range(0, len(records), BATCH_SIZE):
+        classifier.process_batch(records[start:start + BATCH_SIZE])
+    return len(records) / (time.process_time() - started)
+
+
+if __name__ == "__main__":
+    z = make_z(SAMPLES)
+    print(f"{'path':<22}{'samples/s':>12}")
+    for chunk in (50, 500):
+        print(f"{f'classify, chunk {chunk}':<22}{bench_classify(z, chunk):>12,.0f}")
+    print(f"{f'batch of {BATCH_SIZE}, {USERS} users':<22}{bench_batch(z[:50000]):>12,.0f}")
@@ -8,17 +8,72 @@ def try_parse_int(value: str):
         return None
 
 
+def try_parse_float(value: str):
+    try:
+        return float(value)
+    except Exception:
+        return None
+
+
 # Configuration for agent MQTT
 MQTT_BROKER_HOST = os.environ.get("MQTT_BROKER_HOST") or "localhost"
 MQTT_BROKER_PORT = try_parse_int(os.environ.get("MQTT_BROKER_PORT")) or 1883
 MQTT_TOPIC = os.environ.get("MQTT_TOPIC") or "agent_data_topic"
+# Agent messages are processed and sent to the Hub in batches of up to
+# BATCH_SIZE, at most BATCH_MAX_LINGER seconds after the first one arrived
+BATCH_SIZE = try_parse_int(os.environ.get("BATCH_SIZE")) or 50
+BATCH_MAX_LINGER = try_parse_float(os.environ.get("BATCH_MAX_LINGER")) or 0.2
+# Received messages wait for WORKERS processing threads in a queue of at
+# most QUEUE_CAPACITY messages. When it is full, QUEUE_OVERFLOW decides:
+# "block" the MQTT client, "drop_oldest" or "drop_newest" message
+WORKERS = try_parse_int(os.environ.get("WORKERS")) or 2
+QUEUE_CAPACITY = try_parse_int(os.environ.get("QUEUE_CAPACITY")) or 10000
+QUEUE_OVERFLOW = os.environ.get("QUEUE_OVERFLOW") or "drop_oldest"
+# Road classification (see app.usecases.road_classifier). Thresholds are in
+# g and accelerometer readings in ACCELEROMETER_SCALE units per g (16384 for
+# the raw values of a +-2 g sensor); windows are in samples
+ACCELEROMETER_SCALE = try_parse_float(os.environ.get("ACCELEROMETER_SCALE")) or 16384.0
+CLASSIFIER_WINDOW = try_parse_int(os.environ.get("CLASSIFIER_WINDOW")) or 32
+HIGH_PASS_WINDOW = try_parse_int(os.environ.get("HIGH_PASS_WINDOW")) or 16
+EVENT_THRESHOLD = try_parse_float(os.environ.get("EVENT_THRESHOLD")) or 0.5
+EVENT_GAP = try_parse_int(os.environ.get("EVENT_GAP")) or 8
+# "all" sends every reading to the Hub; "events" only road state changes,
+# potholes and bumps, a heartbeat every HEARTBEAT_INTERVAL seconds and the
+# GPS track decimated to a point every TRACK_MAX_DISTANCE metres or on a
+# turn of TRACK_HEADING_CHANGE degrees (moves under TRACK_MIN_DISTANCE
+# metres are ignored), see app.usecases.event_compressor
+FORWARD_MODE = os.environ.get("FORWARD_MODE") or "all"
+HEARTBEAT_INTERVAL = try_parse_float(os.environ.get("HEARTBEAT_INTERVAL")) or 30.0
+TRACK_MIN_DISTANCE = try_parse_float(os.environ.get("TRACK_MIN_DISTANCE")) or 5.0
+TRACK_MAX_DISTANCE = try_parse_float(os.environ.get("TRACK_MAX_DISTANCE")) or 100.0
+TRACK_HEADING_CHANGE = try_parse_float(os.environ.get("TRACK_HEADING_CHANGE")) or 30.0
 
 # Configuration for hub MQTT
 HUB_MQTT_BROKER_HOST = os.environ.get("HUB_MQTT_BROKER_HOST") or "localhost"
 HUB_MQTT_BROKER_PORT = try_parse_int(os.environ.get("HUB_MQTT_BROKER_PORT")) or 1883
 HUB_MQTT_TOPIC = os.environ.get("HUB_MQTT_TOPIC") or "processed_agent_data"
+# Processed data is published to <HUB_MQTT_TOPIC>/<user_id % HUB_MQTT_PARTITIONS>
+HUB_MQTT_PARTITIONS = try_parse_int(os.environ.get("HUB_MQTT_PARTITIONS")) or 16
 
 # Configuration for the Hub
 HUB_HOST = os.environ.get("HUB_HOST") or "localhost"
 HUB_PORT = try_parse_int(os.environ.get("HUB_PORT")) or 12000
 HUB_URL = f"http://{HUB_HOST}:{HUB_PORT}"
+# Seconds to connect to the Hub and to wait for its answer; a request that
+# takes longer is a failed delivery and its data goes to the offline buffer
+HUB_CONNECT_TIMEOUT = try_parse_float(os.environ.get("HUB_CONNECT_TIMEOUT")) or 3.0
+HUB_READ_TIMEOUT = try_parse_float(os.environ.get("HUB_READ_TIMEOUT")) or 10.0
+
+# Data the Hub does not get is kept in an SQLite database at BUFFER_PATH,
+# up to BUFFER_MAX_BYTES, and sent in batches of BUFFER_DRAIN_BATCH once
+# the Hub is back; it is retried every BUFFER_RETRY_INTERVAL seconds
+BUFFER_PATH = os.environ.get("BUFFER_PATH") or "buffer/backlog.db"
+BUFFER_MAX_BYTES = try_parse_int(os.environ.get("BUFFER_MAX_BYTES")) or 256 * 1024 * 1024
+BUFFER_DRAIN_BATCH = try_parse_int(os.environ.get("BUFFER_DRAIN_BATCH")) or 500
+BUFFER_RETRY_INTERVAL = try_parse_float(os.environ.get("BUFFER_RETRY_INTERVAL")) or 5.0
+
+# Serialization of data sent to the Hub: "json" or "msgpack"
+WIRE_FORMAT = os.environ.get("WIRE_FORMAT") or "json"
+
+# Port of the /health, /ready and /metrics endpoints
+HEALTH_PORT = try_parse_int(os.environ.get("HEALTH_PORT")) or 8080
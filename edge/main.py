@@ -1,15 +1,46 @@
 import logging
+import signal
+import threading
 from app.adapters.agent_mqtt_adapter import AgentMQTTAdapter
+from app.adapters.buffered_hub_adapter import BufferedHubAdapter
+from app.adapters.health_server import HealthServer
 from app.adapters.hub_http_adapter import HubHttpAdapter
 from app.adapters.hub_mqtt_adapter import HubMqttAdapter
+from app.adapters.offline_buffer import OfflineBuffer
+from app.usecases.event_compressor import EventCompressor
+from app.usecases.road_classifier import RoadClassifier
 from config import (
     MQTT_BROKER_HOST,
     MQTT_BROKER_PORT,
     MQTT_TOPIC,
+    BATCH_SIZE,
+    BATCH_MAX_LINGER,
+    WORKERS,
+    QUEUE_CAPACITY,
+    QUEUE_OVERFLOW,
+    ACCELEROMETER_SCALE,
+    CLASSIFIER_WINDOW,
+    HIGH_PASS_WINDOW,
+    EVENT_THRESHOLD,
+    EVENT_GAP,
+    FORWARD_MODE,
+    HEARTBEAT_INTERVAL,
+    TRACK_MIN_DISTANCE,
+    TRACK_MAX_DISTANCE,
+    TRACK_HEADING_CHANGE,
     HUB_URL,
+    HUB_CONNECT_TIMEOUT,
+    HUB_READ_TIMEOUT,
     HUB_MQTT_BROKER_HOST,
     HUB_MQTT_BROKER_PORT,
     HUB_MQTT_TOPIC,
+    HUB_MQTT_PARTITIONS,
+    BUFFER_PATH,
+    BUFFER_MAX_BYTES,
+    BUFFER_DRAIN_BATCH,
+    BUFFER_RETRY_INTERVAL,
+    WIRE_FORMAT,
+    HEALTH_PORT,
 )
 
 if __name__ == "__main__":
@@ -25,11 +56,22 @@ if __name__ == "__main__":
     # Create an instance of the StoreApiAdapter using the configuration
     # hub_adapter = HubHttpAdapter(
     #     api_base_url=HUB_URL,
+    #     wire_format=WIRE_FORMAT,
+    #     timeout=(HUB_CONNECT_TIMEOUT, HUB_READ_TIMEOUT),
     # )
-    hub_adapter = HubMqttAdapter(
+    hub_mqtt_adapter = HubMqttAdapter(
         broker=HUB_MQTT_BROKER_HOST,
         port=HUB_MQTT_BROKER_PORT,
         topic=HUB_MQTT_TOPIC,
+        wire_format=WIRE_FORMAT,
+        partitions=HUB_MQTT_PARTITIONS,
+    )
+    # Keeps what the Hub does not get on disk until it is reachable again
+    hub_adapter = BufferedHubAdapter(
+        gateway=hub_mqtt_adapter,
+        buffer=OfflineBuffer(BUFFER_PATH, max_bytes=BUFFER_MAX_BYTES),
+        drain_batch=BUFFER_DRAIN_BATCH,
+        retry_interval=BUFFER_RETRY_INTERVAL,
     )
     # Create an instance of the AgentMQTTAdapter using the configuration
     agent_adapter = AgentMQTTAdapter(
@@ -37,15 +79,47 @@ if __name__ == "__main__":
         broker_port=MQTT_BROKER_PORT,
         topic=MQTT_TOPIC,
         hub_gateway=hub_adapter,
+        batch_size=BATCH_SIZE,
+        max_linger=BATCH_MAX_LINGER,
+        workers=WORKERS,
+        queue_capacity=QUEUE_CAPACITY,
+        overflow=QUEUE_OVERFLOW,
+        classifier=RoadClassifier(
+            window=CLASSIFIER_WINDOW,
+            high_pass_window=HIGH_PASS_WINDOW,
+            event_threshold=EVENT_THRESHOLD,
+            event_gap=EVENT_GAP,
+            scale=ACCELEROMETER_SCALE,
+        ),
+        compressor=EventCompressor(
+            heartbeat_interval=HEARTBEAT_INTERVAL,
+            min_distance=TRACK_MIN_DISTANCE,
+            max_distance=TRACK_MAX_DISTANCE,
+            heading_change=TRACK_HEADING_CHANGE,
+        )
+        if FORWARD_MODE == "events"
+        else None,
+    )
+    # /health and /ready for the container orchestrator, /metrics for monitoring
+    health_server = HealthServer(
+        "0.0.0.0",
+        HEALTH_PORT,
+        checks={"agent_mqtt": agent_adapter.is_ready, "hub": hub_adapter.is_ready},
+        metrics=lambda: {**agent_adapter.metrics(), **hub_adapter.metrics()},
     )
-    try:
-        # Connect to the MQTT broker and start listening for messages
-        agent_adapter.connect()
-        agent_adapter.start()
-        # Keep the system running indefinitely (you can add other logic as needed)
-        while True:
-            pass
-    except KeyboardInterrupt:
-        # Stop the MQTT adapter and exit gracefully if interrupted by the user
-        agent_adapter.stop()
-        logging.info("System stopped.")
+    # SIGTERM (docker stop) and SIGINT (Ctrl+C) both shut down gracefully
+    stopped = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: stopped.set())
+    health_server.start()
+    # Connect to the MQTT broker and start listening for messages
+    agent_adapter.connect()
+    agent_adapter.start()
+    # Sleep until a signal arrives instead of spinning
+    stopped.wait()
+    logging.info("Stopping...")
+    # Stop receiving first, then deliver what is still buffered for the hub
+    agent_adapter.stop()
+    hub_adapter.close()
+    health_server.stop()
+    logging.info("System stopped.")
@@ -0,0 +1,90 @@
+import random
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from typing import Dict, List
+from unittest import mock
+
+from app.adapters import agent_mqtt_adapter
+from app.adapters.agent_mqtt_adapter import AgentMQTTAdapter
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.hub_gateway import HubGateway
+from app.usecases.event_compressor import EventCompressor
+from app.usecases.road_classifier import RoadClassifier
+
+SCALE = 16384.0
+
+
+class CollectingHubGateway(HubGateway):
+    def __init__(self):
+        self.sent: Dict[int, List[ProcessedAgentData]] = {}
+        self._lock = threading.Lock()
+
+    def save_data(self, processed_data: ProcessedAgentData) -> bool:
+        with self._lock:
+            self.sent.setdefault(processed_data.agent_data.user_id, []).append(processed_data)
+        return True
+
+
+def interleaved_payloads(users: int, count: int) -> List[bytes]:
+    """Readings of users driving at the same time, bumps and rough road included."""
+    rng = random.Random(1)
+    started_at = datetime(2024, 1, 1)
+    payloads = []
+    for index in range(count):
+        for user_id in range(users):
+            z = 1 + rng.gauss(0, 0.2 if index // 40 % 2 else 0.01)
+            if index % 37 == user_id:
+                z += 1.0
+            payloads.append(AgentData(
+                user_id=user_id,
+                accelerometer=AccelerometerData(x=0.0, y=0.0, z=z * SCALE),
+                gps=GpsData(latitude=50.45 + index * 1e-4 * (user_id + 1), longitude=30.52),
+                timestamp=started_at + timedelta(seconds=index / 10),
+            ).model_dump_json().encode())
+    return payloads
+
+
+class TestAgentMQTTAdapter(unittest.TestCase):
+    def run_adapter(self, payloads: List[bytes], workers: int) -> Dict[int, list]:
+        hub_gateway = CollectingHubGateway()
+        adapter = AgentMQTTAdapter(
+            "localhost",
+            1883,
+            "agent",
+            hub_gateway,
+            batch_size=4,
+            max_linger=0.001,
+            workers=workers,
+            classifier=RoadClassifier(scale=SCALE),
+            compressor=EventCompressor(heartbeat_interval=2.0),
+        )
+        random_delay = random.Random(2)
+        decode = agent_mqtt_adapter.decode_agent_data_batch
+
+        def slow_decode(batch):
+            # Makes workers overtake each other
+            time.sleep(random_delay.random() * 0.002)
+            return decode(batch)
+
+        with mock.patch.object(agent_mqtt_adapter, "decode_agent_data_batch", slow_decode):
+            adapter.work_queue.start()
+            for payload in payloads:
+                adapter.on_message(None, None, mock.Mock(payload=payload))
+            adapter.work_queue.stop()
+        return {
+            user_id: sorted((data.agent_data.timestamp, data.road_state) for data in sent)
+            for user_id, sent in hub_gateway.sent.items()
+        }
+
+    def test_several_workers_classify_every_user_in_order(self):
+        payloads = interleaved_payloads(users=3, count=400)
+        expected = self.run_adapter(payloads, workers=1)
+        self.assertEqual(set(expected), {0, 1, 2})
+        self.assertEqual(self.run_adapter(payloads, workers=4), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
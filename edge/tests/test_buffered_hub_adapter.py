@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from typing import List
+
+from app.adapters.buffered_hub_adapter import BufferedHubAdapter
+from app.adapters.offline_buffer import OfflineBuffer
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.hub_gateway import HubGateway
+
+
+def make_batch(start: int, count: int) -> List[ProcessedAgentData]:
+    return [
+        ProcessedAgentData(
+            road_state="good",
+            agent_data=AgentData(
+                user_id=1,
+                accelerometer=AccelerometerData(x=0.0, y=0.0, z=1.0),
+                gps=GpsData(latitude=50.45, longitude=30.52),
+                timestamp=datetime(2024, 1, 1) + timedelta(seconds=index),
+            ),
+        )
+        for index in range(start, start + count)
+    ]
+
+
+def seconds(batch: List[ProcessedAgentData]) -> List[int]:
+    return [int((data.agent_data.timestamp - datetime(2024, 1, 1)).total_seconds()) for data in batch]
+
+
+class FlakyHubGateway(HubGateway):
+    """Accepts data only while available is set; remembers what it accepted."""
+
+    def __init__(self):
+        self.available = False
+        self.received: List[ProcessedAgentData] = []
+
+    def save_data(self, processed_data: ProcessedAgentData) -> bool:
+        return self.save_batch([processed_data])
+
+    def save_batch(self, processed_data_batch: List[ProcessedAgentData]) -> bool:
+        if not self.available:
+            return False
+        self.received.extend(processed_data_batch)
+        return True
+
+
+class TestBufferedHubAdapter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.gateway = FlakyHubGateway()
+        self.buffer = OfflineBuffer(os.path.join(self.directory.name, "backlog.db"))
+        self.adapter = BufferedHubAdapter(self.gateway, self.buffer, drain_batch=4, retry_interval=60.0)
+        # The test drains by hand
+        self.adapter._stopped.set()
+        self.adapter._thread.join()
+
+    def tearDown(self):
+        self.adapter.close()
+        self.directory.cleanup()
+
+    def test_data_is_sent_directly_while_the_hub_is_up(self):
+        self.gateway.available = True
+        self.assertTrue(self.adapter.save_batch(make_batch(0, 3)))
+        self.assertEqual(seconds(self.gateway.received), [0, 1, 2])
+        self.assertEqual(self.buffer.pending_records, 0)
+
+    def test_backlog_drains_in_order_and_is_committed_only_once_accepted(self):
+        self.assertFalse(self.adapter.save_batch(make_batch(0, 3)))
+        self.assertFalse(self.adapter.save_batch(make_batch(3, 3)))
+        self.assertEqual(self.buffer.pending_records, 6)
+        # Still down: nothing is lost
+        self.assertEqual(self.adapter.drain(), 0)
+        self.assertEqual(self.buffer.pending_records, 6)
+        self.gateway.available = True
+        self.assertEqual(self.adapter.drain(), 4)
+        self.assertEqual(self.buffer.pending_records, 2)
+        self.assertEqual(self.adapter.drain(), 2)
+        self.assertEqual(self.adapter.drain(), 0)
+        self.assertEqual(seconds(self.gateway.received), [0, 1, 2, 3, 4, 5])
+        self.assertEqual(self.adapter.metrics(), {"backlog_records": 0, "backlog_bytes": 0})
+
+    def test_new_data_queues_behind_the_backlog(self):
+        self.adapter.save_batch(make_batch(0, 2))
+        self.gateway.available = True
+        self.adapter._retry_at = 0.0
+        # The hub is back, but older data is still buffered
+        self.assertFalse(self.adapter.save_batch(make_batch(2, 2)))
+        self.assertEqual(self.gateway.received, [])
+        while self.adapter.drain():
+            pass
+        self.assertEqual(seconds(self.gateway.received), [0, 1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
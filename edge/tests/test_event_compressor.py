@@ -0,0 +1,87 @@
+import math
+import unittest
+from datetime import datetime, timedelta
+from typing import List
+
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.usecases.event_compressor import EARTH_RADIUS, EventCompressor
+from app.usecases.road_classifier import AVERAGE, GOOD, POOR, POTHOLE
+
+METRE = math.degrees(1 / EARTH_RADIUS)  # of latitude
+
+
+def reading(second: int, road_state: str = GOOD, user_id: int = 1, north: float = 0.0, east: float = 0.0):
+    """A reading `second` seconds into the drive, `north` and `east` metres from the start."""
+    return ProcessedAgentData(
+        road_state=road_state,
+        agent_data=AgentData(
+            user_id=user_id,
+            accelerometer=AccelerometerData(x=0.0, y=0.0, z=1.0),
+            gps=GpsData(
+                latitude=50.0 + north * METRE,
+                longitude=30.0 + east * METRE / math.cos(math.radians(50.0)),
+            ),
+            timestamp=datetime(2024, 1, 1) + timedelta(seconds=second),
+        ),
+    )
+
+
+def seconds(batch: List[ProcessedAgentData]) -> List[int]:
+    return [int((data.agent_data.timestamp - datetime(2024, 1, 1)).total_seconds()) for data in batch]
+
+
+class TestEventCompressor(unittest.TestCase):
+    def compress(self, compressor: EventCompressor, readings: List[ProcessedAgentData], batch_size: int = 3):
+        """Forwarded readings, compressed in batches as the edge workers do."""
+        forwarded = []
+        for start in range(0, len(readings), batch_size):
+            forwarded.extend(compressor.compress(readings[start:start + batch_size]))
+        return forwarded
+
+    def test_steady_readings_are_suppressed_up_to_the_heartbeat(self):
+        compressor = EventCompressor(heartbeat_interval=30)
+        forwarded = self.compress(compressor, [reading(second) for second in range(45)])
+        self.assertEqual(seconds(forwarded), [0, 30])
+        self.assertEqual((compressor.forwarded, compressor.suppressed), (2, 43))
+
+    def test_a_run_of_road_state_is_sent_with_its_first_and_last_reading(self):
+        states = [GOOD] * 10 + [POOR] * 10 + [AVERAGE] * 5
+        forwarded = self.compress(EventCompressor(), [reading(second, state) for second, state in enumerate(states)])
+        # The last reading of a run may come from an earlier batch
+        self.assertEqual(seconds(forwarded), [0, 9, 10, 19, 20])
+        self.assertEqual([data.road_state for data in forwarded], [GOOD, GOOD, POOR, POOR, AVERAGE])
+
+    def test_a_one_reading_run_is_sent_once(self):
+        states = [GOOD] * 3 + [POOR] + [GOOD] * 3
+        forwarded = self.compress(EventCompressor(), [reading(second, state) for second, state in enumerate(states)])
+        self.assertEqual(seconds(forwarded), [0, 2, 3, 4])
+
+    def test_anomalies_are_always_sent_and_do_not_end_a_run(self):
+        states = [GOOD] * 5 + [POTHOLE] + [GOOD] * 5 + [POTHOLE]
+        forwarded = self.compress(EventCompressor(), [reading(second, state) for second, state in enumerate(states)])
+        self.assertEqual(seconds(forwarded), [0, 5, 11])
+
+    def test_track_is_decimated_by_distance_and_turns(self):
+        # North at 11 m/s for 10 s, then east
+        readings = [reading(second, north=11.0 * second) for second in range(11)]
+        readings += [reading(11 + second, north=110.0, east=11.0 * (second + 1)) for second in range(5)]
+        forwarded = self.compress(EventCompressor(max_distance=100, heading_change=30), readings)
+        # 110 m from the start, then the turn
+        self.assertEqual(seconds(forwarded), [0, 10, 11])
+
+    def test_state_is_kept_per_user(self):
+        readings = []
+        for second in range(20):
+            readings.append(reading(second, GOOD, user_id=1))
+            readings.append(reading(second, POOR if second < 10 else GOOD, user_id=2))
+        forwarded = self.compress(EventCompressor(), readings, batch_size=4)
+        first_user = [data for data in forwarded if data.agent_data.user_id == 1]
+        second_user = [data for data in forwarded if data.agent_data.user_id == 2]
+        # The change of user 2 is neither a run end nor a start for user 1
+        self.assertEqual(seconds(first_user), [0])
+        self.assertEqual(seconds(second_user), [0, 9, 10])
+
+
+if __name__ == "__main__":
+    unittest.main()
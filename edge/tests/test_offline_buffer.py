@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+from app.adapters.offline_buffer import OfflineBuffer
+
+
+class TestOfflineBuffer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "buffer", "backlog.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_records_are_read_oldest_first_and_deleted_on_commit(self):
+        buffer = OfflineBuffer(self.path)
+        buffer.append([b"first", b"second"])
+        buffer.append([b"third"])
+        payloads, last_id = buffer.peek(2)
+        self.assertEqual(payloads, [b"first", b"second"])
+        # Peeking again without a commit returns the same records
+        self.assertEqual(buffer.peek(2), (payloads, last_id))
+        buffer.commit(last_id)
+        self.assertEqual(buffer.peek(10)[0], [b"third"])
+        self.assertEqual((buffer.pending_records, buffer.pending_bytes), (1, 5))
+        buffer.close()
+
+    def test_byte_cap_drops_the_oldest_records(self):
+        buffer = OfflineBuffer(self.path, max_bytes=100)
+        for index in range(15):
+            buffer.append([b"record-%03d" % index])
+        self.assertLessEqual(buffer.pending_bytes, 100)
+        self.assertEqual(buffer.peek(100)[0], [b"record-%03d" % index for index in range(5, 15)])
+        buffer.close()
+
+    def test_pending_records_are_recovered_after_a_restart(self):
+        buffer = OfflineBuffer(self.path)
+        buffer.append([b"first", b"second", b"third"])
+        buffer.commit(buffer.peek(1)[1])
+        buffer.close()
+        reopened = OfflineBuffer(self.path)
+        self.assertEqual((reopened.pending_records, reopened.pending_bytes), (2, 11))
+        self.assertEqual(reopened.peek(10)[0], [b"second", b"third"])
+        reopened.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
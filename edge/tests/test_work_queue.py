@@ -0,0 +1,53 @@
+import random
+import threading
+import time
+import unittest
+
+from app.usecases.work_queue import BatchingWorkQueue
+
+
+class TestBatchingWorkQueue(unittest.TestCase):
+    def test_in_order_runs_batches_in_the_order_they_were_taken(self):
+        taken, ordered = [], []
+        lock = threading.Lock()
+        random_delay = random.Random(0)
+
+        def handler(batch):
+            with lock:
+                taken.append(batch)
+            # Batches finish their unordered part in any order
+            time.sleep(random_delay.random() * 0.005)
+            if batch[0] % 3 == 0:
+                # Skipping in_order must not hold up later batches
+                return
+            with queue.in_order():
+                ordered.append(batch)
+
+        queue = BatchingWorkQueue(handler, workers=4, batch_size=5, max_linger=0.001)
+        queue.start()
+        for item in range(1000):
+            queue.put(item)
+        queue.stop()
+        self.assertEqual(sorted(item for batch in taken for item in batch), list(range(1000)))
+        self.assertEqual(ordered, [batch for batch in sorted(taken) if batch[0] % 3 != 0])
+
+    def test_failing_handler_passes_its_turn(self):
+        ordered = []
+
+        def handler(batch):
+            with queue.in_order():
+                if batch[0] == 0:
+                    raise RuntimeError("broken batch")
+                ordered.append(batch[0])
+
+        queue = BatchingWorkQueue(handler, workers=2, batch_size=1, max_linger=0.001)
+        queue.start()
+        for item in range(10):
+            queue.put(item)
+        queue.stop()
+        self.assertEqual(ordered, list(range(1, 10)))
+        self.assertEqual(queue.metrics()["processed_total"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
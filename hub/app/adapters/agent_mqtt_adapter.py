@@ -0,0 +1,140 @@
+import logging
+import queue
+import threading
+from typing import Callable, List, Sequence
+
+import paho.mqtt.client as mqtt
+
+from app.adapters.wire_format import JSON, detect_wire_format, is_batch, to_queue_record, to_queue_records
+
+# Worker queues are drained this many messages at a time, so one Redis
+# round-trip queues a whole burst
+MAX_DRAIN = 256
+
+
+class AgentMQTTAdapter:
+    """
+    Consumes processed agent data from MQTT and hands validated records
+    (QueueRecord) to on_records. It is started and stopped with the application, so every
+    process holds exactly one subscription.
+
+    A message holds one record or an array of them. Publishers partition
+    by user_id: data of a vehicle goes to <topic>/<user_id % partitions>
+    (plain <topic> is still accepted). A process subscribes to the
+    partitions in partitions_owned, all of them (<topic>/+) if empty;
+    processes must own disjoint sets, so each vehicle is read by one.
+
+    With shared_group set the client speaks MQTT v5 and subscribes to the
+    plain topic through $share/<shared_group>/<topic>, so the broker splits
+    its messages between all processes of the group instead of sending
+    each of them a copy. Partitions are never shared: the broker would
+    hand consecutive messages of a vehicle to different processes.
+    Messages are validated on worker threads, each partition always on the
+    same one, so data of one vehicle is queued in the order it arrived.
+    """
+
+    def __init__(
+        self,
+        broker_host: str,
+        broker_port: int,
+        topic: str,
+        on_records: Callable[..., None],
+        wire_format: str = JSON,
+        shared_group: str = "",
+        workers: int = 4,
+        worker_queue_size: int = 1000,
+        client_id: str = "",
+        partitions_owned: Sequence[int] = (),
+    ):
+        self.broker_host = broker_host
+        self.broker_port = broker_port
+        self.topic = topic
+        self.on_records = on_records
+        self.wire_format = wire_format
+        self.shared_group = shared_group
+        self.partitions_owned = list(partitions_owned)
+        if shared_group and not self.partitions_owned:
+            logging.warning(
+                "Shared subscription without owned partitions: every process of the group reads all of them"
+            )
+        # A full worker queue blocks the network thread, which pushes back on the broker
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=worker_queue_size) for _ in range(max(workers, 1))]
+        self._workers: List[threading.Thread] = []
+        if shared_group:
+            self.client = mqtt.Client(client_id=client_id, protocol=mqtt.MQTTv5)
+        else:
+            self.client = mqtt.Client(client_id=client_id)
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+
+    @property
+    def subscriptions(self) -> List[str]:
+        prefix = f"$share/{self.shared_group}/" if self.shared_group else ""
+        partitions = [f"{self.topic}/{partition}" for partition in self.partitions_owned]
+        return [f"{prefix}{self.topic}", *(partitions or [f"{self.topic}/+"])]
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        if rc == 0:
+            logging.info(f"Connected to MQTT broker {self.broker_host}:{self.broker_port}")
+            # Subscriptions are repeated on every reconnect
+            client.subscribe([(subscription, 0) for subscription in self.subscriptions])
+            logging.info(f"Subscribed to topics: {', '.join(self.subscriptions)}")
+        else:
+            logging.info(f"Failed to connect to MQTT broker with code: {rc}")
+
+    def on_message(self, client, userdata, msg):
+        self._queues[self.partition(msg.topic)].put(msg.payload)
+
+    def partition(self, topic: str) -> int:
+        """Worker for a topic: <topic>/<n> goes to worker n % workers."""
+        suffix = topic[len(self.topic) + 1:]
+        return int(suffix) % len(self._queues) if suffix.isdigit() else 0
+
+    def start(self):
+        self._workers = [
+            threading.Thread(target=self._work, args=(worker_queue,), name=f"mqtt-worker-{index}", daemon=True)
+            for index, worker_queue in enumerate(self._queues)
+        ]
+        for worker in self._workers:
+            worker.start()
+        self.client.connect(self.broker_host, self.broker_port)
+        self.client.loop_start()
+
+    def stop(self):
+        """Stop consuming and wait until received messages are queued."""
+        self.client.disconnect()
+        self.client.loop_stop()
+        for worker_queue in self._queues:
+            worker_queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def _work(self, worker_queue: queue.Queue):
+        stopped = False
+        while not stopped:
+            messages = [worker_queue.get()]
+            while len(messages) < MAX_DRAIN:
+                try:
+                    messages.append(worker_queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = []
+            for message in messages:
+                if message is None:
+                    stopped = True
+                    continue
+                try:
+                    message_format = detect_wire_format(message)
+                    if is_batch(message, message_format):
+                        records.extend(to_queue_records(message, message_format, self.wire_format))
+                    else:
+                        # Payloads already in wire_format are queued as they are
+                        records.append(to_queue_record(message, message_format, self.wire_format, strict=True))
+                except Exception as e:
+                    logging.info(f"Error processing MQTT message: {e}")
+            if records:
+                try:
+                    self.on_records(*records)
+                except Exception as e:
+                    logging.error(f"Failed to queue {len(records)} MQTT messages: {e}")
@@ -0,0 +1,126 @@
+from typing import Dict, List, Tuple, Union
+
+from redis import Redis
+from redis.backoff import NoBackoff
+from redis.exceptions import ResponseError
+from redis.retry import Retry
+
+# (entry id, payload)
+StreamEntry = Tuple[str, bytes]
+
+
+def make_redis_client(host: str, port: int, connect_timeout: float, socket_timeout: float) -> Redis:
+    """
+    Redis client that fails fast when Redis stops answering. A failed
+    command is retried once right away (e.g. on a stale pooled connection),
+    not with redis-py's default backoff; the caller spills to disk instead.
+    """
+    return Redis(
+        host=host,
+        port=port,
+        socket_connect_timeout=connect_timeout,
+        socket_timeout=socket_timeout,
+        retry=Retry(NoBackoff(), 1),
+    )
+
+
+class RedisStreamQueue:
+    """
+    Queue of serialized records in a Redis stream read through a consumer
+    group. Every hub replica is a consumer of the same group, so each entry
+    goes to one replica. Entries stay pending until they are acknowledged,
+    and entries left pending by a crashed or failing consumer can be claimed
+    by another one after an idle timeout.
+    """
+
+    def __init__(self, redis_client: Redis, stream: str, group: str, consumer: str, dead_letter_stream: str = None):
+        self.redis_client = redis_client
+        self.stream = stream
+        self.dead_letter_stream = dead_letter_stream or f"{stream}:dead"
+        self.group = group
+        self.consumer = consumer
+        self._claim_cursor = "0-0"
+
+    def ensure_group(self):
+        try:
+            self.redis_client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def push(self, *payloads: Union[str, bytes]):
+        """Append payloads to the stream in a single round-trip."""
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for payload in payloads:
+            pipeline.xadd(self.stream, {"data": payload})
+        pipeline.execute()
+
+    def read(self, count: int, block: float) -> List[StreamEntry]:
+        """
+        Up to count entries never delivered to any consumer, waiting up to
+        block seconds for the first one.
+        """
+        response = self.redis_client.xreadgroup(
+            self.group, self.consumer, {self.stream: ">"}, count=count, block=max(int(block * 1000), 1)
+        )
+        if not response:
+            return []
+        return self._entries(response[0][1])
+
+    def claim_stale(self, min_idle: float, count: int) -> List[StreamEntry]:
+        """
+        Take over up to count entries that have been pending for at least
+        min_idle seconds, from any consumer of the group.
+        """
+        cursor, entries = self.redis_client.xautoclaim(
+            self.stream, self.group, self.consumer, int(min_idle * 1000),
+            start_id=self._claim_cursor, count=count,
+        )[:2]
+        self._claim_cursor = cursor.decode() if isinstance(cursor, bytes) else cursor
+        return self._entries(entries)
+
+    def delivery_counts(self, entry_ids: List[str]) -> Dict[str, int]:
+        """How many times each pending entry was delivered, from XPENDING."""
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for entry_id in entry_ids:
+            pipeline.xpending_range(self.stream, self.group, entry_id, entry_id, 1)
+        counts = {}
+        for pending in pipeline.execute():
+            for item in pending:
+                entry_id = item["message_id"]
+                counts[entry_id.decode() if isinstance(entry_id, bytes) else entry_id] = item["times_delivered"]
+        return counts
+
+    def dead_letter(self, entries: List[StreamEntry]):
+        """
+        Move entries to the dead-letter stream, with their original id, and
+        acknowledge them, atomically so none is lost or left pending.
+        """
+        pipeline = self.redis_client.pipeline(transaction=True)
+        for entry_id, payload in entries:
+            pipeline.xadd(self.dead_letter_stream, {"data": payload, "entry_id": entry_id})
+        entry_ids = [entry_id for entry_id, _ in entries]
+        pipeline.xack(self.stream, self.group, *entry_ids)
+        pipeline.xdel(self.stream, *entry_ids)
+        pipeline.execute()
+
+    def ack(self, entry_ids: List[str]):
+        """Acknowledge and delete entries in a single round-trip."""
+        if not entry_ids:
+            return
+        # Both commands are idempotent, so MULTI/EXEC is not needed
+        pipeline = self.redis_client.pipeline(transaction=False)
+        pipeline.xack(self.stream, self.group, *entry_ids)
+        pipeline.xdel(self.stream, *entry_ids)
+        pipeline.execute()
+
+    @staticmethod
+    def _entries(raw_entries) -> List[StreamEntry]:
+        entries = []
+        for entry_id, fields in raw_entries:
+            # Entries deleted while pending come back without fields
+            if not fields:
+                continue
+            entry_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+            entries.append((entry_id, fields[b"data"]))
+        return entries
@@ -0,0 +1,196 @@
+import fcntl
+import itertools
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import deque
+from typing import Deque, List, Tuple
+
+# Record header: payload length and CRC32 of the payload. Segments are
+# preallocated with zeros, so a zero length marks the end of the data.
+_HEADER = struct.Struct("<II")
+_CURSOR = struct.Struct("<QQQ")
+_SEGMENT_NAME = "segment-{:020d}.log"
+
+# (segment sequence number, offset in it, records read from it)
+Position = Tuple[int, int, int]
+
+
+class _Segment:
+    def __init__(self, path: str, sequence: int, size: int):
+        self.path = path
+        self.sequence = sequence
+        with open(path, "a+b") as file:
+            if os.fstat(file.fileno()).st_size < size:
+                file.truncate(size)
+            self.size = os.fstat(file.fileno()).st_size
+            self.map = mmap.mmap(file.fileno(), self.size)
+        self.end, self.records = self._scan()
+
+    def _scan(self) -> Tuple[int, int]:
+        """End of the valid records; a torn or corrupted record ends the segment."""
+        offset = records = 0
+        while offset + _HEADER.size <= self.size:
+            length, checksum = _HEADER.unpack_from(self.map, offset)
+            end = offset + _HEADER.size + length
+            if length == 0 or end > self.size:
+                break
+            if zlib.crc32(self.map[offset + _HEADER.size:end]) != checksum:
+                logging.warning(f"Corrupted record in {self.path} at offset {offset}, ignoring the rest")
+                break
+            offset = end
+            records += 1
+        return offset, records
+
+    def append(self, payload: bytes) -> bool:
+        end = self.end + _HEADER.size + len(payload)
+        if end > self.size:
+            return False
+        self.map[self.end + _HEADER.size:end] = payload
+        # The header goes last, so a crash mid-write leaves a zero length
+        self.map[self.end:self.end + _HEADER.size] = _HEADER.pack(len(payload), zlib.crc32(payload))
+        self.end = end
+        self.records += 1
+        return True
+
+    def read(self, offset: int, max_records: int) -> Tuple[List[bytes], int]:
+        payloads = []
+        while offset < self.end and len(payloads) < max_records:
+            length, _ = _HEADER.unpack_from(self.map, offset)
+            payloads.append(self.map[offset + _HEADER.size:offset + _HEADER.size + length])
+            offset += _HEADER.size + length
+        return payloads, offset
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+
+    def delete(self):
+        self.map.close()
+        os.remove(self.path)
+
+
+class SpillLog:
+    """
+    Append-only local log of serialized records, for when the queue is not
+    reachable. Records go to memory-mapped segment files of segment_size
+    bytes, each one with a CRC32 so torn writes are detected on recovery.
+    Segments that have been read entirely are deleted; beyond max_bytes
+    the oldest segment is dropped, unread records included. The read
+    position is kept in a cursor file, so records survive a restart and
+    are not read twice. A directory is used by one process at a time.
+    """
+
+    def __init__(self, directory: str, segment_size: int = 16 * 1024 * 1024, max_bytes: int = 1024 * 1024 * 1024):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_bytes = max(max_bytes, segment_size)
+        self._lock = threading.Lock()
+        self._cursor_path = os.path.join(directory, "cursor")
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(os.path.join(directory, "lock"), "wb")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            raise
+        self._segments: Deque[_Segment] = deque(
+            _Segment(os.path.join(directory, name), int(name[8:-4]), segment_size)
+            for name in sorted(os.listdir(directory))
+            if name.startswith("segment-") and name.endswith(".log")
+        )
+        # Always points into the first segment
+        self._read_position: Position = self._load_cursor()
+        while self._segments and self._segments[0].sequence < self._read_position[0]:
+            self._segments.popleft().delete()
+        if not self._segments:
+            self._roll()
+        first = self._segments[0]
+        if self._read_position[0] != first.sequence:
+            self._read_position = (first.sequence, 0, 0)
+        elif self._read_position[1] > first.end:
+            self._read_position = (first.sequence, first.end, first.records)
+        if self.pending_records:
+            logging.info(f"Recovered {self.pending_records} spilled records from {directory}")
+
+    @classmethod
+    def open_slot(cls, root: str, **kwargs) -> "SpillLog":
+        """
+        Log in the first of root/0, root/1, ... not used by another process,
+        so each worker process gets its own and finds it again after a restart.
+        """
+        for slot in itertools.count():
+            try:
+                return cls(os.path.join(root, str(slot)), **kwargs)
+            except BlockingIOError:
+                continue
+
+    @property
+    def pending_records(self) -> int:
+        return sum(segment.records for segment in self._segments) - self._read_position[2]
+
+    def append(self, *payloads: bytes):
+        with self._lock:
+            for payload in payloads:
+                if not payload or _HEADER.size + len(payload) > self.segment_size:
+                    logging.error(f"Cannot spill a record of {len(payload)} bytes")
+                    continue
+                if not self._segments[-1].append(payload):
+                    self._roll()
+                    self._segments[-1].append(payload)
+
+    def peek(self, max_records: int) -> Tuple[List[bytes], Position]:
+        """Up to max_records oldest unread records and the position after them."""
+        with self._lock:
+            sequence, offset, read = self._read_position
+            segment = self._segments[0]
+            if offset >= segment.end and len(self._segments) > 1:
+                segment, offset, read = self._segments[1], 0, 0
+            payloads, end = segment.read(offset, max_records)
+            return payloads, (segment.sequence, end, read + len(payloads))
+
+    def commit(self, position: Position):
+        """Mark records up to position (as returned by peek) as read."""
+        with self._lock:
+            while len(self._segments) > 1 and self._segments[0].sequence < position[0]:
+                self._segments.popleft().delete()
+            # Otherwise the segment was dropped for space in the meantime
+            if self._segments[0].sequence == position[0]:
+                self._read_position = position
+            if len(self._segments) > 1 and self._read_position[1] >= self._segments[0].end:
+                self._segments.popleft().delete()
+                self._read_position = (self._segments[0].sequence, 0, 0)
+            self._save_cursor()
+
+    def close(self):
+        with self._lock:
+            self._save_cursor()
+            for segment in self._segments:
+                segment.close()
+            self._segments.clear()
+            self._lock_file.close()
+
+    def _roll(self):
+        sequence = self._segments[-1].sequence + 1 if self._segments else self._read_position[0]
+        path = os.path.join(self.directory, _SEGMENT_NAME.format(sequence))
+        self._segments.append(_Segment(path, sequence, self.segment_size))
+        while len(self._segments) > 1 and len(self._segments) * self.segment_size > self.max_bytes:
+            dropped = self._segments.popleft()
+            logging.error(f"Spill log is over {self.max_bytes} bytes, dropping {dropped.path}")
+            dropped.delete()
+            self._read_position = (self._segments[0].sequence, 0, 0)
+            self._save_cursor()
+
+    def _load_cursor(self) -> Position:
+        try:
+            with open(self._cursor_path, "rb") as file:
+                return _CURSOR.unpack(file.read(_CURSOR.size))
+        except (OSError, struct.error):
+            return (0, 0, 0)
+
+    def _save_cursor(self):
+        with open(self._cursor_path, "r+b" if os.path.exists(self._cursor_path) else "wb") as file:
+            file.write(_CURSOR.pack(*self._read_position))
@@ -1,53 +1,87 @@
-import json
+import asyncio
 import logging
+import random
 from typing import List
-from datetime import datetime
 
-import pydantic_core
-import requests
+import httpx
+from pydantic import TypeAdapter
 
+from app.adapters.wire_format import CONTENT_TYPES, JSON, join_batch
 from app.entities.processed_agent_data import ProcessedAgentData
-from app.interfaces.store_gateway import StoreGateway
+from app.interfaces.store_gateway import StoreGateway, StoreRejectedError
 
+# Statuses worth retrying; any other error response will fail again. The
+# store answers 503 while its database is unreachable and 500 only for
+# other errors, such as data the database refuses
+RETRY_STATUSES = {429, 502, 503, 504}
 
-# Додаємо кастомний JSON-енкодер
-class DateTimeEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
+_batch_adapter = TypeAdapter(List[ProcessedAgentData])
 
 
 class StoreApiAdapter(StoreGateway):
-    def __init__(self, api_base_url):
+    """
+    Sends batches to the Store API over a pooled keep-alive httpx.AsyncClient.
+    At most max_in_flight batches are sent at once. Connection errors,
+    timeouts and the statuses in RETRY_STATUSES are retried up to
+    max_retries times with exponential backoff and full jitter. Any other
+    error response raises StoreRejectedError.
+    """
+
+    def __init__(
+        self,
+        api_base_url,
+        max_in_flight: int = 4,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff: float = 0.2,
+        transport: httpx.AsyncBaseTransport = None,
+    ):
         self.api_base_url = api_base_url
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._client = httpx.AsyncClient(
+            base_url=api_base_url,
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+            limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight),
+            transport=transport,
+        )
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def save_data(self, processed_agent_data_batch: List[ProcessedAgentData]) -> bool:
+        # One pydantic pass straight to JSON bytes, no intermediate dicts
+        return await self._post(
+            _batch_adapter.dump_json(processed_agent_data_batch), len(processed_agent_data_batch)
+        )
 
-    def save_data(self, processed_agent_data_batch: List[ProcessedAgentData]):
-        try:
-            # Конвертуємо дані в JSON формат з обробкою datetime
-            data = []
-            for item in processed_agent_data_batch:
-                item_dict = item.model_dump()
-                # Конвертуємо datetime в рядок
-                if 'agent_data' in item_dict and 'timestamp' in item_dict['agent_data']:
-                    if isinstance(item_dict['agent_data']['timestamp'], datetime):
-                        item_dict['agent_data']['timestamp'] = item_dict['agent_data']['timestamp'].isoformat()
-                data.append(item_dict)
-            
-            # Відправляємо POST запит до API
-            response = requests.post(
-                f"{self.api_base_url}/processed_agent_data/",
-                json=data,
-                headers={"Content-Type": "application/json"}
-            )
-            
-            # Перевіряємо статус відповіді
-            response.raise_for_status()
-            
-            logging.info(f"Successfully saved {len(processed_agent_data_batch)} records")
-            return True
-            
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Failed to save data: {str(e)}")
+    async def save_raw_data(self, payloads: List[bytes], wire_format: str = JSON) -> bool:
+        # Payloads are already validated records; the array is assembled as bytes
+        return await self._post(join_batch(payloads, wire_format), len(payloads), wire_format)
+
+    async def _post(self, content: bytes, count: int, wire_format: str = JSON) -> bool:
+        async with self._in_flight:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await self._client.post(
+                        "/processed_agent_data/",
+                        content=content,
+                        headers={"Content-Type": CONTENT_TYPES[wire_format]},
+                    )
+                    if response.status_code not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        logging.info(f"Successfully saved {count} records")
+                        return True
+                    error = f"HTTP {response.status_code}"
+                except httpx.HTTPStatusError as e:
+                    logging.error(f"Failed to save data: {str(e)}")
+                    raise StoreRejectedError(f"HTTP {e.response.status_code}") from e
+                except httpx.TransportError as e:
+                    error = f"{type(e).__name__}: {str(e)}"
+                if attempt < self.max_retries:
+                    delay = random.uniform(0, self.backoff * 2 ** attempt)
+                    logging.warning(f"Store request failed ({error}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+            logging.error(f"Failed to save data after {self.max_retries + 1} attempts: {error}")
             return False
-        
+
+    async def close(self):
+        await self._client.aclose()
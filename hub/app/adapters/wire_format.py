@@ -0,0 +1,218 @@
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Tuple
+
+import msgpack
+from pydantic import TypeAdapter
+
+from app.entities.processed_agent_data import ProcessedAgentData
+
+# Wire formats for processed agent data. JSON stays the default; MessagePack
+# uses the compact positional schema shared with the agent, edge and store:
+#   [road_state, user_id, x, y, z, latitude, longitude, timestamp(, idempotency_key)]
+# with the timestamp as a MessagePack Timestamp (naive values are UTC).
+JSON = "json"
+MSGPACK = "msgpack"
+WIRE_FORMATS = (JSON, MSGPACK)
+CONTENT_TYPES = {JSON: "application/json", MSGPACK: "application/msgpack"}
+
+# fixarray of 8 or 9 elements: a record without or with idempotency_key
+_RECORD_HEADER = b"\x98"
+_KEYED_RECORD_HEADER = b"\x99"
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Validate positional records in pydantic-core without building models
+_record_adapter = TypeAdapter(Tuple[str, int, float, float, float, float, float, datetime])
+_record_list_adapter = TypeAdapter(List[Tuple[str, int, float, float, float, float, float, datetime]])
+_batch_adapter = TypeAdapter(List[ProcessedAgentData])
+
+
+def wire_format_for(content_type: str) -> str:
+    """Wire format named by a Content-Type header; JSON if none or unknown."""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack"):
+        return MSGPACK
+    return JSON
+
+
+def _array_header_size(payload: bytes) -> int:
+    """Size of the MessagePack array header payload starts with, 0 if none."""
+    first = payload[:1]
+    if b"\x90" <= first <= b"\x9f":
+        return 1
+    return {b"\xdc": 3, b"\xdd": 5}.get(first, 0)
+
+
+def detect_wire_format(payload: bytes) -> str:
+    """
+    MQTT has no content type; MessagePack records and batches start with
+    an array header, which never starts a JSON document.
+    """
+    return MSGPACK if _array_header_size(payload) else JSON
+
+
+def is_batch(payload: bytes, wire_format: str) -> bool:
+    """An array of records rather than a single record."""
+    if wire_format == MSGPACK:
+        # A record starts with road_state, a batch with the first record
+        return _array_header_size(payload[_array_header_size(payload):]) > 0
+    return payload.lstrip()[:1] == b"["
+
+
+def _pack_timestamp(value: datetime) -> msgpack.Timestamp:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return msgpack.Timestamp.from_datetime(value)
+
+
+def encode_processed_agent_data(processed_agent_data: ProcessedAgentData, wire_format: str) -> bytes:
+    """Serialize without idempotency_key, which is added when the item is flushed."""
+    if wire_format == MSGPACK:
+        agent_data = processed_agent_data.agent_data
+        return msgpack.packb([
+            processed_agent_data.road_state,
+            agent_data.user_id,
+            agent_data.accelerometer.x,
+            agent_data.accelerometer.y,
+            agent_data.accelerometer.z,
+            agent_data.gps.latitude,
+            agent_data.gps.longitude,
+            _pack_timestamp(agent_data.timestamp),
+        ])
+    return processed_agent_data.model_dump_json(exclude={"idempotency_key"}).encode()
+
+
+def _unpack_record(payload: bytes) -> tuple:
+    values = msgpack.unpackb(payload, timestamp=3, use_list=False)
+    if not isinstance(values, tuple) or len(values) not in (8, 9):
+        raise ValueError("Expected a MessagePack array of 8 or 9 values")
+    return values
+
+
+def decode_processed_agent_data(payload: bytes, wire_format: str, strict: bool = False) -> ProcessedAgentData:
+    if wire_format != MSGPACK:
+        return ProcessedAgentData.model_validate_json(payload, strict=strict)
+    return _from_values(_unpack_record(payload), strict)
+
+
+def _from_values(values: tuple, strict: bool = False) -> ProcessedAgentData:
+    road_state, user_id, x, y, z, latitude, longitude, timestamp = values[:8]
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.replace(tzinfo=None)
+    return ProcessedAgentData.model_validate(
+        {
+            "road_state": road_state,
+            "agent_data": {
+                "user_id": user_id,
+                "accelerometer": {"x": x, "y": y, "z": z},
+                "gps": {"latitude": latitude, "longitude": longitude},
+                "timestamp": timestamp,
+            },
+            "idempotency_key": values[8] if len(values) == 9 else None,
+        },
+        strict=strict,
+    )
+
+
+class QueueRecord(NamedTuple):
+    """A validated payload in the queue format with the key it is deduplicated and ordered by."""
+    user_id: int
+    # Microseconds since the epoch; naive timestamps are UTC
+    timestamp: int
+    payload: bytes
+
+
+def _epoch_us(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def to_queue_record(payload: bytes, payload_format: str, queue_format: str, strict: bool = False) -> QueueRecord:
+    """
+    Validate an incoming payload and return it in queue_format. Payloads
+    already in that format are kept byte for byte, except MessagePack
+    records that carry an idempotency_key or have another array header
+    than a fixarray of 8 (e.g. an array16 from another encoder), which
+    with_idempotency_key relies on.
+    """
+    if payload_format == queue_format == MSGPACK and payload.startswith(_RECORD_HEADER):
+        values = _record_adapter.validate_python(_unpack_record(payload)[:8], strict=strict)
+        return QueueRecord(values[1], _epoch_us(values[7]), payload)
+    if payload_format == queue_format != MSGPACK:
+        agent_data = ProcessedAgentData.model_validate_json(payload, strict=strict).agent_data
+        return QueueRecord(agent_data.user_id, _epoch_us(agent_data.timestamp), payload)
+    processed_agent_data = decode_processed_agent_data(payload, payload_format, strict)
+    return QueueRecord(
+        processed_agent_data.agent_data.user_id,
+        _epoch_us(processed_agent_data.agent_data.timestamp),
+        encode_processed_agent_data(processed_agent_data, queue_format),
+    )
+
+
+def to_queue_records(payload: bytes, payload_format: str, queue_format: str) -> List[QueueRecord]:
+    """Validate an array of records in one pass and return them in queue_format."""
+    if payload_format != MSGPACK:
+        batch = _batch_adapter.validate_json(payload)
+    else:
+        values = msgpack.unpackb(payload, timestamp=3, use_list=False)
+        if not isinstance(values, tuple) or not all(
+            isinstance(record, tuple) and len(record) in (8, 9) for record in values
+        ):
+            raise ValueError("Expected a MessagePack array of arrays of 8 or 9 values")
+        records = _record_list_adapter.validate_python([record[:8] for record in values])
+        if queue_format == MSGPACK:
+            return [
+                QueueRecord(record[1], _epoch_us(record[7]), msgpack.packb([*record[:7], _pack_timestamp(record[7])]))
+                for record in records
+            ]
+        batch = [_from_values(record) for record in records]
+    return [
+        QueueRecord(
+            processed_agent_data.agent_data.user_id,
+            _epoch_us(processed_agent_data.agent_data.timestamp),
+            encode_processed_agent_data(processed_agent_data, queue_format),
+        )
+        for processed_agent_data in batch
+    ]
+
+
+def json_lines_to_queue_records(lines: List[bytes], queue_format: str) -> List[QueueRecord]:
+    """
+    Validate JSON records, one per line, in one pass as an array and return
+    them in queue_format; in JSON they are kept byte for byte.
+    """
+    batch = _batch_adapter.validate_json(b"[" + b",".join(lines) + b"]")
+    # A line holding more than one record (or none) would misalign them
+    if len(batch) != len(lines):
+        raise ValueError("Expected one JSON record per line")
+    return [
+        QueueRecord(
+            processed_agent_data.agent_data.user_id,
+            _epoch_us(processed_agent_data.agent_data.timestamp),
+            line if queue_format == JSON else encode_processed_agent_data(processed_agent_data, queue_format),
+        )
+        for line, processed_agent_data in zip(lines, batch)
+    ]
+
+
+def to_queue_payload(payload: bytes, payload_format: str, queue_format: str, strict: bool = False) -> bytes:
+    return to_queue_record(payload, payload_format, queue_format, strict).payload
+
+
+def with_idempotency_key(payload: bytes, idempotency_key: str, wire_format: str) -> bytes:
+    """Add idempotency_key to a queued payload without re-serializing it."""
+    if wire_format == MSGPACK:
+        if not payload.startswith(_RECORD_HEADER):
+            raise ValueError("Expected a queued MessagePack record, a fixarray of 8 values")
+        return _KEYED_RECORD_HEADER + payload[1:] + msgpack.packb(idempotency_key)
+    # For JSON the last occurrence of a key wins, overriding any sent by a client
+    return payload.rstrip()[:-1] + b',"idempotency_key":"' + idempotency_key.encode() + b'"}'
+
+
+def join_batch(payloads: List[bytes], wire_format: str) -> bytes:
+    """Array of already serialized records, assembled as bytes."""
+    if wire_format == MSGPACK:
+        return msgpack.Packer().pack_array_header(len(payloads)) + b"".join(payloads)
+    return b"[" + b",".join(payloads) + b"]"
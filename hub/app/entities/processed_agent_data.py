@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 from app.entities.agent_data import AgentData
 
@@ -5,3 +7,5 @@ from app.entities.agent_data import AgentData
 class ProcessedAgentData(BaseModel):
     road_state: str
     agent_data: AgentData
+    # Redis stream entry id, lets the store drop redelivered items
+    idempotency_key: Optional[str] = None
@@ -1,8 +1,16 @@
 from abc import ABC, abstractmethod
 from typing import List
+from app.adapters.wire_format import JSON, decode_processed_agent_data
 from app.entities.processed_agent_data import ProcessedAgentData
 
 
+class StoreRejectedError(Exception):
+    """
+    The store is reachable but refuses the data itself (e.g. HTTP 422 or
+    500 for a bad record), so sending it again as it is will fail again.
+    """
+
+
 class StoreGateway(ABC):
     """
     Abstract class representing the Store Gateway interface.
@@ -10,12 +18,38 @@ class StoreGateway(ABC):
     """
 
     @abstractmethod
-    def save_data(self, processed_agent_data_batch: List[ProcessedAgentData]) -> bool:
+    async def save_data(self, processed_agent_data_batch: List[ProcessedAgentData]) -> bool:
         """
         Method to save the processed agent data in the database.
         Parameters:
             processed_agent_data_batch (ProcessedAgentData): The processed agent data to be saved.
         Returns:
-            bool: True if the data is successfully saved, False otherwise.
+            bool: True if the data is successfully saved, False if the store is unavailable.
+        Raises:
+            StoreRejectedError: If the store refuses the data.
+        """
+        pass
+
+    async def save_raw_data(self, payloads: List[bytes], wire_format: str = JSON) -> bool:
+        """
+        Method to save processed agent data given as serialized records.
+        Adapters that can send the bytes as they are should override it.
+        Parameters:
+            payloads (List[bytes]): ProcessedAgentData records in wire_format.
+            wire_format (str): JSON or MSGPACK, see app.adapters.wire_format.
+        Returns:
+            bool: True if the data is successfully saved, False if the store is unavailable.
+        Raises:
+            StoreRejectedError: If the store refuses the data or a payload is invalid.
+        """
+        try:
+            processed_agent_data_batch = [decode_processed_agent_data(payload, wire_format) for payload in payloads]
+        except ValueError as e:
+            raise StoreRejectedError(f"Invalid payload: {e}") from e
+        return await self.save_data(processed_agent_data_batch)
+
+    async def close(self):
+        """
+        Method to release connections held by the gateway.
         """
         pass
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import List
+
+from app.adapters.redis_stream_queue import RedisStreamQueue, StreamEntry
+from app.adapters.wire_format import JSON, encode_processed_agent_data, with_idempotency_key
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.store_gateway import StoreGateway, StoreRejectedError
+
+# Outcomes of sending a batch
+_SENT = "sent"
+_FAILED = "failed"  # store unavailable, worth retrying as it is
+_REJECTED = "rejected"  # store refused the data
+
+
+class AdaptiveBatchSize:
+    """
+    Additive-increase / multiplicative-decrease batch size. Grows while the
+    store answers within target_latency and halves when it is slower or fails.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target_latency: float, step: int):
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.target_latency = target_latency
+        self.step = step
+        self.value = min(max(initial, minimum), self.maximum)
+        self._lock = threading.Lock()
+
+    def observe(self, batch_size: int, latency: float, success: bool):
+        with self._lock:
+            if not success or latency > self.target_latency:
+                self.value = max(self.minimum, self.value // 2)
+            elif batch_size >= self.value:
+                # Only full batches say anything about what the store can absorb
+                self.value = min(self.maximum, self.value + self.step)
+
+
+class BatchFlusher:
+    """
+    Consumes queued processed agent data and sends it to the store in
+    batches: when a batch fills up or when its oldest item has waited
+    max_linger seconds, whichever comes first. A batch is acknowledged only
+    after the store accepted it; otherwise it stays pending and is retried
+    (by this or another hub replica) once it has been idle for claim_idle
+    seconds. The stream entry id is sent as idempotency_key, so the store
+    keeps a single copy of redelivered items. Entries delivered more than
+    max_deliveries times are bisected while the store rejects them, and
+    single records it keeps rejecting go to the dead-letter stream, so one
+    bad record cannot block the group. Up to max_in_flight batches
+    are sent concurrently from an event loop on the flusher thread.
+    Queued payloads and store requests use wire_format (JSON or MessagePack).
+    """
+
+    def __init__(
+        self,
+        queue: RedisStreamQueue,
+        store_gateway: StoreGateway,
+        batch_size: AdaptiveBatchSize,
+        max_linger: float,
+        claim_idle: float,
+        max_in_flight: int = 1,
+        wire_format: str = JSON,
+        max_deliveries: int = 5,
+    ):
+        self.queue = queue
+        self.store_gateway = store_gateway
+        self.batch_size = batch_size
+        self.max_linger = max_linger
+        self.claim_idle = claim_idle
+        self.max_in_flight = max_in_flight
+        self.wire_format = wire_format
+        self.max_deliveries = max_deliveries
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, processed_agent_data: ProcessedAgentData):
+        self.queue.push(encode_processed_agent_data(processed_agent_data, self.wire_format))
+
+    def add_payload(self, *payloads: bytes):
+        """Queue already validated payloads in wire_format as they are."""
+        self.queue.push(*payloads)
+
+    async def flush(self, entries: List[StreamEntry]) -> bool:
+        return await self._send(entries) == _SENT
+
+    async def _send(self, entries: List[StreamEntry]) -> str:
+        # Queued payloads are already validated; the idempotency key is
+        # added to each one as bytes instead of parsing and re-serializing.
+        # A payload it cannot be added to is rejected like one the store
+        # refuses, so it is dead-lettered in the end
+        started = time.perf_counter()
+        try:
+            payloads = [
+                with_idempotency_key(payload, entry_id, self.wire_format)
+                for entry_id, payload in entries
+            ]
+            success = bool(await self.store_gateway.save_raw_data(payloads, self.wire_format))
+        except (StoreRejectedError, ValueError) as e:
+            # Says nothing about the store's capacity, so the batch size stays
+            logging.error(f"Rejected batch of {len(entries)} items: {e}")
+            return _REJECTED
+        latency = time.perf_counter() - started
+        self.batch_size.observe(len(entries), latency, success)
+        if success:
+            self.queue.ack([entry_id for entry_id, _ in entries])
+        logging.info(
+            f"{'Flushed' if success else 'Failed to flush'} batch of {len(entries)} items "
+            f"in {latency:.3f}s, next batch size {self.batch_size.value}"
+        )
+        return _SENT if success else _FAILED
+
+    async def bisect(self, entries: List[StreamEntry]) -> bool:
+        """
+        Send entries, splitting the batch in halves while the store rejects
+        it; single records it rejects are dead-lettered. False if the store
+        is unavailable, in which case the rest stays pending.
+        """
+        outcome = await self._send(entries)
+        if outcome != _REJECTED:
+            return outcome == _SENT
+        if len(entries) == 1:
+            logging.error(f"Moving entry {entries[0][0]} to {self.queue.dead_letter_stream}")
+            self.queue.dead_letter(entries)
+            return True
+        middle = len(entries) // 2
+        return await self.bisect(entries[:middle]) and await self.bisect(entries[middle:])
+
+    def collect(self) -> List[StreamEntry]:
+        """
+        Read new entries until a full batch is collected or the oldest one
+        has lingered for max_linger seconds. Empty if nothing arrived within
+        max_linger.
+        """
+        batch_size = self.batch_size.value
+        entries = self.queue.read(batch_size, block=self.max_linger)
+        if not entries:
+            return []
+        # Entry ids start with the millisecond the entry was added
+        first_added = int(entries[0][0].split("-")[0]) / 1000
+        deadline = min(first_added, time.time()) + self.max_linger
+        while len(entries) < batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            more = self.queue.read(batch_size - len(entries), block=remaining)
+            if not more:
+                break
+            entries.extend(more)
+        return entries
+
+    async def reclaim(self):
+        """
+        Retry batches that stayed pending for claim_idle seconds; entries
+        delivered more than max_deliveries times are bisected.
+        """
+        while not self._stopped.is_set():
+            entries = self.queue.claim_stale(self.claim_idle, self.batch_size.value)
+            if not entries:
+                return
+            deliveries = self.queue.delivery_counts([entry_id for entry_id, _ in entries])
+            exhausted = [entry for entry in entries if deliveries.get(entry[0], 0) > self.max_deliveries]
+            retried = [entry for entry in entries if deliveries.get(entry[0], 0) <= self.max_deliveries]
+            if retried and not await self.flush(retried):
+                return
+            if exhausted and not await self.bisect(exhausted):
+                return
+
+    def start(self):
+        self.queue.ensure_group()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="batch-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        in_flight = set()
+        last_reclaim = 0.0
+        try:
+            while not self._stopped.is_set():
+                try:
+                    if time.monotonic() - last_reclaim >= self.claim_idle / 2:
+                        last_reclaim = time.monotonic()
+                        await self.reclaim()
+                    # XREADGROUP blocks, so it runs off the event loop
+                    entries = await asyncio.to_thread(self.collect)
+                    if entries:
+                        task = asyncio.create_task(self._flush_logged(entries))
+                        in_flight.add(task)
+                        task.add_done_callback(in_flight.discard)
+                    if len(in_flight) >= self.max_in_flight:
+                        await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                except Exception as e:
+                    logging.error(f"Error flushing queued data: {e}")
+                    await asyncio.sleep(self.max_linger)
+        finally:
+            # Unfinished batches stay pending and are reclaimed later anyway
+            if in_flight:
+                await asyncio.wait(in_flight)
+            await self.store_gateway.close()
+
+    async def _flush_logged(self, entries: List[StreamEntry]):
+        try:
+            await self.flush(entries)
+        except Exception as e:
+            logging.error(f"Error flushing queued data: {e}")
@@ -0,0 +1,143 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Tuple
+
+from app.adapters.wire_format import QueueRecord
+
+
+class DedupCache:
+    """
+    Remembers (user_id, timestamp) of recently seen records for ttl seconds,
+    at most max_entries of them; the oldest are forgotten first.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Insertion ordered, so expired and oldest entries are at the front
+        self._seen: "OrderedDict[Tuple[int, int], float]" = OrderedDict()
+
+    def add(self, user_id: int, timestamp: int, now: float) -> bool:
+        """True if the key is new, False for a duplicate."""
+        self._evict(now)
+        key = (user_id, timestamp)
+        if key in self._seen:
+            return False
+        self._seen[key] = now
+        if len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+        return True
+
+    def _evict(self, now: float):
+        expired = now - self.ttl
+        while self._seen:
+            seen_at = next(iter(self._seen.values()))
+            if seen_at > expired:
+                return
+            self._seen.popitem(last=False)
+
+    def __len__(self):
+        return len(self._seen)
+
+
+class ReorderBuffer:
+    """
+    Holds records for window seconds and releases them in timestamp order,
+    so data that arrives up to window seconds late is put back in place.
+    Holds at most max_records; beyond that the oldest are released early.
+    """
+
+    def __init__(self, window: float, max_records: int):
+        self.window = window
+        self.max_records = max_records
+        # (timestamp, sequence, arrived, payload); sequence keeps equal timestamps FIFO
+        self._heap: List[Tuple[int, int, float, bytes]] = []
+        self._sequence = itertools.count()
+
+    def add(self, record: QueueRecord, now: float):
+        heapq.heappush(self._heap, (record.timestamp, next(self._sequence), now, record.payload))
+
+    def release(self, now: float) -> List[bytes]:
+        """Payloads that have waited out the window, oldest timestamp first."""
+        released = []
+        ready = now - self.window
+        while self._heap and (self._heap[0][2] <= ready or len(self._heap) > self.max_records):
+            released.append(heapq.heappop(self._heap)[3])
+        return released
+
+    def drain(self) -> List[bytes]:
+        released = [item[3] for item in sorted(self._heap)]
+        self._heap = []
+        return released
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class OrderedIngest:
+    """
+    Sits between the hub's inputs (MQTT, HTTP) and the batch queue: drops
+    records whose (user_id, timestamp) was already seen, e.g. resent after
+    a reconnect or redelivered by MQTT QoS 1, and queues the rest in
+    timestamp order through a reorder window. With window 0 records are
+    queued right away.
+    """
+
+    def __init__(self, dedup: DedupCache, reorder: ReorderBuffer, on_payloads: Callable[..., None]):
+        self.dedup = dedup
+        self.reorder = reorder
+        self.on_payloads = on_payloads
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, *records: QueueRecord):
+        now = time.monotonic()
+        # Released payloads are queued under the lock too, so the queue
+        # gets them in the order they were released
+        with self._lock:
+            fresh = [record for record in records if self.dedup.add(record.user_id, record.timestamp, now)]
+            if self.reorder.window <= 0:
+                released = [record.payload for record in sorted(fresh, key=lambda record: record.timestamp)]
+            else:
+                for record in fresh:
+                    self.reorder.add(record, now)
+                released = self.reorder.release(now)
+            if released:
+                self.on_payloads(*released)
+        if len(fresh) < len(records):
+            logging.info(f"Dropped {len(records) - len(fresh)} duplicate records")
+
+    def start(self):
+        self._stopped.clear()
+        if self.reorder.window > 0:
+            self._thread = threading.Thread(target=self._run, name="reorder-buffer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Queue everything still held in the reorder window."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            released = self.reorder.drain()
+            if released:
+                self.on_payloads(*released)
+
+    def _run(self):
+        # Checked several times per window, so records wait about window seconds
+        interval = max(self.reorder.window / 4, 0.01)
+        while not self._stopped.wait(interval):
+            with self._lock:
+                released = self.reorder.release(time.monotonic())
+                if not released:
+                    continue
+                try:
+                    self.on_payloads(*released)
+                except Exception as e:
+                    logging.error(f"Failed to queue {len(released)} records: {e}")
@@ -0,0 +1,85 @@
+import logging
+import threading
+import time
+from typing import Callable
+
+from redis.exceptions import RedisError
+
+from app.adapters.spill_log import SpillLog
+
+
+class SpillOver:
+    """
+    Queues payloads with push and, when the queue is unavailable, appends
+    them to a local SpillLog instead of dropping them. After a failure the
+    queue is left alone for retry_interval seconds. A background thread
+    replays spilled payloads in batches of replay_batch once the queue is
+    back, at most replay_rate payloads per second, so a long backlog does
+    not hit the store all at once. New data keeps going to the queue
+    directly while the backlog is replayed.
+    """
+
+    def __init__(
+        self,
+        push: Callable[..., None],
+        spill_log: SpillLog,
+        replay_rate: float,
+        replay_batch: int,
+        retry_interval: float = 1.0,
+    ):
+        self.push = push
+        self.spill_log = spill_log
+        self.replay_rate = replay_rate
+        self.replay_batch = replay_batch
+        self.retry_interval = retry_interval
+        self._retry_at = 0.0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, *payloads: bytes):
+        if time.monotonic() >= self._retry_at:
+            try:
+                self.push(*payloads)
+                return
+            except RedisError as e:
+                self._retry_at = time.monotonic() + self.retry_interval
+                logging.error(f"Queue is unavailable, spilling to disk: {e}")
+        self.spill_log.append(*payloads)
+
+    def replay(self) -> int:
+        """Push one batch of spilled payloads; the number replayed."""
+        payloads, position = self.spill_log.peek(self.replay_batch)
+        if not payloads:
+            return 0
+        self.push(*payloads)
+        self.spill_log.commit(position)
+        return len(payloads)
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="spill-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # Unreplayed payloads stay on disk for the next start
+        self.spill_log.close()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if time.monotonic() < self._retry_at or not self.spill_log.pending_records:
+                self._stopped.wait(self.retry_interval)
+                continue
+            started = time.monotonic()
+            try:
+                replayed = self.replay()
+            except RedisError as e:
+                self._retry_at = time.monotonic() + self.retry_interval
+                logging.error(f"Failed to replay spilled data: {e}")
+                continue
+            logging.info(f"Replayed {replayed} spilled records, {self.spill_log.pending_records} left")
+            # Paces batches to replay_rate payloads per second
+            self._stopped.wait(max(replayed / self.replay_rate - (time.monotonic() - started), 0))
@@ -0,0 +1,128 @@
+"""
+Messages-per-second benchmark for the hub's Redis batching.
+
+Compares the old drain (LPUSH, LLEN and BATCH_SIZE separate LPOPs per
+message) with RedisStreamQueue (one XADD per message, then one XREADGROUP
+and one XACK+XDEL pipeline per batch). Runs against fakeredis by default;
+pass a URL to use a real Redis, where round-trips dominate:
+    python benchmarks/bench_batch_drain.py
+    python benchmarks/bench_batch_drain.py redis://localhost:6379/15
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redis import Redis  # noqa: E402
+
+from app.adapters.redis_stream_queue import RedisStreamQueue  # noqa: E402
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData  # noqa: E402
+from app.entities.processed_agent_data import ProcessedAgentData  # noqa: E402
+
+MESSAGES = 20_000
+BATCH_SIZES = (20, 100)
+KEY = "bench_processed_agent_data"
+
+
+class CountingRedis(Redis):
+    """Counts round-trips: one per command, one per executed pipeline."""
+
+    round_trips = 0
+
+    def execute_command(self, *args, **options):
+        self.round_trips += 1
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, *args, **kwargs):
+        pipeline = super().pipeline(*args, **kwargs)
+        execute = pipeline.execute
+
+        def counted_execute(*execute_args, **execute_kwargs):
+            self.round_trips += 1
+            return execute(*execute_args, **execute_kwargs)
+
+        pipeline.execute = counted_execute
+        return pipeline
+
+
+def make_client(url):
+    if url:
+        return CountingRedis.from_url(url)
+    import fakeredis
+
+    class CountingFakeRedis(CountingRedis, fakeredis.FakeRedis):
+        pass
+
+    return CountingFakeRedis()
+
+
+def make_payload():
+    return ProcessedAgentData(
+        road_state="normal",
+        agent_data=AgentData(
+            user_id=1,
+            accelerometer=AccelerometerData(x=0.1, y=0.2, z=0.3),
+            gps=GpsData(latitude=50.45, longitude=30.52),
+            timestamp=datetime(2024, 1, 1),
+        ),
+    ).model_dump_json()
+
+
+def drain_legacy(redis_client, payload, batch_size):
+    redis_client.lpush(KEY, payload)
+    if redis_client.llen(KEY) >= batch_size:
+        return [redis_client.lpop(KEY) for _ in range(batch_size)]
+    return []
+
+
+class StreamDrain:
+    """Pushes every message and reads and acknowledges a batch every batch_size messages."""
+
+    def __init__(self, queue, batch_size):
+        self.queue = queue
+        self.batch_size = batch_size
+        self.pushed = 0
+
+    def __call__(self, payload):
+        self.queue.push(payload)
+        self.pushed += 1
+        if self.pushed % self.batch_size:
+            return []
+        entries = self.queue.read(self.batch_size, block=0)
+        self.queue.ack([entry_id for entry_id, _ in entries])
+        return entries
+
+
+def measure(redis_client, push, batch_size):
+    redis_client.round_trips = 0
+    payload = make_payload()
+    drained = 0
+    started = time.perf_counter()
+    for _ in range(MESSAGES):
+        drained += len(push(payload))
+    elapsed = time.perf_counter() - started
+    assert drained == MESSAGES // batch_size * batch_size
+    return MESSAGES / elapsed, redis_client.round_trips / MESSAGES
+
+
+def main():
+    redis_client = make_client(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"{'batch':>6} {'legacy msg/s':>13} {'rt/msg':>7} {'queue msg/s':>12} {'rt/msg':>7} {'speedup':>8}")
+    for batch_size in BATCH_SIZES:
+        redis_client.delete(KEY)
+        old, old_trips = measure(
+            redis_client, lambda payload: drain_legacy(redis_client, payload, batch_size), batch_size
+        )
+        queue = RedisStreamQueue(redis_client, KEY, "bench", "bench-1")
+        redis_client.delete(KEY)
+        queue.ensure_group()
+        new, new_trips = measure(redis_client, StreamDrain(queue, batch_size), batch_size)
+        print(
+            f"{batch_size:>6} {old:>13.0f} {old_trips:>7.2f} {new:>12.0f} {new_trips:>7.2f} {new / old:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
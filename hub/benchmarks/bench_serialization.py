@@ -0,0 +1,104 @@
+"""
+CPU-per-record benchmark for building the hub -> store request body.
+
+Compares three ways of turning queued ProcessedAgentData JSON into the
+batch sent to the store:
+  legacy       - model_validate_json per item, model_dump, datetime walk, json.dumps
+  TypeAdapter  - model_validate_json per item, one TypeAdapter.dump_json for the batch
+  raw bytes    - idempotency key appended to the queued bytes, array joined as bytes
+                 (what BatchFlusher and StoreApiAdapter.save_raw_data do)
+
+Run from the hub directory:
+    python benchmarks/bench_serialization.py
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData  # noqa: E402
+from app.entities.processed_agent_data import ProcessedAgentData  # noqa: E402
+
+BATCH_SIZE = 100
+ROUNDS = 300
+
+batch_adapter = TypeAdapter(List[ProcessedAgentData])
+
+
+def make_entries():
+    return [
+        (
+            f"1700000000000-{index}",
+            ProcessedAgentData(
+                road_state="normal",
+                agent_data=AgentData(
+                    user_id=index % 5,
+                    accelerometer=AccelerometerData(x=0.1 * index, y=0.2, z=16000.5),
+                    gps=GpsData(latitude=50.45 + index * 1e-5, longitude=30.52),
+                    timestamp=datetime(2024, 1, 1, 12, 0, index % 60),
+                ),
+            ).model_dump_json(exclude={"idempotency_key"}).encode(),
+        )
+        for index in range(BATCH_SIZE)
+    ]
+
+
+def build_legacy(entries):
+    data = []
+    for entry_id, payload in entries:
+        item = ProcessedAgentData.model_validate_json(payload)
+        item.idempotency_key = entry_id
+        item_dict = item.model_dump()
+        if isinstance(item_dict["agent_data"]["timestamp"], datetime):
+            item_dict["agent_data"]["timestamp"] = item_dict["agent_data"]["timestamp"].isoformat()
+        data.append(item_dict)
+    return json.dumps(data).encode()
+
+
+def build_type_adapter(entries):
+    batch = []
+    for entry_id, payload in entries:
+        item = ProcessedAgentData.model_validate_json(payload)
+        item.idempotency_key = entry_id
+        batch.append(item)
+    return batch_adapter.dump_json(batch)
+
+
+def build_raw(entries):
+    return b"[" + b",".join(
+        payload.rstrip()[:-1] + b',"idempotency_key":"' + entry_id.encode() + b'"}'
+        for entry_id, payload in entries
+    ) + b"]"
+
+
+def measure(build, entries):
+    started = time.process_time()
+    for _ in range(ROUNDS):
+        body = build(entries)
+    elapsed = time.process_time() - started
+    assert len(json.loads(body)) == len(entries)
+    return elapsed / (ROUNDS * len(entries)) * 1e6
+
+
+def main():
+    entries = make_entries()
+    expected = json.loads(build_legacy(entries))
+    for build in (build_type_adapter, build_raw):
+        assert [ProcessedAgentData.model_validate(item) for item in json.loads(build(entries))] == [
+            ProcessedAgentData.model_validate(item) for item in expected
+        ]
+    legacy = measure(build_legacy, entries)
+    print(f"{'path':>12} {'CPU us/record':>14} {'speedup':>8}")
+    for name, build in (("legacy", build_legacy), ("TypeAdapter", build_type_adapter), ("raw bytes", build_raw)):
+        cost = legacy if build is build_legacy else measure(build, entries)
+        print(f"{name:>12} {cost:>14.2f} {legacy / cost:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Batches-per-second benchmark for the hub -> store HTTP path.
+
+Compares the old adapter (module-level requests.post, a new connection per
+batch, one batch at a time) with the async StoreApiAdapter (keep-alive pool,
+up to max_in_flight batches at once) against a local stub store that
+answers after STUB_LATENCY seconds.
+
+Run from the hub directory:
+    python benchmarks/bench_store_adapter.py
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+
+from app.adapters.store_api_adapter import StoreApiAdapter  # noqa: E402
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData  # noqa: E402
+from app.entities.processed_agent_data import ProcessedAgentData  # noqa: E402
+
+STUB_PORT = 8765
+STUB_LATENCY = 0.01
+BATCHES = 200
+BATCH_SIZE = 100
+IN_FLIGHT = (1, 4, 16)
+
+stub_store = FastAPI()
+
+
+@stub_store.post("/processed_agent_data/")
+async def stub_save(request: Request):
+    data = await request.json()
+    await asyncio.sleep(STUB_LATENCY)
+    return {"status": "success", "created": len(data)}
+
+
+def start_stub_store():
+    server = uvicorn.Server(
+        uvicorn.Config(stub_store, host="127.0.0.1", port=STUB_PORT, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def make_batch():
+    return [
+        ProcessedAgentData(
+            road_state="normal",
+            agent_data=AgentData(
+                user_id=1,
+                accelerometer=AccelerometerData(x=0.1, y=0.2, z=0.3),
+                gps=GpsData(latitude=50.45, longitude=30.52),
+                timestamp=datetime(2024, 1, 1),
+            ),
+        )
+        for _ in range(BATCH_SIZE)
+    ]
+
+
+def save_legacy(api_base_url, batch):
+    response = requests.post(
+        f"{api_base_url}/processed_agent_data/",
+        json=[item.model_dump(mode="json") for item in batch],
+        headers={"Content-Type": "application/json"},
+    )
+    response.raise_for_status()
+    return True
+
+
+def measure_legacy(api_base_url, batch):
+    started = time.perf_counter()
+    for _ in range(BATCHES):
+        assert save_legacy(api_base_url, batch)
+    return BATCHES / (time.perf_counter() - started)
+
+
+async def measure_async(api_base_url, batch, max_in_flight):
+    adapter = StoreApiAdapter(api_base_url=api_base_url, max_in_flight=max_in_flight)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(adapter.save_data(batch) for _ in range(BATCHES)))
+    elapsed = time.perf_counter() - started
+    await adapter.close()
+    assert all(results)
+    return BATCHES / elapsed
+
+
+def main():
+    server = start_stub_store()
+    api_base_url = f"http://127.0.0.1:{STUB_PORT}"
+    batch = make_batch()
+    legacy = measure_legacy(api_base_url, batch)
+    print(f"{'adapter':>22} {'batches/s':>10} {'speedup':>8}")
+    print(f"{'requests.post':>22} {legacy:>10.0f} {1:>7.1f}x")
+    for max_in_flight in IN_FLIGHT:
+        rate = asyncio.run(measure_async(api_base_url, batch, max_in_flight))
+        print(f"{f'async, {max_in_flight} in flight':>22} {rate:>10.0f} {rate / legacy:>7.1f}x")
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Size and CPU benchmark for the JSON and MessagePack wire formats.
+
+For a batch of queued ProcessedAgentData records it reports the bytes per
+record and the CPU per record of:
+  encode  - encode_processed_agent_data (edge -> hub and hub queue payloads)
+  ingest  - to_queue_payload, i.e. validation of a record that arrives in
+            the queue format (what the hub does for every record it receives)
+  decode  - decode_processed_agent_data into a ProcessedAgentData
+  batch   - idempotency key added and the store request body joined as bytes
+            (what BatchFlusher and StoreApiAdapter.save_raw_data do)
+
+Run from the hub directory:
+    python benchmarks/bench_wire_format.py
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.adapters.wire_format import (  # noqa: E402
+    JSON,
+    MSGPACK,
+    decode_processed_agent_data,
+    encode_processed_agent_data,
+    join_batch,
+    to_queue_payload,
+    with_idempotency_key,
+)
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData  # noqa: E402
+from app.entities.processed_agent_data import ProcessedAgentData  # noqa: E402
+
+BATCH_SIZE = 100
+ROUNDS = 300
+
+
+def make_records():
+    return [
+        ProcessedAgentData(
+            road_state="normal",
+            agent_data=AgentData(
+                user_id=index % 5,
+                accelerometer=AccelerometerData(x=0.1 * index, y=0.2, z=16000.5),
+                gps=GpsData(latitude=50.45 + index * 1e-5, longitude=30.52),
+                timestamp=datetime(2024, 1, 1, 12, 0, index % 60, 1000 * index),
+            ),
+        )
+        for index in range(BATCH_SIZE)
+    ]
+
+
+def measure(operation):
+    started = time.process_time()
+    for _ in range(ROUNDS):
+        operation()
+    return (time.process_time() - started) / (ROUNDS * BATCH_SIZE) * 1e6
+
+
+def main():
+    records = make_records()
+    print(f"{'format':>8} {'bytes/record':>13} {'batch bytes':>12} {'encode us':>10} {'ingest us':>10} {'decode us':>10} {'batch us':>9}")
+    for wire_format in (JSON, MSGPACK):
+        payloads = [encode_processed_agent_data(record, wire_format) for record in records]
+        assert [decode_processed_agent_data(payload, wire_format) for payload in payloads] == records
+        entry_ids = [f"1700000000000-{index}" for index in range(BATCH_SIZE)]
+
+        def build_batch():
+            return join_batch(
+                [with_idempotency_key(payload, entry_id, wire_format) for entry_id, payload in zip(entry_ids, payloads)],
+                wire_format,
+            )
+
+        encode = measure(lambda: [encode_processed_agent_data(record, wire_format) for record in records])
+        ingest = measure(lambda: [to_queue_payload(payload, wire_format, wire_format) for payload in payloads])
+        decode = measure(lambda: [decode_processed_agent_data(payload, wire_format) for payload in payloads])
+        batch = measure(build_batch)
+        size = sum(len(payload) for payload in payloads) / BATCH_SIZE
+        print(
+            f"{wire_format:>8} {size:>13.1f} {len(build_batch()):>12} "
+            f"{encode:>10.2f} {ingest:>10.2f} {decode:>10.2f} {batch:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import socket
 
 
 def try_parse_int(value: str):
@@ -8,19 +9,113 @@ def try_parse_int(value: str):
         return None
 
 
+def try_parse_float(value: str):
+    try:
+        return float(value)
+    except Exception:
+        return None
+
+
+def try_parse_partitions(value: str):
+    """Partition numbers from a list like "0-3,8", None if there are none or it is invalid."""
+    try:
+        partitions = set()
+        for part in value.split(","):
+            first, _, last = part.strip().partition("-")
+            partitions.update(range(int(first), int(last or first) + 1))
+        return sorted(partitions) or None
+    except Exception:
+        return None
+
+
 # Configuration for the Store API
 STORE_API_HOST = os.environ.get("STORE_API_HOST") or "localhost"
 STORE_API_PORT = try_parse_int(os.environ.get("STORE_API_PORT")) or 8000
 STORE_API_BASE_URL = f"http://{STORE_API_HOST}:{STORE_API_PORT}"
+# Batches sent to the store concurrently, per-request timeout in seconds and
+# retries with jittered exponential backoff starting at STORE_RETRY_BACKOFF
+STORE_MAX_IN_FLIGHT = try_parse_int(os.environ.get("STORE_MAX_IN_FLIGHT")) or 4
+STORE_TIMEOUT = try_parse_float(os.environ.get("STORE_TIMEOUT")) or 10.0
+STORE_MAX_RETRIES = try_parse_int(os.environ.get("STORE_MAX_RETRIES")) or 3
+STORE_RETRY_BACKOFF = try_parse_float(os.environ.get("STORE_RETRY_BACKOFF")) or 0.2
 
 # Configure for Redis
 REDIS_HOST = os.environ.get("REDIS_HOST") or "localhost"
 REDIS_PORT = try_parse_int(os.environ.get("REDIS_PORT")) or 6379
+# Seconds to connect to Redis and to wait for a reply. A Redis that stops
+# answering then fails fast and data is spilled to disk instead of blocking
+# ingest; the reply timeout is kept above the XREADGROUP block time
+REDIS_CONNECT_TIMEOUT = try_parse_float(os.environ.get("REDIS_CONNECT_TIMEOUT")) or 2.0
+REDIS_SOCKET_TIMEOUT = try_parse_float(os.environ.get("REDIS_SOCKET_TIMEOUT")) or 5.0
+# Stream and consumer group shared by all hub replicas; every replica needs a
+# unique consumer name. Batches left unacknowledged for REDIS_CLAIM_IDLE
+# seconds (failed store call, crashed replica) are retried.
+REDIS_STREAM = os.environ.get("REDIS_STREAM") or "processed_agent_data"
+REDIS_CONSUMER_GROUP = os.environ.get("REDIS_CONSUMER_GROUP") or "hub"
+REDIS_CONSUMER_NAME = os.environ.get("REDIS_CONSUMER_NAME") or f"{socket.gethostname()}-{os.getpid()}"
+REDIS_CLAIM_IDLE = try_parse_float(os.environ.get("REDIS_CLAIM_IDLE")) or 30.0
+# Entries delivered more than REDIS_MAX_DELIVERIES times are bisected while
+# the store rejects them; records it keeps rejecting are moved to
+# REDIS_DEAD_LETTER_STREAM (with their original entry id) and acknowledged
+REDIS_MAX_DELIVERIES = try_parse_int(os.environ.get("REDIS_MAX_DELIVERIES")) or 5
+REDIS_DEAD_LETTER_STREAM = os.environ.get("REDIS_DEAD_LETTER_STREAM") or f"{REDIS_STREAM}:dead"
 
 # Configure for hub logic
 BATCH_SIZE = try_parse_int(os.environ.get("BATCH_SIZE")) or 20
+# Batch size adapts between MIN_BATCH_SIZE and MAX_BATCH_SIZE: it grows by
+# BATCH_SIZE_STEP while the store answers within STORE_TARGET_LATENCY
+# seconds and halves when it does not. Data never waits in Redis for more
+# than about BATCH_MAX_LINGER seconds.
+MIN_BATCH_SIZE = try_parse_int(os.environ.get("MIN_BATCH_SIZE")) or BATCH_SIZE
+MAX_BATCH_SIZE = try_parse_int(os.environ.get("MAX_BATCH_SIZE")) or 500
+BATCH_SIZE_STEP = try_parse_int(os.environ.get("BATCH_SIZE_STEP")) or 10
+BATCH_MAX_LINGER = try_parse_float(os.environ.get("BATCH_MAX_LINGER")) or 1.0
+STORE_TARGET_LATENCY = try_parse_float(os.environ.get("STORE_TARGET_LATENCY")) or 0.5
 
 # MQTT
 MQTT_BROKER_HOST = os.environ.get("MQTT_BROKER_HOST") or "localhost"
 MQTT_BROKER_PORT = try_parse_int(os.environ.get("MQTT_BROKER_PORT")) or 1883
 MQTT_TOPIC = os.environ.get("MQTT_TOPIC") or "processed_agent_data_topic"
+# With MQTT_SHARED_GROUP set, hub processes subscribe to the plain topic
+# through $share/<group>/<topic> (MQTT v5) and the broker splits its
+# messages between them. Messages are validated by MQTT_WORKERS threads per process, each
+# <topic>/<partition> always by the same one to keep per-vehicle order.
+MQTT_SHARED_GROUP = os.environ.get("MQTT_SHARED_GROUP") or ""
+# Partitioned topics are never shared: the broker would spread a vehicle's
+# consecutive messages over the group. Each process subscribes to the
+# <topic>/<n> in MQTT_PARTITIONS_OWNED (e.g. "0-7"), which must not overlap
+# between processes; unset, it takes every partition (<topic>/+). Only the
+# plain, unpartitioned topic goes through MQTT_SHARED_GROUP.
+MQTT_PARTITIONS_OWNED = try_parse_partitions(os.environ.get("MQTT_PARTITIONS_OWNED")) or []
+MQTT_WORKERS = try_parse_int(os.environ.get("MQTT_WORKERS")) or 4
+MQTT_WORKER_QUEUE_SIZE = try_parse_int(os.environ.get("MQTT_WORKER_QUEUE_SIZE")) or 1000
+MQTT_CLIENT_ID = os.environ.get("MQTT_CLIENT_ID") or f"hub-{socket.gethostname()}-{os.getpid()}"
+
+# Records with a (user_id, timestamp) seen in the last DEDUP_TTL seconds are
+# dropped; at most DEDUP_MAX_ENTRIES keys are remembered. Records are held
+# for REORDER_WINDOW seconds (0 disables it) and queued in timestamp order.
+DEDUP_TTL = try_parse_float(os.environ.get("DEDUP_TTL")) or 300.0
+DEDUP_MAX_ENTRIES = try_parse_int(os.environ.get("DEDUP_MAX_ENTRIES")) or 100000
+REORDER_WINDOW = try_parse_float(os.environ.get("REORDER_WINDOW"))
+if REORDER_WINDOW is None:
+    REORDER_WINDOW = 0.5
+REORDER_MAX_RECORDS = try_parse_int(os.environ.get("REORDER_MAX_RECORDS")) or 10000
+
+# While Redis is unavailable data is spilled to segment files of
+# SPILL_SEGMENT_SIZE bytes under SPILL_DIR (one subdirectory per process),
+# at most SPILL_MAX_BYTES per process, and replayed in batches of
+# SPILL_REPLAY_BATCH at SPILL_REPLAY_RATE records per second once it is back
+SPILL_DIR = os.environ.get("SPILL_DIR") or "spill"
+SPILL_SEGMENT_SIZE = try_parse_int(os.environ.get("SPILL_SEGMENT_SIZE")) or 16 * 1024 * 1024
+SPILL_MAX_BYTES = try_parse_int(os.environ.get("SPILL_MAX_BYTES")) or 1024 * 1024 * 1024
+SPILL_REPLAY_RATE = try_parse_float(os.environ.get("SPILL_REPLAY_RATE")) or 2000.0
+SPILL_REPLAY_BATCH = try_parse_int(os.environ.get("SPILL_REPLAY_BATCH")) or 500
+
+# Lines of an NDJSON upload validated and queued together
+NDJSON_CHUNK_SIZE = try_parse_int(os.environ.get("NDJSON_CHUNK_SIZE")) or 1000
+# Longer lines are rejected with 413 instead of being buffered
+NDJSON_MAX_LINE_BYTES = try_parse_int(os.environ.get("NDJSON_MAX_LINE_BYTES")) or 64 * 1024
+
+# Format of queued payloads and of batches sent to the store: json or msgpack.
+# Incoming data is accepted in either format.
+WIRE_FORMAT = os.environ.get("WIRE_FORMAT") or "json"
@@ -1,22 +1,67 @@
 import logging
-from typing import List
 import json
+from contextlib import asynccontextmanager
 from datetime import datetime
 
-from fastapi import FastAPI
-from redis import Redis
-import paho.mqtt.client as mqtt
+from fastapi import FastAPI, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 
+from app.adapters.agent_mqtt_adapter import AgentMQTTAdapter
+from app.adapters.redis_stream_queue import RedisStreamQueue, make_redis_client
+from app.adapters.spill_log import SpillLog
 from app.adapters.store_api_adapter import StoreApiAdapter
-from app.entities.processed_agent_data import ProcessedAgentData
+from app.adapters.wire_format import (
+    JSON,
+    json_lines_to_queue_records,
+    to_queue_record,
+    to_queue_records,
+    wire_format_for,
+)
+from app.usecases.batch_flusher import AdaptiveBatchSize, BatchFlusher
+from app.usecases.ordered_ingest import DedupCache, OrderedIngest, ReorderBuffer
+from app.usecases.spill_over import SpillOver
 from config import (
     STORE_API_BASE_URL,
+    STORE_MAX_IN_FLIGHT,
+    STORE_TIMEOUT,
+    STORE_MAX_RETRIES,
+    STORE_RETRY_BACKOFF,
     REDIS_HOST,
     REDIS_PORT,
+    REDIS_CONNECT_TIMEOUT,
+    REDIS_SOCKET_TIMEOUT,
+    REDIS_STREAM,
+    REDIS_CONSUMER_GROUP,
+    REDIS_CONSUMER_NAME,
+    REDIS_CLAIM_IDLE,
+    REDIS_MAX_DELIVERIES,
+    REDIS_DEAD_LETTER_STREAM,
     BATCH_SIZE,
+    MIN_BATCH_SIZE,
+    MAX_BATCH_SIZE,
+    BATCH_SIZE_STEP,
+    BATCH_MAX_LINGER,
+    STORE_TARGET_LATENCY,
     MQTT_TOPIC,
+    WIRE_FORMAT,
     MQTT_BROKER_HOST,
     MQTT_BROKER_PORT,
+    MQTT_CLIENT_ID,
+    MQTT_SHARED_GROUP,
+    MQTT_PARTITIONS_OWNED,
+    MQTT_WORKERS,
+    MQTT_WORKER_QUEUE_SIZE,
+    DEDUP_TTL,
+    DEDUP_MAX_ENTRIES,
+    REORDER_WINDOW,
+    REORDER_MAX_RECORDS,
+    SPILL_DIR,
+    SPILL_SEGMENT_SIZE,
+    SPILL_MAX_BYTES,
+    SPILL_REPLAY_RATE,
+    SPILL_REPLAY_BATCH,
+    NDJSON_CHUNK_SIZE,
+    NDJSON_MAX_LINE_BYTES,
 )
 
 # Configure logging settings
@@ -29,13 +74,86 @@ logging.basicConfig(
     ],
 )
 # Create an instance of the Redis using the configuration
-redis_client = Redis(host=REDIS_HOST, port=REDIS_PORT)
+redis_client = make_redis_client(
+    REDIS_HOST,
+    REDIS_PORT,
+    connect_timeout=REDIS_CONNECT_TIMEOUT,
+    # XREADGROUP waits up to BATCH_MAX_LINGER for data before Redis replies
+    socket_timeout=max(REDIS_SOCKET_TIMEOUT, BATCH_MAX_LINGER + 1.0),
+)
+# Processed data waits in a Redis stream until it is sent to the store
+batch_queue = RedisStreamQueue(
+    redis_client, REDIS_STREAM, REDIS_CONSUMER_GROUP, REDIS_CONSUMER_NAME, REDIS_DEAD_LETTER_STREAM
+)
 # Create an instance of the StoreApiAdapter using the configuration
-store_adapter = StoreApiAdapter(api_base_url=STORE_API_BASE_URL)
+store_adapter = StoreApiAdapter(
+    api_base_url=STORE_API_BASE_URL,
+    max_in_flight=STORE_MAX_IN_FLIGHT,
+    timeout=STORE_TIMEOUT,
+    max_retries=STORE_MAX_RETRIES,
+    backoff=STORE_RETRY_BACKOFF,
+)
+# Flushes batches to the store when full or when data has waited too long
+batch_flusher = BatchFlusher(
+    batch_queue,
+    store_adapter,
+    AdaptiveBatchSize(
+        initial=BATCH_SIZE,
+        minimum=MIN_BATCH_SIZE,
+        maximum=MAX_BATCH_SIZE,
+        target_latency=STORE_TARGET_LATENCY,
+        step=BATCH_SIZE_STEP,
+    ),
+    max_linger=BATCH_MAX_LINGER,
+    claim_idle=REDIS_CLAIM_IDLE,
+    max_in_flight=STORE_MAX_IN_FLIGHT,
+    wire_format=WIRE_FORMAT,
+    max_deliveries=REDIS_MAX_DELIVERIES,
+)
+# Keeps data on local disk while Redis is unavailable and replays it later
+spill_over = SpillOver(
+    push=batch_flusher.add_payload,
+    spill_log=SpillLog.open_slot(SPILL_DIR, segment_size=SPILL_SEGMENT_SIZE, max_bytes=SPILL_MAX_BYTES),
+    replay_rate=SPILL_REPLAY_RATE,
+    replay_batch=SPILL_REPLAY_BATCH,
+)
+# Drops duplicates and queues data in timestamp order
+ordered_ingest = OrderedIngest(
+    DedupCache(ttl=DEDUP_TTL, max_entries=DEDUP_MAX_ENTRIES),
+    ReorderBuffer(window=REORDER_WINDOW, max_records=REORDER_MAX_RECORDS),
+    on_payloads=spill_over.add,
+)
 # Create an instance of the AgentMQTTAdapter using the configuration
+agent_adapter = AgentMQTTAdapter(
+    broker_host=MQTT_BROKER_HOST,
+    broker_port=MQTT_BROKER_PORT,
+    topic=MQTT_TOPIC,
+    on_records=ordered_ingest.add,
+    wire_format=WIRE_FORMAT,
+    shared_group=MQTT_SHARED_GROUP,
+    workers=MQTT_WORKERS,
+    worker_queue_size=MQTT_WORKER_QUEUE_SIZE,
+    client_id=MQTT_CLIENT_ID,
+    partitions_owned=MQTT_PARTITIONS_OWNED,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Started per process (one per uvicorn worker), not at import time
+    batch_flusher.start()
+    spill_over.start()
+    ordered_ingest.start()
+    agent_adapter.start()
+    yield
+    agent_adapter.stop()
+    ordered_ingest.stop()
+    spill_over.stop()
+    batch_flusher.stop()
+
 
 # FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Додайте кастомний JSON-енкодер
 class DateTimeEncoder(json.JSONEncoder):
@@ -45,63 +163,86 @@ class DateTimeEncoder(json.JSONEncoder):
         return super().default(obj)
 
 @app.post("/processed_agent_data/")
-async def save_processed_agent_data(processed_agent_data: ProcessedAgentData):
-    redis_client.lpush("processed_agent_data", processed_agent_data.model_dump_json())
-    if redis_client.llen("processed_agent_data") >= BATCH_SIZE:
-        processed_agent_data_batch: List[ProcessedAgentData] = []
-        for _ in range(BATCH_SIZE):
-            processed_agent_data = ProcessedAgentData.model_validate_json(
-                redis_client.lpop("processed_agent_data")
-            )
-            processed_agent_data_batch.append(processed_agent_data)
-        print(processed_agent_data_batch)
-        store_adapter.save_data(processed_agent_data_batch=processed_agent_data_batch)
+async def save_processed_agent_data(request: Request):
+    """
+    Queue one ProcessedAgentData sent as JSON (default) or, with
+    Content-Type: application/msgpack, as a MessagePack record.
+    """
+    payload = await request.body()
+    try:
+        record = to_queue_record(payload, wire_format_for(request.headers.get("content-type")), WIRE_FORMAT)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    # Takes locks and may push to Redis, so it runs off the event loop
+    await run_in_threadpool(ordered_ingest.add, record)
     return {"status": "ok"}
 
 
-# MQTT
-client = mqtt.Client()
+@app.post("/processed_agent_data/batch")
+async def save_processed_agent_data_batch(request: Request):
+    """
+    Queue a list of ProcessedAgentData: a JSON array or, with
+    Content-Type: application/msgpack, a MessagePack array of records.
+    The list is validated in one pass and queued in one Redis round-trip.
+    """
+    payload = await request.body()
+    try:
+        records = to_queue_records(payload, wire_format_for(request.headers.get("content-type")), WIRE_FORMAT)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    await run_in_threadpool(ordered_ingest.add, *records)
+    return {"status": "ok", "count": len(records)}
 
 
-def on_connect(client, userdata, flags, rc):
-    if rc == 0:
-        logging.info(f"Connected to MQTT broker {MQTT_BROKER_HOST}:{MQTT_BROKER_PORT}")
-        client.subscribe(MQTT_TOPIC)
-        logging.info(f"Subscribed to topic: {MQTT_TOPIC}")
-    else:
-        logging.info(f"Failed to connect to MQTT broker with code: {rc}")
+@app.post("/processed_agent_data/ndjson")
+async def save_processed_agent_data_stream(request: Request):
+    """
+    Queue a stream of newline-delimited JSON ProcessedAgentData records as
+    it arrives, NDJSON_CHUNK_SIZE lines per Redis round-trip. On an invalid
+    record or a line over NDJSON_MAX_LINE_BYTES the request fails, but the
+    chunks before it stay queued.
+    """
+    count = 0
+    # Lines before the ones in `lines`
+    line_number = 0
+    pending = b""
+    lines = []
+    async for chunk in request.stream():
+        *complete, pending = (pending + chunk).split(b"\n")
+        lines.extend(complete)
+        # Checked on every chunk, so a line without a newline is never buffered past the limit
+        for index, line in enumerate((*complete, pending)):
+            if len(line) > NDJSON_MAX_LINE_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Line {line_number + len(lines) - len(complete) + index + 1} is longer than "
+                    f"{NDJSON_MAX_LINE_BYTES} bytes ({count} records were queued)",
+                )
+        if len(lines) >= NDJSON_CHUNK_SIZE:
+            count += await _queue_lines(lines, line_number + 1, count)
+            line_number += len(lines)
+            lines = []
+    lines.append(pending)
+    count += await _queue_lines(lines, line_number + 1, count)
+    return {"status": "ok", "count": count}
 
 
-def on_message(client, userdata, msg):
+async def _queue_lines(lines, first_line: int, queued: int) -> int:
+    numbered = [(first_line + index, line.strip()) for index, line in enumerate(lines) if line.strip()]
     try:
-        payload: str = msg.payload.decode("utf-8")
-        # Create ProcessedAgentData instance with the received data
-        processed_agent_data = ProcessedAgentData.model_validate_json(
-            payload, strict=True
-        )
-        redis_client.lpush(
-            "processed_agent_data", processed_agent_data.model_dump_json()
-        )
-       
-        processed_agent_data_batch: List[ProcessedAgentData] = []
-        if redis_client.llen("processed_agent_data") >= BATCH_SIZE:
-            for _ in range(BATCH_SIZE):
-                processed_agent_data = ProcessedAgentData.model_validate_json(
-                    redis_client.lpop("processed_agent_data")
+        # The chunk is validated in a single pass; valid JSON lines are queued byte for byte
+        records = json_lines_to_queue_records([line for _, line in numbered], WIRE_FORMAT)
+    except ValueError:
+        # Only to report which line is invalid
+        records = []
+        for number, line in numbered:
+            try:
+                records.append(to_queue_record(line, JSON, WIRE_FORMAT))
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Invalid record on line {number} ({queued} records were queued): {e}",
                 )
-                logging.info(f"Processed agent data: {processed_agent_data}")
-                
-                processed_agent_data_batch.append(processed_agent_data)
-        store_adapter.save_data(processed_agent_data_batch=processed_agent_data_batch)
-        return {"status": "ok"}
-    except Exception as e:
-        logging.info(f"Error processing MQTT message: {e}")
-
-
-# Connect
-client.on_connect = on_connect
-client.on_message = on_message
-client.connect(MQTT_BROKER_HOST, MQTT_BROKER_PORT)
-
-# Start
-client.loop_start()
+    if records:
+        await run_in_threadpool(ordered_ingest.add, *records)
+    return len(records)
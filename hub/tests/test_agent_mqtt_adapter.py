@@ -1,60 +1,92 @@
 import unittest
 from unittest.mock import Mock
-import redis
+
 from app.adapters.agent_mqtt_adapter import AgentMQTTAdapter
-from app.interfaces.store_gateway import StoreGateway
+from app.adapters.wire_format import MSGPACK, encode_processed_agent_data
 from app.entities.agent_data import AccelerometerData, AgentData, GpsData
-from app.usecases.data_processing import process_agent_data_batch
+from app.entities.processed_agent_data import ProcessedAgentData
+
+
+def make_payload(user_id=1, x=0.1):
+    return ProcessedAgentData(
+        road_state="normal",
+        agent_data=AgentData(
+            user_id=user_id,
+            accelerometer=AccelerometerData(x=x, y=0.2, z=0.3),
+            gps=GpsData(latitude=10.123, longitude=20.456),
+            timestamp="2023-07-21T12:34:56Z",
+        ),
+    ).model_dump_json().encode()
+
 
 class TestAgentMQTTAdapter(unittest.TestCase):
     def setUp(self):
-        # Create a mock StoreGateway for testing
-        self.mock_store_gateway = Mock(spec=StoreGateway)
-        self.mock_redis = Mock(spec=redis.Redis)
-        # Create the AgentMQTTAdapter instance with the mock StoreGateway
+        self.on_records = Mock()
         self.agent_adapter = AgentMQTTAdapter(
             broker_host="test_broker",
             broker_port=1234,
             topic="test_topic",
-            store_gateway=self.mock_store_gateway,
-            redis_client=self.mock_redis,
-            batch_size=1,
+            on_records=self.on_records,
+            shared_group="hub",
+            workers=2,
         )
-    def test_on_message_valid_data(self):
-        # Test handling of valid incoming MQTT message
-        # (Assuming data is in the correct JSON format)
-        valid_json_data = '{"user_id": 1,"accelerometer": {"x": 0.1, "y": 0.2, "z": 0.3}, "gps": {"latitude": 10.123, "longitude": 20.456}, "timestamp": "2023-07-21T12:34:56Z"}'
-        mock_msg = Mock(payload=valid_json_data.encode("utf-8"))
-        self.mock_redis.llen.return_value = 1
-        self.mock_redis.rpop.return_value = valid_json_data
-        # Call on_message with the mock message
-        self.agent_adapter.on_message(None, None, mock_msg)
-        # Ensure that the store_gateway's save_data method is called once with the correct arguments
-        expected_agent_data = AgentData(
-            user_id=1,
-            accelerometer=AccelerometerData(
-                x=0.1,
-                y=0.2,
-                z=0.3,
-            ),
-            gps=GpsData(
-                latitude=10.123,
-                longitude=20.456,
-            ),
-            timestamp="2023-07-21T12:34:56Z",
+        # No broker: only the worker threads run
+        self.agent_adapter.client = Mock()
+
+    def queued_payloads(self):
+        return [record.payload for call in self.on_records.call_args_list for record in call.args]
+
+    def test_shared_subscriptions(self):
+        # Partitions are never shared, so a vehicle is read by a single process
+        self.assertEqual(self.agent_adapter.subscriptions, ["$share/hub/test_topic", "test_topic/+"])
+        self.agent_adapter.partitions_owned = [2, 3]
+        self.assertEqual(
+            self.agent_adapter.subscriptions, ["$share/hub/test_topic", "test_topic/2", "test_topic/3"]
         )
-        self.mock_store_gateway.save_data.assert_called_once_with(
-            process_agent_data_batch([expected_agent_data])
+        self.assertEqual(self.agent_adapter.partition("test_topic/5"), 1)
+        self.assertEqual(self.agent_adapter.partition("test_topic"), 0)
+
+    def test_on_message_valid_data(self):
+        valid_json_data = make_payload()
+        self.agent_adapter.start()
+        self.agent_adapter.on_message(None, None, Mock(topic="test_topic/1", payload=valid_json_data))
+        self.agent_adapter.stop()
+        # Valid JSON is queued as it is
+        self.assertEqual(self.queued_payloads(), [valid_json_data])
+
+    def test_on_message_keeps_partition_order(self):
+        payloads = [make_payload(user_id=3, x=index) for index in range(50)]
+        self.agent_adapter.start()
+        for payload in payloads:
+            self.agent_adapter.on_message(None, None, Mock(topic="test_topic/3", payload=payload))
+        self.agent_adapter.stop()
+        self.assertEqual(self.queued_payloads(), payloads)
+
+    def test_on_message_converts_to_wire_format(self):
+        self.agent_adapter.wire_format = MSGPACK
+        self.agent_adapter.start()
+        self.agent_adapter.on_message(None, None, Mock(topic="test_topic/0", payload=make_payload()))
+        self.agent_adapter.stop()
+        expected = encode_processed_agent_data(ProcessedAgentData.model_validate_json(make_payload()), MSGPACK)
+        self.assertEqual(self.queued_payloads(), [expected])
+
+    def test_on_message_batch(self):
+        payloads = [make_payload(user_id=3, x=index) for index in range(3)]
+        self.agent_adapter.start()
+        self.agent_adapter.on_message(None, None, Mock(topic="test_topic/3", payload=b"[" + b",".join(payloads) + b"]"))
+        self.agent_adapter.stop()
+        self.assertEqual(
+            [ProcessedAgentData.model_validate_json(payload) for payload in self.queued_payloads()],
+            [ProcessedAgentData.model_validate_json(payload) for payload in payloads],
         )
+
     def test_on_message_invalid_data(self):
-        # Test handling of invalid incoming MQTT message
-        # (Assuming data is missing required fields or has incorrect format)
-        invalid_json_data = '{"user_id": 1, "accelerometer": {"x": 0.1, "y": 0.2}, "gps": {"latitude": 10.123}, "timestamp": 12345}'
-        mock_msg = Mock(payload=invalid_json_data.encode("utf-8"))
-        # Call on_message with the mock message
-        self.agent_adapter.on_message(None, None, mock_msg)
-        # Ensure that the store_gateway's save_data method is not called (due to invalid data)
-        self.mock_store_gateway.save_data.assert_not_called()
+        invalid_json_data = b'{"user_id": 1, "accelerometer": {"x": 0.1, "y": 0.2}, "gps": {"latitude": 10.123}, "timestamp": 12345}'
+        self.agent_adapter.start()
+        self.agent_adapter.on_message(None, None, Mock(topic="test_topic", payload=invalid_json_data))
+        self.agent_adapter.stop()
+        self.on_records.assert_not_called()
+
 
 if __name__ == "__main__":
     unittest.main()
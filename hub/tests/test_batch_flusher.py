@@ -0,0 +1,166 @@
+import time
+import unittest
+from unittest.mock import Mock
+
+import fakeredis
+import httpx
+
+from app.adapters.redis_stream_queue import RedisStreamQueue
+from app.adapters.store_api_adapter import StoreApiAdapter
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData
+from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.store_gateway import StoreGateway, StoreRejectedError
+from app.usecases.batch_flusher import AdaptiveBatchSize, BatchFlusher
+
+
+def make_processed_agent_data(user_id=1):
+    return ProcessedAgentData(
+        road_state="normal",
+        agent_data=AgentData(
+            user_id=user_id,
+            accelerometer=AccelerometerData(x=0.1, y=0.2, z=0.3),
+            gps=GpsData(latitude=10.123, longitude=20.456),
+            timestamp="2023-07-21T12:34:56Z",
+        ),
+    )
+
+
+class TestAdaptiveBatchSize(unittest.TestCase):
+    def test_grows_when_fast_and_halves_when_slow(self):
+        batch_size = AdaptiveBatchSize(initial=20, minimum=10, maximum=40, target_latency=0.5, step=10)
+        batch_size.observe(20, 0.1, True)
+        self.assertEqual(batch_size.value, 30)
+        batch_size.observe(30, 0.1, True)
+        batch_size.observe(40, 0.1, True)
+        self.assertEqual(batch_size.value, 40)
+        batch_size.observe(40, 2.0, True)
+        self.assertEqual(batch_size.value, 20)
+        batch_size.observe(20, 0.1, False)
+        self.assertEqual(batch_size.value, 10)
+
+    def test_partial_batches_do_not_grow(self):
+        batch_size = AdaptiveBatchSize(initial=20, minimum=10, maximum=40, target_latency=0.5, step=10)
+        batch_size.observe(5, 0.1, True)
+        self.assertEqual(batch_size.value, 20)
+
+
+class TestBatchFlusher(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.redis_client = fakeredis.FakeRedis()
+        self.store_gateway = Mock(spec=StoreGateway)
+        self.store_gateway.save_raw_data.return_value = True
+        self.flusher = self.make_flusher("worker-1")
+        self.flusher.queue.ensure_group()
+
+    def make_flusher(self, consumer):
+        return BatchFlusher(
+            RedisStreamQueue(self.redis_client, "test_stream", "hub", consumer),
+            self.store_gateway,
+            AdaptiveBatchSize(initial=3, minimum=3, maximum=10, target_latency=1.0, step=1),
+            max_linger=0.05,
+            claim_idle=0.05,
+            max_deliveries=2,
+        )
+
+    def saved_batch(self):
+        payloads = self.store_gateway.save_raw_data.call_args.args[0]
+        return [ProcessedAgentData.model_validate_json(payload) for payload in payloads]
+
+    def saved_user_ids(self):
+        return [item.agent_data.user_id for item in self.saved_batch()]
+
+    async def test_flushes_full_batch_in_order_and_acknowledges_it(self):
+        for user_id in range(4):
+            self.flusher.add(make_processed_agent_data(user_id))
+        self.assertTrue(await self.flusher.flush(self.flusher.collect()))
+        self.assertEqual(self.saved_user_ids(), [0, 1, 2])
+        self.assertTrue(all(item.idempotency_key for item in self.saved_batch()))
+        self.assertEqual(self.flusher.batch_size.value, 4)
+        self.assertEqual(self.redis_client.xlen("test_stream"), 1)
+        self.assertEqual(self.redis_client.xpending("test_stream", "hub")["pending"], 0)
+
+    async def test_flushes_partial_batch_after_linger(self):
+        self.flusher.add(make_processed_agent_data())
+        time.sleep(0.06)
+        await self.flusher.flush(self.flusher.collect())
+        self.assertEqual(self.saved_user_ids(), [1])
+
+    async def test_failed_batch_is_redelivered_with_same_keys(self):
+        for user_id in range(3):
+            self.flusher.add(make_processed_agent_data(user_id))
+        self.store_gateway.save_raw_data.return_value = False
+        self.assertFalse(await self.flusher.flush(self.flusher.collect()))
+        failed = self.saved_batch()
+        self.assertEqual(self.redis_client.xpending("test_stream", "hub")["pending"], 3)
+
+        # Another replica takes over once the entries have been idle long enough
+        self.store_gateway.save_raw_data.return_value = True
+        other_replica = self.make_flusher("worker-2")
+        time.sleep(0.06)
+        await other_replica.reclaim()
+        retried = self.saved_batch()
+        self.assertEqual(
+            [item.idempotency_key for item in retried], [item.idempotency_key for item in failed]
+        )
+        self.assertEqual(self.redis_client.xpending("test_stream", "hub")["pending"], 0)
+
+    async def test_record_the_store_keeps_rejecting_is_dead_lettered(self):
+        def save_raw_data(payloads, wire_format):
+            user_ids = [ProcessedAgentData.model_validate_json(payload).agent_data.user_id for payload in payloads]
+            if 13 in user_ids:
+                raise StoreRejectedError("HTTP 422")
+            saved.extend(user_ids)
+            return True
+
+        saved = []
+        self.store_gateway.save_raw_data.side_effect = save_raw_data
+        for user_id in (0, 13, 2):
+            self.flusher.add(make_processed_agent_data(user_id))
+        self.assertFalse(await self.flusher.flush(self.flusher.collect()))
+        # Redelivered as it is up to max_deliveries times, then bisected
+        for _ in range(3):
+            time.sleep(0.06)
+            await self.flusher.reclaim()
+        self.assertEqual(saved, [0, 2])
+        self.assertEqual(self.redis_client.xpending("test_stream", "hub")["pending"], 0)
+        self.assertEqual(self.redis_client.xlen("test_stream"), 0)
+        [(_, dead)] = self.redis_client.xrange("test_stream:dead")
+        self.assertEqual(ProcessedAgentData.model_validate_json(dead[b"data"]).agent_data.user_id, 13)
+        # Rejections say nothing about the store's capacity
+        self.assertEqual(self.flusher.batch_size.value, 3)
+
+    async def test_unavailable_store_does_not_dead_letter(self):
+        for user_id in range(3):
+            self.flusher.add(make_processed_agent_data(user_id))
+        self.store_gateway.save_raw_data.return_value = False
+        self.assertFalse(await self.flusher.flush(self.flusher.collect()))
+        for _ in range(4):
+            time.sleep(0.06)
+            await self.flusher.reclaim()
+        self.assertEqual(self.redis_client.xpending("test_stream", "hub")["pending"], 3)
+        self.assertEqual(self.redis_client.xlen("test_stream:dead"), 0)
+
+    async def test_store_with_database_down_is_retried_not_dead_lettered(self):
+        # The store answers 503 while its database is unreachable
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(503)
+
+        store_api = StoreApiAdapter("http://store", max_retries=1, backoff=0, transport=httpx.MockTransport(handler))
+        self.flusher.store_gateway = store_api
+        for user_id in range(3):
+            self.flusher.add(make_processed_agent_data(user_id))
+        self.assertFalse(await self.flusher.flush(self.flusher.collect()))
+        for _ in range(4):
+            time.sleep(0.06)
+            await self.flusher.reclaim()
+        await store_api.close()
+        self.assertEqual(len(requests), 10)
+        self.assertEqual(self.redis_client.xpending("test_stream", "hub")["pending"], 3)
+        self.assertEqual(self.redis_client.xlen("test_stream:dead"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
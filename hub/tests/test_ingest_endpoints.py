@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+# Spill segments of the imported app go to a scratch directory
+os.environ.setdefault("SPILL_DIR", os.path.join(tempfile.mkdtemp(), "spill"))
+
+import main  # noqa: E402
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData  # noqa: E402
+from app.entities.processed_agent_data import ProcessedAgentData  # noqa: E402
+
+
+def make_line(user_id=1, second=0) -> bytes:
+    return ProcessedAgentData(
+        road_state="normal",
+        agent_data=AgentData(
+            user_id=user_id,
+            accelerometer=AccelerometerData(x=0.1, y=0.2, z=0.3),
+            gps=GpsData(latitude=10.123, longitude=20.456),
+            timestamp=f"2023-07-21T12:34:{second:02}",
+        ),
+    ).model_dump_json().encode()
+
+
+class TestIngestEndpoints(unittest.TestCase):
+    def setUp(self):
+        # Without the lifespan nothing is started; queued records are only collected
+        self.ordered_ingest = mock.Mock()
+        patcher = mock.patch.object(main, "ordered_ingest", self.ordered_ingest)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(main.app)
+
+    def queued_timestamps(self):
+        return [
+            record.timestamp for call in self.ordered_ingest.add.call_args_list for record in call.args
+        ]
+
+    def test_batch(self):
+        body = b"[" + b",".join(make_line(second=second) for second in range(3)) + b"]"
+        response = self.client.post("/processed_agent_data/batch", content=body)
+        self.assertEqual(response.json(), {"status": "ok", "count": 3})
+        self.assertEqual(len(self.queued_timestamps()), 3)
+
+    def test_invalid_batch_is_rejected(self):
+        response = self.client.post("/processed_agent_data/batch", content=b'[{"road_state": "normal"}]')
+        self.assertEqual(response.status_code, 422)
+        self.ordered_ingest.add.assert_not_called()
+
+    def test_ndjson(self):
+        body = b"\n".join(make_line(second=second) for second in range(5)) + b"\n\n"
+        response = self.client.post("/processed_agent_data/ndjson", content=body)
+        self.assertEqual(response.json(), {"status": "ok", "count": 5})
+        self.assertEqual(self.queued_timestamps(), sorted(self.queued_timestamps()))
+
+    def test_ndjson_line_split_across_chunks(self):
+        body = make_line(second=0) + b"\n" + make_line(second=1)
+
+        def chunks():
+            # The second record arrives in three pieces, without a final newline
+            yield body[:len(body) - 50]
+            yield body[len(body) - 50:len(body) - 20]
+            yield body[len(body) - 20:]
+
+        response = self.client.post("/processed_agent_data/ndjson", content=chunks())
+        self.assertEqual(response.json(), {"status": "ok", "count": 2})
+
+    def test_ndjson_invalid_record_names_its_line(self):
+        body = b"\n".join([make_line(second=0), b"", b'{"road_state": "normal"}', make_line(second=1)])
+        response = self.client.post("/processed_agent_data/ndjson", content=body)
+        self.assertEqual(response.status_code, 422)
+        self.assertIn("line 3", response.json()["detail"])
+
+    def test_ndjson_line_over_the_limit_is_rejected_before_it_is_buffered(self):
+        def chunks():
+            yield make_line() + b"\n"
+            # No newline comes for 100 KiB
+            for _ in range(100):
+                yield b" " * 1024
+
+        with mock.patch.object(main, "NDJSON_MAX_LINE_BYTES", 4096):
+            response = self.client.post("/processed_agent_data/ndjson", content=chunks())
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("Line 2", response.json()["detail"])
+
+
+if __name__ == "__main__":
+    unittest.main()
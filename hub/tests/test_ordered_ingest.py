@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import Mock
+
+from app.adapters.wire_format import QueueRecord
+from app.usecases.ordered_ingest import DedupCache, OrderedIngest, ReorderBuffer
+
+
+def record(user_id, timestamp):
+    return QueueRecord(user_id, timestamp, f"{user_id}@{timestamp}".encode())
+
+
+class TestDedupCache(unittest.TestCase):
+    def test_drops_duplicates_until_ttl(self):
+        dedup = DedupCache(ttl=10, max_entries=100)
+        self.assertTrue(dedup.add(1, 100, now=0))
+        self.assertTrue(dedup.add(2, 100, now=0))
+        self.assertFalse(dedup.add(1, 100, now=5))
+        self.assertTrue(dedup.add(1, 100, now=11))
+
+    def test_is_bounded(self):
+        dedup = DedupCache(ttl=10, max_entries=3)
+        for timestamp in range(5):
+            dedup.add(1, timestamp, now=0)
+        self.assertEqual(len(dedup), 3)
+        # The oldest keys were forgotten first
+        self.assertTrue(dedup.add(1, 0, now=0))
+        self.assertFalse(dedup.add(1, 4, now=0))
+
+
+class TestReorderBuffer(unittest.TestCase):
+    def test_releases_in_timestamp_order_after_window(self):
+        reorder = ReorderBuffer(window=1, max_records=100)
+        reorder.add(record(1, 300), now=0)
+        reorder.add(record(1, 100), now=0.5)
+        reorder.add(record(1, 200), now=0.9)
+        self.assertEqual(reorder.release(now=0.9), [])
+        self.assertEqual(reorder.release(now=2), [b"1@100", b"1@200", b"1@300"])
+        self.assertEqual(len(reorder), 0)
+
+    def test_releases_early_when_full(self):
+        reorder = ReorderBuffer(window=1, max_records=2)
+        for timestamp in (3, 1, 2):
+            reorder.add(record(1, timestamp), now=0)
+        self.assertEqual(reorder.release(now=0), [b"1@1"])
+        self.assertEqual(reorder.drain(), [b"1@2", b"1@3"])
+
+
+class TestOrderedIngest(unittest.TestCase):
+    def test_queues_unique_records_in_order(self):
+        on_payloads = Mock()
+        ingest = OrderedIngest(DedupCache(ttl=60, max_entries=100), ReorderBuffer(window=60, max_records=100), on_payloads)
+        ingest.start()
+        ingest.add(record(1, 2), record(2, 1), record(1, 1))
+        # Resent after a reconnect
+        ingest.add(record(1, 2), record(1, 3))
+        on_payloads.assert_not_called()
+        ingest.stop()
+        on_payloads.assert_called_once_with(b"2@1", b"1@1", b"1@2", b"1@3")
+
+    def test_without_window_queues_right_away(self):
+        on_payloads = Mock()
+        ingest = OrderedIngest(DedupCache(ttl=60, max_entries=100), ReorderBuffer(window=0, max_records=100), on_payloads)
+        ingest.add(record(1, 2), record(1, 1), record(1, 2))
+        on_payloads.assert_called_once_with(b"1@1", b"1@2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import socket
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock
+
+from redis.exceptions import ConnectionError
+
+from app.adapters.redis_stream_queue import RedisStreamQueue, make_redis_client
+from app.adapters.spill_log import SpillLog
+from app.usecases.spill_over import SpillOver
+
+
+class TestSpillLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.path) if name.startswith("segment-"))
+
+    def read_all(self, spill_log):
+        payloads = []
+        while True:
+            batch, position = spill_log.peek(7)
+            if not batch:
+                return payloads
+            payloads.extend(batch)
+            spill_log.commit(position)
+
+    def test_reads_across_segments_and_deletes_them(self):
+        spill_log = SpillLog(self.path, segment_size=256)
+        payloads = [f"record-{index:03d}".encode() for index in range(40)]
+        spill_log.append(*payloads)
+        self.assertGreater(len(self.segments()), 1)
+        self.assertEqual(spill_log.pending_records, 40)
+        self.assertEqual(self.read_all(spill_log), payloads)
+        self.assertEqual(spill_log.pending_records, 0)
+        self.assertEqual(len(self.segments()), 1)
+        spill_log.close()
+
+    def test_recovers_unread_records_after_restart(self):
+        spill_log = SpillLog(self.path, segment_size=256)
+        spill_log.append(*[f"record-{index:03d}".encode() for index in range(20)])
+        batch, position = spill_log.peek(5)
+        spill_log.commit(position)
+        spill_log.close()
+
+        spill_log = SpillLog(self.path, segment_size=256)
+        self.assertEqual(spill_log.pending_records, 15)
+        self.assertEqual(self.read_all(spill_log)[0], b"record-005")
+        spill_log.close()
+
+    def test_ignores_torn_record(self):
+        spill_log = SpillLog(self.path, segment_size=256)
+        spill_log.append(b"first", b"second")
+        spill_log.close()
+        with open(os.path.join(self.path, self.segments()[0]), "r+b") as file:
+            # Corrupt the payload of the second record
+            file.seek(8 + 5 + 8)
+            file.write(b"X")
+
+        spill_log = SpillLog(self.path, segment_size=256)
+        self.assertEqual(self.read_all(spill_log), [b"first"])
+        spill_log.close()
+
+    def test_disk_use_is_bounded(self):
+        spill_log = SpillLog(self.path, segment_size=256, max_bytes=512)
+        spill_log.append(*[f"record-{index:03d}".encode() for index in range(100)])
+        self.assertEqual(len(self.segments()), 2)
+        # The oldest records were dropped
+        self.assertEqual(self.read_all(spill_log)[-1], b"record-099")
+        spill_log.close()
+
+    def test_open_slot_skips_directories_in_use(self):
+        first = SpillLog.open_slot(self.path, segment_size=256)
+        second = SpillLog.open_slot(self.path, segment_size=256)
+        self.assertNotEqual(first.directory, second.directory)
+        first.close()
+        second.close()
+
+
+class TestSpillOver(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.push = Mock()
+        self.spill_over = SpillOver(
+            self.push, SpillLog(self.directory.name, segment_size=4096), replay_rate=1000, replay_batch=2
+        )
+
+    def tearDown(self):
+        self.spill_over.spill_log.close()
+        self.directory.cleanup()
+
+    def test_spills_while_queue_is_down_and_replays_in_order(self):
+        self.push.side_effect = ConnectionError("down")
+        self.spill_over.add(b"1", b"2")
+        self.spill_over.add(b"3")
+        # Not retried within retry_interval
+        self.assertEqual(self.push.call_count, 1)
+        self.assertEqual(self.spill_over.spill_log.pending_records, 3)
+
+        self.push.side_effect = None
+        self.push.reset_mock()
+        while self.spill_over.replay():
+            pass
+        self.assertEqual([call.args for call in self.push.call_args_list], [(b"1", b"2"), (b"3",)])
+        self.assertEqual(self.spill_over.spill_log.pending_records, 0)
+
+    def test_keeps_spilled_data_when_replay_fails(self):
+        self.push.side_effect = ConnectionError("down")
+        self.spill_over.add(b"1")
+        with self.assertRaises(ConnectionError):
+            self.spill_over.replay()
+        self.assertEqual(self.spill_over.spill_log.pending_records, 1)
+
+    def test_spills_when_redis_stops_answering(self):
+        # Accepts connections but never replies, like a black-holed Redis
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        redis_client = make_redis_client("127.0.0.1", server.getsockname()[1], connect_timeout=0.2, socket_timeout=0.2)
+        self.spill_over.push = RedisStreamQueue(redis_client, "test_stream", "hub", "worker-1").push
+        started = time.monotonic()
+        self.spill_over.add(b"1")
+        self.assertLess(time.monotonic() - started, 2.0)
+        self.assertEqual(self.spill_over.spill_log.pending_records, 1)
+        redis_client.close()
+        server.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
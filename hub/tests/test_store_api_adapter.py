@@ -1,17 +1,16 @@
-import requests
+import json
 import unittest
-from unittest.mock import Mock, patch
+
+import httpx
+
 from app.adapters.store_api_adapter import StoreApiAdapter
 from app.entities.agent_data import AccelerometerData, AgentData, GpsData
 from app.entities.processed_agent_data import ProcessedAgentData
+from app.interfaces.store_gateway import StoreRejectedError
 
-class TestStoreApiAdapter(unittest.TestCase):
+
+class TestStoreApiAdapter(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
-        # Create the StoreApiAdapter instance
-        self.store_api_adapter = StoreApiAdapter(api_base_url="http://test-api.com")
-    @patch.object(requests, "post")
-    def test_save_data_success(self, mock_post):
-        # Test successful saving of data to the Store API
         # Sample processed road data
         agent_data = AgentData(
             user_id=1,
@@ -26,47 +25,68 @@ class TestStoreApiAdapter(unittest.TestCase):
             ),
             timestamp="2023-07-21T12:34:56Z",
         )
-        processed_data = ProcessedAgentData(road_state="normal", agent_data=agent_data)
-        # Mock the response from the Store API
-        mock_response = Mock(status_code=201)  # 201 indicates successful creation
-        mock_post.return_value = mock_response
-        # Call the save_data method
-        result = self.store_api_adapter.save_data(processed_data)
-        # Ensure that the post method of the mock is called with the correct arguments
-        mock_post.assert_called_once_with(
-            "http://test-api.com/agent_data", json=processed_data.model_dump()
+        self.processed_data = ProcessedAgentData(road_state="normal", agent_data=agent_data)
+        self.requests = []
+        self.statuses = []
+
+    def make_adapter(self, statuses):
+        # The mock transport answers with the given statuses in order
+        self.statuses = list(statuses)
+
+        def handler(request):
+            self.requests.append(request)
+            return httpx.Response(self.statuses.pop(0))
+
+        return StoreApiAdapter(
+            api_base_url="http://test-api.com", backoff=0, transport=httpx.MockTransport(handler)
+        )
+
+    async def test_save_data_success(self):
+        # Test successful saving of data to the Store API
+        store_api_adapter = self.make_adapter([201])
+        result = await store_api_adapter.save_data([self.processed_data])
+        # Ensure that the whole batch is posted once as a JSON list
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(str(self.requests[0].url), "http://test-api.com/processed_agent_data/")
+        self.assertEqual(
+            json.loads(self.requests[0].content), [self.processed_data.model_dump(mode="json")]
         )
         # Ensure that the result is True, indicating successful saving
         self.assertTrue(result)
-    @patch.object(requests, "post")
-    def test_save_data_failure(self, mock_post):
+        await store_api_adapter.close()
+
+    async def test_save_raw_data_posts_payloads_as_json_array(self):
+        store_api_adapter = self.make_adapter([201])
+        payload = self.processed_data.model_dump_json().encode()
+        result = await store_api_adapter.save_raw_data([payload, payload])
+        self.assertEqual(self.requests[0].content, b"[" + payload + b"," + payload + b"]")
+        self.assertTrue(result)
+        await store_api_adapter.close()
+
+    async def test_save_data_failure(self):
         # Test failure to save data to the Store API
-        # Sample processed road data
-        agent_data = AgentData(
-            user_id=1,
-            accelerometer=AccelerometerData(
-                x=0.1,
-                y=0.2,
-                z=0.3,
-            ),
-            gps=GpsData(
-                latitude=10.123,
-                longitude=20.456,
-            ),
-            timestamp="2023-07-21T12:34:56Z",
-        )
-        processed_data = ProcessedAgentData(road_state="normal", agent_data=agent_data)
-        # Mock the response from the Store API
-        mock_response = Mock(status_code=400)  # 400 indicates a client error
-        mock_post.return_value = mock_response
-        # Call the save_data method
-        result = self.store_api_adapter.save_data(processed_data)
-        # Ensure that the post method of the mock is called with the correct arguments
-        mock_post.assert_called_once_with(
-            "http://test-api.com/agent_data", json=processed_data.model_dump()
-        )
-        # Ensure that the result is False, indicating failure to save
+        store_api_adapter = self.make_adapter([400])
+        # The store refuses the data, so sending it again would not help
+        with self.assertRaises(StoreRejectedError):
+            await store_api_adapter.save_data([self.processed_data])
+        # Client errors are not retried
+        self.assertEqual(len(self.requests), 1)
+        await store_api_adapter.close()
+
+    async def test_save_data_retries_unavailable_store(self):
+        store_api_adapter = self.make_adapter([503, 503, 201])
+        result = await store_api_adapter.save_data([self.processed_data])
+        self.assertEqual(len(self.requests), 3)
+        self.assertTrue(result)
+        await store_api_adapter.close()
+
+    async def test_save_data_gives_up_after_max_retries(self):
+        store_api_adapter = self.make_adapter([503] * 4)
+        result = await store_api_adapter.save_data([self.processed_data])
+        self.assertEqual(len(self.requests), 4)
         self.assertFalse(result)
+        await store_api_adapter.close()
+
 
 if __name__ == "__main__":
     unittest.main()
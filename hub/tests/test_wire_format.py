@@ -0,0 +1,95 @@
+import json
+import unittest
+
+import msgpack
+
+from app.adapters.wire_format import (
+    JSON,
+    MSGPACK,
+    decode_processed_agent_data,
+    detect_wire_format,
+    encode_processed_agent_data,
+    is_batch,
+    json_lines_to_queue_records,
+    join_batch,
+    to_queue_payload,
+    to_queue_record,
+    with_idempotency_key,
+)
+from app.entities.agent_data import AccelerometerData, AgentData, GpsData
+from app.entities.processed_agent_data import ProcessedAgentData
+
+
+class TestWireFormat(unittest.TestCase):
+    def setUp(self):
+        self.processed_data = ProcessedAgentData(
+            road_state="normal",
+            agent_data=AgentData(
+                user_id=1,
+                accelerometer=AccelerometerData(x=0.1, y=0.2, z=0.3),
+                gps=GpsData(latitude=10.123, longitude=20.456),
+                timestamp="2023-07-21T12:34:56.123456",
+            ),
+        )
+
+    def test_msgpack_round_trip_is_smaller_than_json(self):
+        packed = encode_processed_agent_data(self.processed_data, MSGPACK)
+        self.assertEqual(detect_wire_format(packed), MSGPACK)
+        self.assertEqual(decode_processed_agent_data(packed, MSGPACK), self.processed_data)
+        self.assertLess(len(packed), len(encode_processed_agent_data(self.processed_data, JSON)))
+
+    def test_idempotency_key_is_added_in_both_formats(self):
+        for wire_format in (JSON, MSGPACK):
+            payload = encode_processed_agent_data(self.processed_data, wire_format)
+            keyed = with_idempotency_key(payload, "1-0", wire_format)
+            self.assertEqual(decode_processed_agent_data(keyed, wire_format).idempotency_key, "1-0")
+
+    def test_json_payload_is_converted_to_queue_format(self):
+        payload = self.processed_data.model_dump_json().encode()
+        self.assertIs(to_queue_payload(payload, JSON, JSON), payload)
+        converted = to_queue_payload(payload, JSON, MSGPACK)
+        self.assertEqual(decode_processed_agent_data(converted, MSGPACK), self.processed_data)
+
+    def test_join_batch(self):
+        for wire_format, load in ((JSON, json.loads), (MSGPACK, msgpack.unpackb)):
+            payload = encode_processed_agent_data(self.processed_data, wire_format)
+            self.assertEqual(len(load(join_batch([payload] * 3, wire_format))), 3)
+
+    def test_batches_are_told_from_records(self):
+        for wire_format in (JSON, MSGPACK):
+            payload = encode_processed_agent_data(self.processed_data, wire_format)
+            for count in (1, 8, 20):
+                batch = join_batch([payload] * count, wire_format)
+                self.assertEqual(detect_wire_format(batch), wire_format)
+                self.assertTrue(is_batch(batch, wire_format))
+            self.assertFalse(is_batch(payload, wire_format))
+
+    def test_array16_record_is_re_encoded_for_the_queue(self):
+        values = msgpack.unpackb(encode_processed_agent_data(self.processed_data, MSGPACK))
+        # As encoders that always write array16 headers send it
+        payload = b"\xdc\x00\x08" + b"".join(msgpack.packb(value) for value in values)
+        record = to_queue_record(payload, MSGPACK, MSGPACK)
+        self.assertEqual(record.payload, encode_processed_agent_data(self.processed_data, MSGPACK))
+        keyed = with_idempotency_key(record.payload, "1-0", MSGPACK)
+        self.assertEqual(decode_processed_agent_data(keyed, MSGPACK).idempotency_key, "1-0")
+        with self.assertRaises(ValueError):
+            with_idempotency_key(payload, "1-0", MSGPACK)
+
+    def test_json_lines_are_validated_together_and_kept_byte_for_byte(self):
+        line = self.processed_data.model_dump_json().encode()
+        records = json_lines_to_queue_records([line] * 3, JSON)
+        self.assertEqual([record.payload for record in records], [line] * 3)
+        converted = json_lines_to_queue_records([line], MSGPACK)[0].payload
+        self.assertEqual(decode_processed_agent_data(converted, MSGPACK), self.processed_data)
+        # Two records on one line, or an invalid one, fail the whole chunk
+        for lines in ([line + b"," + line], [line, b'{"road_state": "normal"}']):
+            with self.assertRaises(ValueError):
+                json_lines_to_queue_records(lines, JSON)
+
+    def test_invalid_payload_is_rejected(self):
+        with self.assertRaises(ValueError):
+            to_queue_payload(msgpack.packb(["normal", 1]), MSGPACK, JSON)
+
+
+if __name__ == "__main__":
+    unittest.main()
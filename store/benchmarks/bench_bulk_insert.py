@@ -0,0 +1,75 @@
+"""
+Rows-per-second benchmark for the store ingest path.
+
+Compares the old row-by-row insert (one INSERT and one COMMIT per item) with
+insert_processed_agent_data (one multi-VALUES INSERT ... RETURNING id per batch)
+against the database configured in config.py.
+
+Run from the store directory:
+    python benchmarks/bench_bulk_insert.py
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import engine, processed_agent_data, insert_processed_agent_data  # noqa: E402
+
+BATCH_SIZES = (20, 500, 5000)
+BENCH_USER_ID = 999_999
+
+
+def make_rows(count):
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "road_state": "good", "user_id": BENCH_USER_ID,
+            "x": 0.01 * i, "y": 0.02 * i, "z": 0.03 * i,
+            "latitude": 50.45 + i * 1e-5, "longitude": 30.52 + i * 1e-5,
+            "timestamp": start + timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+
+
+async def insert_row_by_row(rows):
+    ids = []
+    for row in rows:
+        async with engine.begin() as connection:
+            result = await connection.execute(processed_agent_data.insert().values(**row))
+        ids.append(result.inserted_primary_key[0])
+    return ids
+
+
+async def insert_bulk(rows):
+    async with engine.begin() as connection:
+        return await insert_processed_agent_data(connection, rows)
+
+
+async def measure(insert, rows):
+    started = time.perf_counter()
+    ids = await insert(rows)
+    elapsed = time.perf_counter() - started
+    assert len(ids) == len(rows)
+    async with engine.begin() as connection:
+        await connection.execute(
+            processed_agent_data.delete().where(processed_agent_data.c.user_id == BENCH_USER_ID)
+        )
+    return len(rows) / elapsed
+
+
+async def main():
+    print(f"{'batch':>6} {'row-by-row rows/s':>18} {'bulk rows/s':>12} {'speedup':>8}")
+    for size in BATCH_SIZES:
+        rows = make_rows(size)
+        old = await measure(insert_row_by_row, rows)
+        new = await measure(insert_bulk, rows)
+        print(f"{size:>6} {old:>18.0f} {new:>12.0f} {new / old:>7.1f}x")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
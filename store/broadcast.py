@@ -0,0 +1,231 @@
+import asyncio
+import json
+from collections import deque
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+# What to do with a new row when a subscriber's backlog is full
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, DISCONNECT)
+
+
+class SubscriptionMessage(BaseModel):
+    """
+    Message a client sends over the WebSocket to (re)configure what it receives.
+    Every field is optional; an omitted filter matches everything. The area
+    is given by min_latitude, max_latitude, min_longitude and max_longitude,
+    as in GET /processed_agent_data/bbox, all four or none.
+    With max_fps set, rows are coalesced into at most max_fps
+    new_data_batch frames per second; without it every row is its own
+    new_data frame.
+    """
+
+    type: str = "subscribe"
+    user_ids: Optional[List[int]] = None
+    road_states: Optional[List[str]] = None
+    min_latitude: Optional[float] = None
+    max_latitude: Optional[float] = None
+    min_longitude: Optional[float] = None
+    max_longitude: Optional[float] = None
+    max_fps: Optional[float] = Field(default=None, gt=0)
+
+    @field_validator("type")
+    @classmethod
+    def check_type(cls, value):
+        if value != "subscribe":
+            raise ValueError("Only 'subscribe' messages are supported")
+        return value
+
+    @model_validator(mode="after")
+    def check_bbox(self):
+        bounds = (self.min_latitude, self.max_latitude, self.min_longitude, self.max_longitude)
+        if any(value is None for value in bounds) and any(value is not None for value in bounds):
+            raise ValueError("All four bounds of the area are required")
+        return self
+
+    @property
+    def bbox(self) -> Optional[Tuple[float, float, float, float]]:
+        """(min_latitude, max_latitude, min_longitude, max_longitude), the order of within_bbox()."""
+        if self.min_latitude is None:
+            return None
+        return (self.min_latitude, self.max_latitude, self.min_longitude, self.max_longitude)
+
+
+class Subscriber:
+    """
+    One WebSocket connection with its filter, a bounded backlog of
+    pre-encoded rows and its own sender task, so a slow client only ever
+    delays itself.
+    """
+
+    def __init__(self, websocket: WebSocket, backlog_size: int, user_ids: Optional[Set[int]] = None):
+        self.websocket = websocket
+        self.backlog: deque = deque()
+        self.backlog_size = backlog_size
+        self.user_ids = user_ids
+        self.road_states: Optional[Set[str]] = None
+        self.bbox: Optional[Tuple[float, float, float, float]] = None
+        self.max_fps: Optional[float] = None
+        self.sent = 0
+        self.dropped = 0
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task = None
+
+    def configure(self, message: SubscriptionMessage, max_fps_limit: float):
+        self.user_ids = set(message.user_ids) if message.user_ids is not None else None
+        self.road_states = set(message.road_states) if message.road_states is not None else None
+        self.bbox = message.bbox
+        self.max_fps = min(message.max_fps, max_fps_limit) if message.max_fps else None
+        self.wakeup.set()
+
+    def describe(self) -> Dict[str, Any]:
+        min_latitude, max_latitude, min_longitude, max_longitude = self.bbox or (None, None, None, None)
+        return {
+            "user_ids": sorted(self.user_ids) if self.user_ids is not None else None,
+            "road_states": sorted(self.road_states) if self.road_states is not None else None,
+            "min_latitude": min_latitude,
+            "max_latitude": max_latitude,
+            "min_longitude": min_longitude,
+            "max_longitude": max_longitude,
+            "max_fps": self.max_fps,
+        }
+
+    def matches(self, row: Dict[str, Any]) -> bool:
+        if self.road_states is not None and row["road_state"] not in self.road_states:
+            return False
+        if self.bbox is not None:
+            min_latitude, max_latitude, min_longitude, max_longitude = self.bbox
+            if not (min_latitude <= row["latitude"] <= max_latitude
+                    and min_longitude <= row["longitude"] <= max_longitude):
+                return False
+        return True
+
+    def offer(self, encoded_rows: List[str], overflow_policy: str) -> bool:
+        """Queue encoded rows without waiting. Returns False if the subscriber must be dropped."""
+        for encoded_row in encoded_rows:
+            if len(self.backlog) >= self.backlog_size:
+                if overflow_policy == DISCONNECT:
+                    return False
+                self.dropped += 1
+                if overflow_policy == DROP_NEWEST:
+                    continue
+                self.backlog.popleft()
+            self.backlog.append(encoded_row)
+        self.wakeup.set()
+        return True
+
+    def next_frames(self) -> List[str]:
+        """Drain the backlog into frames: one batch frame, or one frame per row."""
+        rows = list(self.backlog)
+        self.backlog.clear()
+        if not rows:
+            return []
+        if self.max_fps:
+            return ['{"type": "new_data_batch", "data": [' + ", ".join(rows) + "]}"]
+        return ['{"type": "new_data", "data": ' + row + "}" for row in rows]
+
+
+class Broadcaster:
+    """
+    Encode-once fan-out of new store rows to WebSocket subscribers. Each row
+    is serialized once; frames for a subscriber are assembled from those
+    strings.
+    """
+
+    def __init__(self, queue_size: int, overflow_policy: str, send_timeout: float, max_fps: float):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown WebSocket overflow policy: {overflow_policy}")
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.send_timeout = send_timeout
+        self.max_fps = max_fps
+        self._subscribers: Set[Subscriber] = set()
+        # Totals of subscribers that are gone, so stats() stays cumulative
+        self._sent = 0
+        self._dropped = 0
+
+    def subscribe(self, websocket: WebSocket, user_id: Optional[int] = None) -> Subscriber:
+        subscriber = Subscriber(
+            websocket, self.queue_size, {user_id} if user_id is not None else None
+        )
+        self._subscribers.add(subscriber)
+        subscriber.task = asyncio.create_task(self._send_loop(subscriber))
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber in self._subscribers:
+            self._subscribers.remove(subscriber)
+            self._sent += subscriber.sent
+            self._dropped += subscriber.dropped
+        if subscriber.task is not None and subscriber.task is not asyncio.current_task():
+            subscriber.task.cancel()
+
+    def configure(self, subscriber: Subscriber, message: SubscriptionMessage):
+        subscriber.configure(message, self.max_fps)
+
+    def publish(self, rows: List[Dict[str, Any]]):
+        """Queue rows for every interested subscriber. Never waits on a socket."""
+        if not self._subscribers or not rows:
+            return
+        rows_by_user: Dict[int, List[Tuple[Dict[str, Any], str]]] = {}
+        for row in rows:
+            encoded_row = json.dumps(jsonable_encoder(row))
+            rows_by_user.setdefault(row["user_id"], []).append((row, encoded_row))
+        for subscriber in list(self._subscribers):
+            if subscriber.user_ids is None:
+                candidates = [pair for pairs in rows_by_user.values() for pair in pairs]
+            else:
+                candidates = [
+                    pair for user_id in subscriber.user_ids for pair in rows_by_user.get(user_id, ())
+                ]
+            matching = [encoded for row, encoded in candidates if subscriber.matches(row)]
+            if matching and not subscriber.offer(matching, self.overflow_policy):
+                self._drop(subscriber)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "queued_rows": sum(len(s.backlog) for s in self._subscribers),
+            "sent_frames": self._sent + sum(s.sent for s in self._subscribers),
+            "dropped_rows": self._dropped + sum(s.dropped for s in self._subscribers),
+        }
+
+    async def close(self):
+        for subscriber in list(self._subscribers):
+            self.unsubscribe(subscriber)
+
+    def _drop(self, subscriber: Subscriber):
+        self.unsubscribe(subscriber)
+        asyncio.create_task(self._close_socket(subscriber))
+
+    async def _close_socket(self, subscriber: Subscriber):
+        try:
+            await subscriber.websocket.close(code=1013)  # Try again later
+        except Exception:
+            pass
+
+    async def _send_loop(self, subscriber: Subscriber):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                await subscriber.wakeup.wait()
+                subscriber.wakeup.clear()
+                started = loop.time()
+                for frame in subscriber.next_frames():
+                    await asyncio.wait_for(
+                        subscriber.websocket.send_text(frame), timeout=self.send_timeout
+                    )
+                    subscriber.sent += 1
+                if subscriber.max_fps:
+                    # Rows arriving until the next tick are coalesced into one frame
+                    await asyncio.sleep(max(0.0, 1 / subscriber.max_fps - (loop.time() - started)))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Closed or stuck socket: stop feeding it
+            self._drop(subscriber)
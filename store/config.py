@@ -14,3 +14,40 @@ POSTGRES_PORT = try_parse(int, os.environ.get("POSTGRES_PORT")) or 5432
 POSTGRES_USER = os.environ.get("POSTGRES_USER") or "roma"
 POSTGRES_PASSWORD = os.environ.get("POSTGRES_PASSWORD") or "tobeor"
 POSTGRES_DB = os.environ.get("POSTGRES_DB") or "iot_db"
+
+# Async engine connection pool
+DB_POOL_SIZE = try_parse(int, os.environ.get("DB_POOL_SIZE")) or 10
+DB_MAX_OVERFLOW = try_parse(int, os.environ.get("DB_MAX_OVERFLOW")) or 20
+DB_POOL_TIMEOUT = try_parse(float, os.environ.get("DB_POOL_TIMEOUT")) or 30
+DB_POOL_RECYCLE = try_parse(int, os.environ.get("DB_POOL_RECYCLE")) or 1800
+
+# Rows per COPY ... FROM STDIN chunk for streamed uploads
+COPY_CHUNK_ROWS = try_parse(int, os.environ.get("COPY_CHUNK_ROWS")) or 10000
+
+# Keyset pagination and streaming of processed_agent_data
+DEFAULT_PAGE_SIZE = try_parse(int, os.environ.get("DEFAULT_PAGE_SIZE")) or 100
+MAX_PAGE_SIZE = try_parse(int, os.environ.get("MAX_PAGE_SIZE")) or 1000
+STREAM_BATCH_SIZE = try_parse(int, os.environ.get("STREAM_BATCH_SIZE")) or 1000
+
+# WebSocket fan-out: rows queued per subscriber, what to do when a slow
+# subscriber's queue is full (drop_oldest, drop_newest or disconnect),
+# how long a single send may take before the subscriber is dropped and the
+# highest frame rate a subscriber may ask for
+WS_QUEUE_SIZE = try_parse(int, os.environ.get("WS_QUEUE_SIZE")) or 256
+WS_OVERFLOW_POLICY = os.environ.get("WS_OVERFLOW_POLICY") or "drop_oldest"
+WS_SEND_TIMEOUT = try_parse(float, os.environ.get("WS_SEND_TIMEOUT")) or 5
+WS_MAX_FPS = try_parse(float, os.environ.get("WS_MAX_FPS")) or 20
+
+# Range partitioning of processed_agent_data on timestamp: period length
+# (day, week or month), how many future periods to create in advance,
+# retention in days (0 keeps everything) and how often maintenance runs
+PARTITION_INTERVAL = os.environ.get("PARTITION_INTERVAL") or "month"
+PARTITIONS_AHEAD = try_parse(int, os.environ.get("PARTITIONS_AHEAD")) or 2
+RETENTION_DAYS = try_parse(int, os.environ.get("RETENTION_DAYS")) or 0
+PARTITION_MAINTENANCE_INTERVAL = try_parse(float, os.environ.get("PARTITION_MAINTENANCE_INTERVAL")) or 3600
+
+# Downsampled user tracks: RDP tolerance in metres, default point budget
+# and the most points a client may ask for
+TRACK_TOLERANCE = try_parse(float, os.environ.get("TRACK_TOLERANCE")) or 5.0
+TRACK_DEFAULT_POINTS = try_parse(int, os.environ.get("TRACK_DEFAULT_POINTS")) or 1000
+TRACK_MAX_POINTS = try_parse(int, os.environ.get("TRACK_MAX_POINTS")) or 5000
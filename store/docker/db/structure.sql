@@ -1,3 +1,5 @@
+-- Base schema for a fresh database. Indexes and later schema changes are
+-- applied by migrations.py when the store starts.
 CREATE TABLE processed_agent_data (
     id SERIAL PRIMARY KEY,
     road_state VARCHAR(255) NOT NULL,
@@ -0,0 +1,168 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from tiles import TileAccumulator
+
+# Column order used both for parsing CSV uploads and for the COPY statement
+COPY_COLUMNS = (
+    "road_state",
+    "user_id",
+    "x",
+    "y",
+    "z",
+    "latitude",
+    "longitude",
+    "timestamp",
+)
+# Only the first rejected rows are reported back, so the report stays small
+MAX_REPORTED_ERRORS = 20
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Split a streamed request body into lines without buffering it whole.
+    Lines are left undecoded, so invalid UTF-8 only rejects its own line.
+    """
+    tail = b""
+    async for chunk in stream:
+        if not chunk:
+            continue
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line
+    if tail:
+        yield tail
+
+
+def to_naive_utc(timestamp: datetime) -> datetime:
+    """
+    processed_agent_data.timestamp is TIMESTAMP WITHOUT TIME ZONE holding UTC.
+    PostgreSQL drops the offset of an aware value there and asyncpg rejects
+    it, so aware values are converted to UTC first.
+    """
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _parse_timestamp(value) -> datetime:
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value)
+    # Mixed aware and naive values could not even be compared for last_seen
+    return to_naive_utc(value)
+
+
+def row_from_values(road_state, user_id, x, y, z, latitude, longitude, timestamp) -> Tuple:
+    """Validate and coerce one row into COPY_COLUMNS order."""
+    if not road_state:
+        raise ValueError("road_state is required")
+    return (
+        str(road_state),
+        int(user_id),
+        float(x),
+        float(y),
+        float(z),
+        float(latitude),
+        float(longitude),
+        _parse_timestamp(timestamp),
+    )
+
+
+def parse_ndjson_line(line: str) -> Tuple:
+    """
+    Parse one NDJSON record. Both the nested ProcessedAgentData shape used by
+    POST /processed_agent_data/ and the flat table row shape are accepted.
+    """
+    item = json.loads(line)
+    if "agent_data" in item:
+        agent_data = item["agent_data"]
+        accelerometer = agent_data["accelerometer"]
+        gps = agent_data["gps"]
+        return row_from_values(
+            item["road_state"], agent_data["user_id"],
+            accelerometer["x"], accelerometer["y"], accelerometer["z"],
+            gps["latitude"], gps["longitude"], agent_data["timestamp"],
+        )
+    return row_from_values(*(item[column] for column in COPY_COLUMNS))
+
+
+def parse_csv_header(line: str) -> List[str]:
+    """Return the CSV header columns, or raise ValueError if any are missing."""
+    header = [column.strip() for column in next(csv.reader([line]))]
+    missing = [column for column in COPY_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(", ".join(missing))
+    return header
+
+
+def parse_csv_line(line: str, header: List[str]) -> Tuple:
+    values = next(csv.reader([line]))
+    if len(values) != len(header):
+        raise ValueError(f"expected {len(header)} fields, got {len(values)}")
+    record: Dict[str, str] = dict(zip(header, values))
+    return row_from_values(*(record[column] for column in COPY_COLUMNS))
+
+
+class CopyBuffer:
+    """Accumulates validated rows as CSV text, plus their tile deltas, for one COPY chunk."""
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self.rows = 0
+        self.tiles = TileAccumulator()
+
+    def add(self, row: Tuple):
+        road_state, user_id, x, y, z, latitude, longitude, timestamp = row
+        timestamp = to_naive_utc(timestamp)
+        self._writer.writerow(
+            (road_state, user_id, x, y, z, latitude, longitude, timestamp.isoformat())
+        )
+        self.tiles.add(road_state, z, latitude, longitude, timestamp)
+        self.rows += 1
+
+    def take(self) -> Tuple[io.BytesIO, int, TileAccumulator]:
+        """Return the buffered CSV data, row count and tile deltas, and start a new chunk."""
+        data = io.BytesIO(self._buffer.getvalue().encode("utf-8"))
+        rows, tiles = self.rows, self.tiles
+        self.__init__()
+        return data, rows, tiles
+
+
+class IngestReport:
+    """Accepted and rejected row counts for a streamed upload."""
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.errors: List[Dict] = []
+
+    def reject(self, line_number: int, error: Exception):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            message = f"missing field {error}" if isinstance(error, KeyError) else str(error)
+            self.errors.append({"line": line_number, "error": message})
+
+    def as_dict(self) -> Dict:
+        return {
+            "status": "success",
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+
+def is_csv(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.split(";")[0].strip() == "text/csv"
+
+
+async def copy_chunk(driver_connection, data: io.BytesIO):
+    """Run one COPY processed_agent_data FROM STDIN for a chunk on an asyncpg connection."""
+    await driver_connection.copy_to_table(
+        "processed_agent_data", source=data, columns=COPY_COLUMNS, format="csv"
+    )
+
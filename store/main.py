@@ -1,9 +1,23 @@
 import asyncio
 import json
-from typing import Set, Dict, List, Any
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Body
+import numpy as np
+from contextlib import asynccontextmanager
+from typing import Dict, List, Any, Optional
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    WebSocket,
+    WebSocketDisconnect,
+    Body,
+    Request,
+    Response,
+    Query,
+    Depends,
+)
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy import (
-    create_engine,
+    func,
     MetaData,
     Table,
     Column,
@@ -12,16 +26,54 @@ from sqlalchemy import (
     Float,
     DateTime,
 )
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.sql import select
 from datetime import datetime
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, TypeAdapter, ValidationError, field_validator
 from config import (
     POSTGRES_HOST,
     POSTGRES_PORT,
     POSTGRES_DB,
     POSTGRES_USER,
     POSTGRES_PASSWORD,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    COPY_CHUNK_ROWS,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    STREAM_BATCH_SIZE,
+    WS_QUEUE_SIZE,
+    WS_OVERFLOW_POLICY,
+    WS_SEND_TIMEOUT,
+    WS_MAX_FPS,
+    PARTITION_INTERVAL,
+    PARTITIONS_AHEAD,
+    RETENTION_DAYS,
+    PARTITION_MAINTENANCE_INTERVAL,
+    TRACK_TOLERANCE,
+    TRACK_DEFAULT_POINTS,
+    TRACK_MAX_POINTS,
+)
+from broadcast import Broadcaster, SubscriptionMessage
+from tiles import TileAccumulator, apply_tile_deltas, merge_tile_rows, tile_query
+from migrations import apply_migrations
+from partitions import maintain_partitions
+from wire_format import MSGPACK, decode_batch, wire_format_for
+from track import TrackSimplifier
+from ingest import (
+    CopyBuffer,
+    IngestReport,
+    copy_chunk,
+    is_csv,
+    iter_lines,
+    parse_csv_header,
+    parse_csv_line,
+    parse_ndjson_line,
+    to_naive_utc,
 )
 
 print(f"""
@@ -33,13 +85,18 @@ DB: {POSTGRES_DB}
 PASSWORD: {'*' * len(POSTGRES_PASSWORD)}
 """)
 
-# FastAPI app setup
-app = FastAPI()
 # SQLAlchemy setup
-DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+DATABASE_URL = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 print(f"Database URL: {DATABASE_URL.replace(POSTGRES_PASSWORD, '*' * len(POSTGRES_PASSWORD))}")
 
-engine = create_engine(DATABASE_URL)
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
 metadata = MetaData()
 # Define the ProcessedAgentData table
 processed_agent_data = Table(
@@ -54,8 +111,51 @@ processed_agent_data = Table(
     Column("latitude", Float),
     Column("longitude", Float),
     Column("timestamp", DateTime),
+    Column("idempotency_key", String),
+)
+
+# WebSocket fan-out
+broadcaster = Broadcaster(
+    queue_size=WS_QUEUE_SIZE,
+    overflow_policy=WS_OVERFLOW_POLICY,
+    send_timeout=WS_SEND_TIMEOUT,
+    max_fps=WS_MAX_FPS,
 )
-SessionLocal = sessionmaker(bind=engine)
+
+
+async def run_partition_maintenance():
+    async with engine.begin() as connection:
+        created, dropped = await connection.run_sync(
+            maintain_partitions, PARTITION_INTERVAL, PARTITIONS_AHEAD, RETENTION_DAYS
+        )
+    if created or dropped:
+        print(f"Partitions created: {created or 'none'}, dropped: {dropped or 'none'}")
+
+
+async def partition_maintenance_loop():
+    while True:
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+        try:
+            await run_partition_maintenance()
+        except Exception as e:
+            print(f"Partition maintenance failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as connection:
+        applied = await connection.run_sync(apply_migrations)
+    print(f"Schema is up to date, applied migrations: {applied or 'none'}")
+    await run_partition_maintenance()
+    maintenance_task = asyncio.create_task(partition_maintenance_loop())
+    yield
+    maintenance_task.cancel()
+    await broadcaster.close()
+    await engine.dispose()
+
+
+# FastAPI app setup
+app = FastAPI(lifespan=lifespan)
 
 
 # SQLAlchemy model
@@ -69,6 +169,7 @@ class ProcessedAgentDataInDB(BaseModel):
     latitude: float
     longitude: float
     timestamp: datetime
+    idempotency_key: Optional[str] = None
 
 
 # FastAPI models
@@ -105,173 +206,540 @@ class AgentData(BaseModel):
 class ProcessedAgentData(BaseModel):
     road_state: str
     agent_data: AgentData
+    # Set by the hub so redelivered items are stored only once
+    idempotency_key: Optional[str] = None
 
 
-# WebSocket subscriptions
-subscriptions: Dict[int, Set[WebSocket]] = {}
+processed_agent_data_batch = TypeAdapter(List[ProcessedAgentData])
 
 
-# FastAPI WebSocket endpoint
-@app.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: int):
+async def _serve_subscriber(websocket: WebSocket, user_id: Optional[int]):
     await websocket.accept()
-    if user_id not in subscriptions:
-        subscriptions[user_id] = set()
-    subscriptions[user_id].add(websocket)
+    subscriber = broadcaster.subscribe(websocket, user_id)
     try:
         while True:
-            await websocket.receive_text()
+            message = await websocket.receive_text()
+            try:
+                subscription = SubscriptionMessage.model_validate_json(message)
+            except ValidationError as e:
+                await websocket.send_text(json.dumps({"type": "error", "detail": str(e)}))
+                continue
+            broadcaster.configure(subscriber, subscription)
+            await websocket.send_text(
+                json.dumps({"type": "subscribed", "filter": subscriber.describe()})
+            )
     except WebSocketDisconnect:
-        subscriptions[user_id].remove(websocket)
+        pass
+    finally:
+        broadcaster.unsubscribe(subscriber)
 
 
-# Function to send data to subscribed users
-async def send_data_to_subscribers(user_id: int, data):
-    if user_id in subscriptions:
-        for websocket in subscriptions[user_id]:
-            await websocket.send_json(json.dumps(data))
+# FastAPI WebSocket endpoints
+@app.websocket("/ws")
+async def websocket_subscription_endpoint(websocket: WebSocket):
+    """
+    Receives every new row until the client sends a SubscriptionMessage
+    (user_ids, road_states, min/max_latitude and min/max_longitude, max_fps)
+    to narrow it down.
+    """
+    await _serve_subscriber(websocket, None)
+
+
+@app.websocket("/ws/{user_id}")
+async def websocket_endpoint(websocket: WebSocket, user_id: int):
+    await _serve_subscriber(websocket, user_id)
+
+
+def to_db_row(item: ProcessedAgentData) -> Dict[str, Any]:
+    """Flatten an incoming ProcessedAgentData into a processed_agent_data row."""
+    timestamp = to_naive_utc(item.agent_data.timestamp)
+    return {
+        "road_state": item.road_state, "user_id": item.agent_data.user_id,
+        "x": item.agent_data.accelerometer.x, "y": item.agent_data.accelerometer.y,
+        "z": item.agent_data.accelerometer.z, "latitude": item.agent_data.gps.latitude,
+        "longitude": item.agent_data.gps.longitude, "timestamp": timestamp,
+        "idempotency_key": item.idempotency_key,
+    }
+
+
+async def insert_processed_agent_data(connection, rows: List[Dict[str, Any]]) -> List[Optional[int]]:
+    """
+    Insert a batch of rows and return their ids, aligned with the input rows.
+    SQLAlchemy turns the executemany into multi-VALUES INSERT ... RETURNING id,
+    and sort_by_parameter_order keeps the ids aligned with the input rows.
+    Rows carrying an idempotency_key that is already stored for the same
+    timestamp are skipped with ON CONFLICT DO NOTHING; their id is None.
+    The caller owns the transaction, so the whole batch costs one commit.
+    """
+    ids: List[Optional[int]] = [None] * len(rows)
+    plain = [index for index, row in enumerate(rows) if row.get("idempotency_key") is None]
+    keyed = [index for index, row in enumerate(rows) if row.get("idempotency_key") is not None]
+    if plain:
+        query = processed_agent_data.insert().returning(
+            processed_agent_data.c.id, sort_by_parameter_order=True
+        )
+        result = await connection.execute(query, [rows[index] for index in plain])
+        for index, id_ in zip(plain, result.scalars()):
+            ids[index] = id_
+    if keyed:
+        # Skipped rows leave gaps in RETURNING, so ids are matched back by key
+        query = (
+            insert(processed_agent_data)
+            .on_conflict_do_nothing(index_elements=["idempotency_key", "timestamp"])
+            .returning(processed_agent_data.c.id, processed_agent_data.c.idempotency_key)
+        )
+        result = await connection.execute(query, [rows[index] for index in keyed])
+        inserted = {row.idempotency_key: row.id for row in result}
+        for index in keyed:
+            ids[index] = inserted.pop(rows[index]["idempotency_key"], None)
+    return ids
 
 
 # FastAPI CRUDL endpoints
 
 
 @app.post("/processed_agent_data/")
-async def create_processed_agent_data(data: List[ProcessedAgentData]):
-    db = SessionLocal()
+async def create_processed_agent_data(request: Request):
+    """
+    Store a batch of ProcessedAgentData. The body is a JSON array (default)
+    or, with Content-Type: application/msgpack, a MessagePack array of
+    positional records (see wire_format.py).
+    """
+    body = await request.body()
     try:
-        created_items = []
-        for item in data:
-            db_item = {
-                "road_state": item.road_state,"user_id": item.agent_data.user_id,
-                "x": item.agent_data.accelerometer.x, "y": item.agent_data.accelerometer.y,
-                "z": item.agent_data.accelerometer.z, "latitude": item.agent_data.gps.latitude,
-                "longitude": item.agent_data.gps.longitude, "timestamp": item.agent_data.timestamp
-            }
-            
-            query = processed_agent_data.insert().values(**db_item)
-            result = db.execute(query)
-            db.commit()
-            
-            created_item = {
-                "id": result.inserted_primary_key[0],
-                **db_item
-            }
-            created_items.append(created_item)
-            
-            if item.agent_data.user_id in subscriptions:
-                await send_data_to_subscribers(
-                    item.agent_data.user_id, {"type": "new_data", "data": created_item}
-                )
-        
-        return {"status": "success","message": f"Успішно створено {len(created_items)} елементів",
-            "data": created_items
-        }
+        if wire_format_for(request.headers.get("content-type")) == MSGPACK:
+            data = processed_agent_data_batch.validate_python(decode_batch(body))
+        else:
+            data = processed_agent_data_batch.validate_json(body)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Некоректні дані: {str(e)}")
+    try:
+        rows = [to_db_row(item) for item in data]
+        async with engine.begin() as connection:
+            ids = await insert_processed_agent_data(connection, rows)
+            # Duplicates that were skipped are not counted again
+            created_items = [{"id": id_, **row} for id_, row in zip(ids, rows) if id_ is not None]
+            tiles = TileAccumulator()
+            tiles.add_rows(created_items)
+            await apply_tile_deltas(connection, tiles)
+    except (OperationalError, InterfaceError, PoolTimeoutError, OSError) as e:
+        # The database is unreachable or overloaded, the data may be fine:
+        # 503 tells the hub to retry instead of dead-lettering it
+        raise HTTPException(
+            status_code=503,
+            detail=f"База даних недоступна: {str(e)}"
+        )
     except Exception as e:
-        db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Під час створення даних сталася помилка: {str(e)}"
         )
-    finally:
-        db.close()
+
+    # Fan out only after the batch is committed; publish only enqueues rows
+    broadcaster.publish(created_items)
+
+    return {"status": "success", "message": f"Успішно створено {len(created_items)} елементів",
+        "data": created_items
+    }
+
+
+@app.post("/processed_agent_data/copy")
+async def copy_processed_agent_data(request: Request):
+    """
+    Streaming bulk ingest for backfills. The body is newline-delimited JSON
+    (default) or CSV with a header row (Content-Type: text/csv). Rows are
+    validated line by line and loaded with COPY ... FROM STDIN in chunks of
+    COPY_CHUNK_ROWS, each committed on its own, so memory does not grow with
+    the upload size. Backfilled rows are not pushed to WebSocket subscribers.
+    """
+    csv_upload = is_csv(request.headers.get("content-type"))
+    header = None
+    report = IngestReport()
+    chunk = CopyBuffer()
+
+    async def flush():
+        data, rows, tiles = chunk.take()
+        async with engine.begin() as connection:
+            # The tile upsert opens the transaction on the asyncpg connection,
+            # so the COPY below commits or rolls back together with it
+            await apply_tile_deltas(connection, tiles)
+            driver_connection = (await connection.get_raw_connection()).driver_connection
+            await copy_chunk(driver_connection, data)
+        report.accepted += rows
+
+    try:
+        line_number = 0
+        async for raw_line in iter_lines(request.stream()):
+            line_number += 1
+            if not raw_line.strip():
+                continue
+            if csv_upload and header is None:
+                try:
+                    header = parse_csv_header(raw_line.decode("utf-8"))
+                except ValueError as e:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"CSV заголовок не містить колонок: {str(e)}"
+                    )
+                continue
+            try:
+                # UnicodeDecodeError is a ValueError: the line is rejected, the upload goes on
+                line = raw_line.decode("utf-8")
+                row = parse_csv_line(line, header) if csv_upload else parse_ndjson_line(line)
+            except (ValueError, KeyError, TypeError) as e:
+                report.reject(line_number, e)
+                continue
+            chunk.add(row)
+            if chunk.rows >= COPY_CHUNK_ROWS:
+                await flush()
+        if chunk.rows:
+            await flush()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Під час завантаження даних сталася помилка після {report.accepted} рядків: {str(e)}"
+        )
+
+    return report.as_dict()
+
+
+def within_bbox(min_latitude: float, max_latitude: float, min_longitude: float, max_longitude: float):
+    """
+    point(longitude, latitude) <@ box(...), written to match the expression of
+    the ix_processed_agent_data_location GiST index so the planner can use it.
+    """
+    location = func.point(processed_agent_data.c.longitude, processed_agent_data.c.latitude)
+    return location.op("<@")(
+        func.box(func.point(min_longitude, min_latitude), func.point(max_longitude, max_latitude))
+    )
+
+
+class ProcessedAgentDataFilters:
+    """Query-string filters shared by the list and stream endpoints."""
+
+    def __init__(
+        self,
+        user_id: Optional[int] = None,
+        road_state: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        min_latitude: Optional[float] = None,
+        max_latitude: Optional[float] = None,
+        min_longitude: Optional[float] = None,
+        max_longitude: Optional[float] = None,
+    ):
+        self.user_id = user_id
+        self.road_state = road_state
+        # Compared with naive UTC timestamps, like the ones stored
+        self.start = to_naive_utc(start) if start is not None else None
+        self.end = to_naive_utc(end) if end is not None else None
+        self.bbox = (min_latitude, max_latitude, min_longitude, max_longitude)
+
+    def apply(self, query):
+        table = processed_agent_data
+        if self.user_id is not None:
+            query = query.where(table.c.user_id == self.user_id)
+        if self.road_state is not None:
+            query = query.where(table.c.road_state == self.road_state)
+        if self.start is not None:
+            query = query.where(table.c.timestamp >= self.start)
+        if self.end is not None:
+            query = query.where(table.c.timestamp < self.end)
+        min_latitude, max_latitude, min_longitude, max_longitude = self.bbox
+        if None not in self.bbox:
+            query = query.where(
+                within_bbox(min_latitude, max_latitude, min_longitude, max_longitude)
+            )
+            return query
+        if min_latitude is not None:
+            query = query.where(table.c.latitude >= min_latitude)
+        if max_latitude is not None:
+            query = query.where(table.c.latitude <= max_latitude)
+        if min_longitude is not None:
+            query = query.where(table.c.longitude >= min_longitude)
+        if max_longitude is not None:
+            query = query.where(table.c.longitude <= max_longitude)
+        return query
+
+
+@app.get("/processed_agent_data/", response_model=list[ProcessedAgentDataInDB])
+async def list_processed_agent_data(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    filters: ProcessedAgentDataFilters = Depends(),
+):
+    """
+    One page of rows ordered by id. Pass the X-Next-Cursor header of the
+    previous response as after_id to get the next page; the header is absent
+    on the last page.
+    """
+    try:
+        query = filters.apply(select(processed_agent_data))
+        if after_id is not None:
+            query = query.where(processed_agent_data.c.id > after_id)
+        query = query.order_by(processed_agent_data.c.id).limit(limit)
+        async with engine.connect() as connection:
+            results = (await connection.execute(query)).fetchall()
+        if len(results) == limit:
+            response.headers["X-Next-Cursor"] = str(results[-1].id)
+        return results
+    
+    except Exception as e:
+        raise HTTPException(status_code=500,detail=f"Помилка при отриманні списку даних: {str(e)}")
+
+
+@app.get("/processed_agent_data/bbox", response_model=list[ProcessedAgentDataInDB])
+async def list_processed_agent_data_in_bbox(
+    response: Response,
+    min_latitude: float,
+    max_latitude: float,
+    min_longitude: float,
+    max_longitude: float,
+    user_id: Optional[int] = None,
+    road_state: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Rows inside a bounding box, paginated like GET /processed_agent_data/."""
+    filters = ProcessedAgentDataFilters(
+        user_id, road_state, start, end,
+        min_latitude, max_latitude, min_longitude, max_longitude,
+    )
+    return await list_processed_agent_data(response, after_id, limit, filters)
+
+
+async def _stream_rows_as_ndjson(query):
+    # stream() runs the query through an asyncpg server-side cursor, so only
+    # STREAM_BATCH_SIZE rows are held in memory at a time
+    async with engine.connect() as connection:
+        result = await connection.stream(
+            query.execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        async for row in result:
+            yield json.dumps(jsonable_encoder(row._asdict())) + "\n"
+
+
+@app.get("/processed_agent_data/stream")
+async def stream_processed_agent_data(
+    after_id: Optional[int] = None,
+    filters: ProcessedAgentDataFilters = Depends(),
+):
+    """All matching rows ordered by id as newline-delimited JSON."""
+    query = filters.apply(select(processed_agent_data))
+    if after_id is not None:
+        query = query.where(processed_agent_data.c.id > after_id)
+    query = query.order_by(processed_agent_data.c.id)
+    return StreamingResponse(
+        _stream_rows_as_ndjson(query), media_type="application/x-ndjson"
+    )
 
 
 @app.get(
     "/processed_agent_data/{processed_agent_data_id}",response_model=ProcessedAgentDataInDB,)
-def read_processed_agent_data(processed_agent_data_id: int):
+async def read_processed_agent_data(processed_agent_data_id: int):
     try:
-        db = SessionLocal()
         query = select(processed_agent_data).where(
             processed_agent_data.c.id == processed_agent_data_id
         )
-        result = db.execute(query).first()
+        async with engine.connect() as connection:
+            result = (await connection.execute(query)).first()
         
         if result is None:
             raise HTTPException(status_code=404, detail=f"Дані з ID {processed_agent_data_id} не знайдено") 
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Помилка при отриманні даних: {str(e)}"
         )
-    finally:
-        db.close()
-
-
-@app.get("/processed_agent_data/", response_model=list[ProcessedAgentDataInDB])
-def list_processed_agent_data():
-    try:
-        db = SessionLocal()
-        query = select(processed_agent_data)
-        results = db.execute(query).fetchall()
-        return results
-    
-    except Exception as e:
-        raise HTTPException(status_code=500,detail=f"Помилка при отриманні списку даних: {str(e)}")
-    finally:
-        db.close()
 
 
 @app.put(
     "/processed_agent_data/{processed_agent_data_id}",
     response_model=ProcessedAgentDataInDB,
 )
-def update_processed_agent_data(processed_agent_data_id: int, data: ProcessedAgentData):
+async def update_processed_agent_data(processed_agent_data_id: int, data: ProcessedAgentData):
     try:
-        db = SessionLocal() 
-        check_query = select(processed_agent_data).where(
-            processed_agent_data.c.id == processed_agent_data_id
+        update_data = to_db_row(data)
+        check_query = (
+            select(processed_agent_data)
+            .where(processed_agent_data.c.id == processed_agent_data_id)
+            .with_for_update()
         )
-        existing_record = db.execute(check_query).first()
-        
-        if existing_record is None:
-            raise HTTPException(status_code=404,detail=f"Дані з ID {processed_agent_data_id} не знайдено")
-        update_data = {
-            "road_state": data.road_state,"user_id": data.agent_data.user_id,
-            "x": data.agent_data.accelerometer.x,"y": data.agent_data.accelerometer.y,
-            "z": data.agent_data.accelerometer.z, "latitude": data.agent_data.gps.latitude,
-            "longitude": data.agent_data.gps.longitude,"timestamp": data.agent_data.timestamp
-        }
-        
-        query = processed_agent_data.update().where(processed_agent_data.c.id == processed_agent_data_id).values(**update_data)  
-        db.execute(query)
-        db.commit()
-        updated_record = db.execute(check_query).first()
+        query = (
+            processed_agent_data.update()
+            .where(processed_agent_data.c.id == processed_agent_data_id)
+            .values(**update_data)
+            .returning(*processed_agent_data.c)
+        )
+        async with engine.begin() as connection:
+            existing_record = (await connection.execute(check_query)).first()
+            if existing_record is None:
+                raise HTTPException(status_code=404,detail=f"Дані з ID {processed_agent_data_id} не знайдено")
+            updated_record = (await connection.execute(query)).first()
+            tiles = TileAccumulator()
+            tiles.add_rows([existing_record._asdict()], sign=-1)
+            tiles.add_rows([updated_record._asdict()])
+            await apply_tile_deltas(connection, tiles)
         return updated_record
     
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Помилка при оновленні даних: {str(e)}"
         )
-    finally:
-        db.close()
 
 
 @app.delete(
     "/processed_agent_data/{processed_agent_data_id}",response_model=ProcessedAgentDataInDB,)
-def delete_processed_agent_data(processed_agent_data_id: int):
+async def delete_processed_agent_data(processed_agent_data_id: int):
     try:
-        db = SessionLocal()
-        
-        check_query = select(processed_agent_data).where(processed_agent_data.c.id == processed_agent_data_id)
-        record_to_delete = db.execute(check_query).first()
+        query = (
+            processed_agent_data.delete()
+            .where(processed_agent_data.c.id == processed_agent_data_id)
+            .returning(*processed_agent_data.c)
+        )
+        async with engine.begin() as connection:
+            record_to_delete = (await connection.execute(query)).first()
+            if record_to_delete is not None:
+                tiles = TileAccumulator()
+                tiles.add_rows([record_to_delete._asdict()], sign=-1)
+                await apply_tile_deltas(connection, tiles)
         
         if record_to_delete is None:
             raise HTTPException(status_code=404,detail=f"Дані з ID {processed_agent_data_id} не знайдено")
         
-        query = processed_agent_data.delete().where(processed_agent_data.c.id == processed_agent_data_id)
-        db.execute(query)
-        db.commit()
-        
         return record_to_delete
     
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500,detail=f"Помилка при видаленні даних: {str(e)}")
-    finally:
-        db.close()
+
+
+@app.get("/road_quality/tiles")
+async def road_quality_tiles(
+    zoom: int = Query(..., ge=0, le=22),
+    min_latitude: Optional[float] = None,
+    max_latitude: Optional[float] = None,
+    min_longitude: Optional[float] = None,
+    max_longitude: Optional[float] = None,
+):
+    """
+    Road-quality statistics per map tile: row count per road_state, mean |z|
+    and last-seen timestamp. Served from the road_quality_tiles summary, so
+    the cost does not depend on the size of processed_agent_data. Zooms
+    finer than the finest maintained level are answered at that level, which
+    is reported back as zoom.
+    """
+    bbox = (min_latitude, max_latitude, min_longitude, max_longitude)
+    if any(value is None for value in bbox):
+        if any(value is not None for value in bbox):
+            raise HTTPException(status_code=400, detail="Потрібно вказати всі чотири межі області")
+        bbox = None
+    try:
+        query, effective_zoom = tile_query(zoom, bbox)
+        async with engine.connect() as connection:
+            rows = (await connection.execute(query)).fetchall()
+        return {"zoom": effective_zoom, "tiles": merge_tile_rows(effective_zoom, rows)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Помилка при отриманні статистики: {str(e)}")
+
+
+def user_track_query(user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Points of a user's track in time order, for read_user_track."""
+    query = (
+        select(
+            processed_agent_data.c.latitude,
+            processed_agent_data.c.longitude,
+            processed_agent_data.c.road_state,
+            processed_agent_data.c.timestamp,
+        )
+        .where(
+            processed_agent_data.c.user_id == user_id,
+            processed_agent_data.c.latitude.is_not(None),
+            processed_agent_data.c.longitude.is_not(None),
+        )
+        .order_by(processed_agent_data.c.timestamp)
+    )
+    # The same range as ProcessedAgentDataFilters: naive UTC, end exclusive
+    if start is not None:
+        query = query.where(processed_agent_data.c.timestamp >= to_naive_utc(start))
+    if end is not None:
+        query = query.where(processed_agent_data.c.timestamp < to_naive_utc(end))
+    return query
+
+
+@app.get("/users/{user_id}/track")
+async def read_user_track(
+    user_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    tolerance: float = Query(TRACK_TOLERANCE, ge=0),
+    max_points: int = Query(TRACK_DEFAULT_POINTS, ge=2, le=TRACK_MAX_POINTS),
+):
+    """
+    The user's route between start and end, simplified with
+    Ramer-Douglas-Peucker at `tolerance` metres and capped at max_points.
+    Points where road_state changes are kept. coordinates is a list of
+    [latitude, longitude] pairs, ready for MapView's LineMapLayer.
+    """
+    query = user_track_query(user_id, start, end)
+    try:
+        # Rows are simplified batch by batch as they come from the server-side
+        # cursor; only the points kept so far stay in memory
+        simplifier = TrackSimplifier(tolerance, max_points)
+        async with engine.connect() as connection:
+            result = await connection.stream(
+                query.execution_options(yield_per=STREAM_BATCH_SIZE)
+            )
+            async for rows in result.partitions():
+                columns = list(zip(*rows))
+                simplifier.add(
+                    np.array(columns[0], dtype=float), np.array(columns[1], dtype=float), columns[2], columns[3]
+                )
+        if not simplifier.source_points:
+            raise HTTPException(status_code=404, detail=f"Трек користувача {user_id} не знайдено")
+        latitudes, longitudes, road_states, timestamps = simplifier.result()
+        return {
+            "user_id": user_id,
+            "source_points": simplifier.source_points,
+            "coordinates": np.column_stack((latitudes, longitudes)).tolist(),
+            "road_states": road_states,
+            "timestamps": timestamps,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Помилка при отриманні треку: {str(e)}")
+
+
+@app.get("/metrics/pool")
+async def database_pool_metrics():
+    """Connection pool usage of the async engine."""
+    pool = engine.pool
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+
+
+@app.get("/metrics/websocket")
+async def websocket_metrics():
+    """Subscriber count and queued rows, plus rows dropped and frames sent since startup."""
+    return broadcaster.stats()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,219 @@
+from datetime import datetime, timezone
+from typing import Callable, List, Tuple, Union
+
+from sqlalchemy import text
+
+from config import PARTITION_INTERVAL
+from partitions import create_partition, period_start
+
+
+def _partition_legacy_rows(connection):
+    """
+    Create partitions for the current period and every earlier one that holds
+    rows of processed_agent_data_legacy. A stray timestamp costs one partition
+    instead of all the periods up to it; rows from future periods (bad clocks)
+    stay in the default partition until maintenance reaches their period.
+    """
+    current = period_start(datetime.now(timezone.utc).replace(tzinfo=None), PARTITION_INTERVAL)
+    periods = connection.execute(
+        text(
+            """
+            SELECT DISTINCT date_trunc(:interval, timestamp) FROM processed_agent_data_legacy
+            WHERE timestamp < :current
+            """
+        ),
+        {"interval": PARTITION_INTERVAL, "current": current},
+    ).scalars()
+    for period in sorted({*periods, current}):
+        create_partition(connection, period, PARTITION_INTERVAL)
+
+
+# Ordered schema migrations: (version, name, steps). A step is an SQL string or
+# a callable taking the connection. Versions are applied once and recorded in
+# schema_migrations; append new entries, never edit old ones.
+MIGRATIONS: List[Tuple[int, str, List[Union[str, Callable]]]] = [
+    (
+        1,
+        "create processed_agent_data",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS processed_agent_data (
+                id SERIAL PRIMARY KEY,
+                road_state VARCHAR(255) NOT NULL,
+                user_id INTEGER NOT NULL,
+                x FLOAT,
+                y FLOAT,
+                z FLOAT,
+                latitude FLOAT,
+                longitude FLOAT,
+                timestamp TIMESTAMP
+            )
+            """,
+        ],
+    ),
+    (
+        2,
+        "user/time and spatial indexes on processed_agent_data",
+        [
+            # Per-vehicle time-range reads (tracks, user history)
+            """
+            CREATE INDEX IF NOT EXISTS ix_processed_agent_data_user_id_timestamp
+            ON processed_agent_data (user_id, timestamp)
+            """,
+            # Bounding-box reads; queries must use the same point(longitude, latitude)
+            # expression with the <@ box operator to hit this index
+            """
+            CREATE INDEX IF NOT EXISTS ix_processed_agent_data_location
+            ON processed_agent_data USING gist (point(longitude, latitude))
+            """,
+            # Rows arrive roughly in time order, so a tiny BRIN index is enough
+            # for fleet-wide time-range scans
+            """
+            CREATE INDEX IF NOT EXISTS ix_processed_agent_data_timestamp_brin
+            ON processed_agent_data USING brin (timestamp)
+            """,
+        ],
+    ),
+    (
+        3,
+        "road_quality_tiles summary table",
+        [
+            # Per-tile, per-road_state aggregates kept up to date on ingest (tiles.py)
+            """
+            CREATE TABLE IF NOT EXISTS road_quality_tiles (
+                zoom SMALLINT NOT NULL,
+                tile_x INTEGER NOT NULL,
+                tile_y INTEGER NOT NULL,
+                road_state VARCHAR(255) NOT NULL,
+                count BIGINT NOT NULL,
+                sum_abs_z DOUBLE PRECISION NOT NULL,
+                last_seen TIMESTAMP,
+                PRIMARY KEY (zoom, tile_x, tile_y, road_state)
+            )
+            """,
+            # Backfill for tiles.TILE_ZOOM_LEVELS; same projection as tiles.tile_for
+            """
+            INSERT INTO road_quality_tiles (zoom, tile_x, tile_y, road_state, count, sum_abs_z, last_seen)
+            SELECT zoom, tile_x, tile_y, road_state, count(*), sum(abs(coalesce(z, 0))), max(timestamp)
+            FROM (
+                SELECT
+                    levels.zoom, p.road_state, p.z, p.timestamp,
+                    LEAST(GREATEST(
+                        floor((p.longitude + 180) / 360 * (1 << levels.zoom))::int, 0
+                    ), (1 << levels.zoom) - 1) AS tile_x,
+                    LEAST(GREATEST(
+                        floor((1 - asinh(tan(radians(
+                            LEAST(GREATEST(p.latitude, -85.0511287798), 85.0511287798)
+                        ))) / pi()) / 2 * (1 << levels.zoom))::int, 0
+                    ), (1 << levels.zoom) - 1) AS tile_y
+                FROM processed_agent_data p
+                CROSS JOIN unnest(ARRAY[8, 11, 14, 17]) AS levels(zoom)
+                WHERE p.latitude IS NOT NULL AND p.longitude IS NOT NULL
+            ) AS located
+            GROUP BY zoom, tile_x, tile_y, road_state
+            ON CONFLICT DO NOTHING
+            """,
+        ],
+    ),
+    (
+        4,
+        "range-partition processed_agent_data by timestamp",
+        [
+            "ALTER TABLE processed_agent_data RENAME TO processed_agent_data_legacy",
+            # Keep the id sequence alive when the legacy table is dropped
+            "ALTER SEQUENCE processed_agent_data_id_seq OWNED BY NONE",
+            # The partition key must be part of the primary key and NOT NULL
+            """
+            CREATE TABLE processed_agent_data (
+                id INTEGER NOT NULL DEFAULT nextval('processed_agent_data_id_seq'),
+                road_state VARCHAR(255) NOT NULL,
+                user_id INTEGER NOT NULL,
+                x FLOAT,
+                y FLOAT,
+                z FLOAT,
+                latitude FLOAT,
+                longitude FLOAT,
+                timestamp TIMESTAMP NOT NULL,
+                PRIMARY KEY (id, timestamp)
+            ) PARTITION BY RANGE (timestamp)
+            """,
+            # Catches rows outside every created partition, e.g. far-future clocks
+            "CREATE TABLE processed_agent_data_default PARTITION OF processed_agent_data DEFAULT",
+            _partition_legacy_rows,
+            # Rows without a timestamp cannot be partitioned; they end up in the default partition
+            """
+            INSERT INTO processed_agent_data (id, road_state, user_id, x, y, z, latitude, longitude, timestamp)
+            SELECT id, road_state, user_id, x, y, z, latitude, longitude,
+                   coalesce(timestamp, TIMESTAMP '1970-01-01')
+            FROM processed_agent_data_legacy
+            """,
+            "DROP TABLE processed_agent_data_legacy",
+            "ALTER SEQUENCE processed_agent_data_id_seq OWNED BY processed_agent_data.id",
+            # Same indexes as migration 2, now created on every partition
+            """
+            CREATE INDEX ix_processed_agent_data_user_id_timestamp
+            ON processed_agent_data (user_id, timestamp)
+            """,
+            """
+            CREATE INDEX ix_processed_agent_data_location
+            ON processed_agent_data USING gist (point(longitude, latitude))
+            """,
+            """
+            CREATE INDEX ix_processed_agent_data_timestamp_brin
+            ON processed_agent_data USING brin (timestamp)
+            """,
+        ],
+    ),
+    (
+        5,
+        "idempotency_key on processed_agent_data",
+        [
+            "ALTER TABLE processed_agent_data ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64)",
+            # Unique indexes on a partitioned table must include the partition key.
+            # Rows without a key (NULL) never conflict.
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS ux_processed_agent_data_idempotency_key
+            ON processed_agent_data (idempotency_key, timestamp)
+            """,
+        ],
+    ),
+]
+
+# Arbitrary constant so concurrently starting workers migrate one at a time
+MIGRATION_LOCK_ID = 7_402_113
+
+
+def apply_migrations(connection) -> List[int]:
+    """
+    Apply all pending migrations on the given connection inside its
+    transaction and return the versions that were applied.
+    """
+    connection.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+    connection.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT now()
+            )
+            """
+        )
+    )
+    applied = set(connection.execute(text("SELECT version FROM schema_migrations")).scalars())
+    newly_applied = []
+    for version, name, statements in MIGRATIONS:
+        if version in applied:
+            continue
+        print(f"Applying migration {version}: {name}")
+        for statement in statements:
+            if callable(statement):
+                statement(connection)
+            else:
+                connection.execute(text(statement))
+        connection.execute(
+            text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+            {"version": version, "name": name},
+        )
+        newly_applied.append(version)
+    return newly_applied
@@ -0,0 +1,154 @@
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+
+from tiles import tile_aggregate_sql
+
+PARENT_TABLE = "processed_agent_data"
+DEFAULT_PARTITION = "processed_agent_data_default"
+PARTITION_INTERVALS = ("day", "week", "month")
+# Arbitrary constant so only one worker maintains partitions at a time
+MAINTENANCE_LOCK_ID = 7_402_114
+
+_BOUND_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def period_start(moment: datetime, interval: str) -> datetime:
+    """Start of the partition period containing `moment`."""
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "day":
+        return day
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown partition interval: {interval}")
+
+
+def next_period(start: datetime, interval: str) -> datetime:
+    if interval == "day":
+        return start + timedelta(days=1)
+    if interval == "week":
+        return start + timedelta(weeks=1)
+    if interval == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    raise ValueError(f"Unknown partition interval: {interval}")
+
+
+def partition_name(start: datetime, interval: str) -> str:
+    if interval == "month":
+        return f"{PARENT_TABLE}_p{start:%Y_%m}"
+    return f"{PARENT_TABLE}_p{start:%Y_%m_%d}"
+
+
+def list_partitions(connection) -> List[Tuple[str, datetime, datetime]]:
+    """(name, from, to) of every range partition, oldest first; the default partition is skipped."""
+    rows = connection.execute(
+        text(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = CAST(:parent AS regclass)
+            """
+        ),
+        {"parent": PARENT_TABLE},
+    ).fetchall()
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_PATTERN.search(bound or "")
+        if match:
+            partitions.append(
+                (name, datetime.fromisoformat(match.group(1)), datetime.fromisoformat(match.group(2)))
+            )
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(connection, start: datetime, interval: str) -> Optional[str]:
+    """
+    Create the partition for the period starting at `start` unless one exists.
+    Rows that already landed in the default partition for that period are
+    moved into the new partition before it is attached.
+    """
+    end = next_period(start, interval)
+    if any(p_start < end and start < p_end for _, p_start, p_end in list_partitions(connection)):
+        return None
+    name = partition_name(start, interval)
+    bounds = {"start": start, "end": end}
+    connection.execute(
+        text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    )
+    connection.execute(
+        text(
+            f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE timestamp >= :start AND timestamp < :end
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """
+        ),
+        bounds,
+    )
+    connection.execute(
+        text(
+            f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+        )
+    )
+    return name
+
+
+def ensure_partitions(connection, start: datetime, end: datetime, interval: str) -> List[str]:
+    """Make sure every period overlapping [start, end] has its own partition."""
+    created = []
+    period = period_start(start, interval)
+    while period <= end:
+        name = create_partition(connection, period, interval)
+        if name:
+            created.append(name)
+        period = next_period(period, interval)
+    return created
+
+
+def drop_expired_partitions(connection, older_than: datetime) -> List[str]:
+    """
+    Drop every partition whose whole range ends at or before `older_than`.
+    Their rows are subtracted from road_quality_tiles first so the summary
+    keeps matching the raw table.
+    """
+    dropped = []
+    for name, _, end in list_partitions(connection):
+        if end > older_than:
+            continue
+        connection.execute(text(tile_aggregate_sql(name, sign=-1)))
+        connection.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    return dropped
+
+
+def maintain_partitions(connection, interval: str, ahead: int, retention_days: int,
+                        now: Optional[datetime] = None) -> Tuple[List[str], List[str]]:
+    """
+    One maintenance pass: create partitions for the current and the next
+    `ahead` periods and drop the ones past retention (0 keeps everything).
+    Returns (created, dropped). Skipped if another worker holds the lock.
+    """
+    locked = connection.execute(
+        text("SELECT pg_try_advisory_xact_lock(:lock_id)"), {"lock_id": MAINTENANCE_LOCK_ID}
+    ).scalar()
+    if not locked:
+        return [], []
+    # Timestamps are stored as naive UTC, so the server's local time zone must not shift periods
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    last = period_start(now, interval)
+    for _ in range(ahead):
+        last = next_period(last, interval)
+    created = ensure_partitions(connection, now, last, interval)
+    dropped = []
+    if retention_days:
+        dropped = drop_expired_partitions(connection, now - timedelta(days=retention_days))
+    return created, dropped
@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+
+from pydantic import ValidationError
+
+from broadcast import DROP_NEWEST, Broadcaster, Subscriber, SubscriptionMessage
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, frame):
+        self.frames.append(frame)
+
+    async def close(self, code=1000):
+        pass
+
+
+def row(user_id):
+    return {"road_state": "good", "user_id": user_id, "latitude": 50.0, "longitude": 30.0}
+
+
+class TestBroadcasterStats(unittest.IsolatedAsyncioTestCase):
+    async def test_totals_outlive_subscribers(self):
+        broadcaster = Broadcaster(queue_size=1, overflow_policy=DROP_NEWEST, send_timeout=1.0, max_fps=10.0)
+        websocket = FakeWebSocket()
+        subscriber = broadcaster.subscribe(websocket)
+        # The backlog holds one row, so the second is dropped before the sender runs
+        broadcaster.publish([row(1), row(2)])
+        await asyncio.sleep(0.01)
+        self.assertEqual(len(websocket.frames), 1)
+
+        broadcaster.unsubscribe(subscriber)
+        # A second unsubscribe (e.g. after a drop) must not count it twice
+        broadcaster.unsubscribe(subscriber)
+
+        self.assertEqual(
+            broadcaster.stats(),
+            {"subscribers": 0, "queued_rows": 0, "sent_frames": 1, "dropped_rows": 1},
+        )
+
+
+class TestSubscriptionBbox(unittest.TestCase):
+    def test_named_bounds_filter_rows(self):
+        message = SubscriptionMessage(min_latitude=50.0, max_latitude=51.0, min_longitude=30.0, max_longitude=32.0)
+        subscriber = Subscriber(FakeWebSocket(), backlog_size=1)
+        subscriber.configure(message, max_fps_limit=10.0)
+
+        self.assertTrue(subscriber.matches({"road_state": "good", "latitude": 50.5, "longitude": 31.5}))
+        # Inside if latitude and longitude were swapped
+        self.assertFalse(subscriber.matches({"road_state": "good", "latitude": 31.5, "longitude": 50.5}))
+        self.assertEqual(subscriber.describe()["max_longitude"], 32.0)
+
+    def test_partial_bounds_are_rejected(self):
+        with self.assertRaises(ValidationError):
+            SubscriptionMessage(min_latitude=50.0, max_latitude=51.0)
@@ -0,0 +1,113 @@
+import json
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, text
+
+from main import engine, processed_agent_data, within_bbox
+from migrations import apply_migrations
+from partitions import ensure_partitions
+
+
+async def explain(connection, query):
+    """All nodes of the EXPLAIN plan of a query."""
+    compiled = query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+    plan = (await connection.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes, pending = [], [plan[0]["Plan"]]
+    while pending:
+        node = pending.pop()
+        nodes.append(node)
+        pending.extend(node.get("Plans", []))
+    return nodes
+
+
+async def plan_index_names(connection, query):
+    """
+    Names of all indexes used by the plan. Partitions use their own copies of
+    the partitioned indexes, so those are reported under the parent's name.
+    """
+    names = set()
+    for node in await explain(connection, query):
+        if "Index Name" in node:
+            names.add(node["Index Name"])
+            parent = (await connection.execute(
+                text(
+                    """
+                    SELECT parent.relname FROM pg_inherits
+                    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                    WHERE child.relname = :name
+                    """
+                ),
+                {"name": node["Index Name"]},
+            )).scalar()
+            if parent:
+                names.add(parent)
+    return names
+
+
+class TestProcessedAgentDataIndexes(unittest.IsolatedAsyncioTestCase):
+    """
+    Needs the PostgreSQL database from config.py. Everything runs inside one
+    transaction that is rolled back, so existing data is left untouched.
+    """
+
+    async def asyncSetUp(self):
+        try:
+            self.connection = await engine.connect()
+        except OSError as e:
+            self.skipTest(f"PostgreSQL is not available: {e}")
+        self.transaction = await self.connection.begin()
+        await self.connection.run_sync(apply_migrations)
+        start = datetime(2024, 1, 1)
+        await self.connection.run_sync(ensure_partitions, start, datetime(2024, 2, 1), "month")
+        # A 100 x 100 grid of points per user over ~1 degree, so a small bbox
+        # or a single user's time window is a tiny fraction of the table
+        rows = [
+            {
+                "road_state": "good", "user_id": 900_000 + user, "x": 0.0, "y": 0.0, "z": 0.0,
+                "latitude": 50.0 + (i // 100) * 0.01, "longitude": 30.0 + (i % 100) * 0.01,
+                "timestamp": start + timedelta(seconds=i),
+            }
+            for user in range(3)
+            for i in range(10_000)
+        ]
+        await self.connection.execute(processed_agent_data.insert(), rows)
+        await self.connection.execute(text("ANALYZE processed_agent_data"))
+
+    async def asyncTearDown(self):
+        await self.transaction.rollback()
+        await self.connection.close()
+        await engine.dispose()
+
+    async def test_bbox_query_uses_spatial_index(self):
+        query = select(processed_agent_data).where(within_bbox(50.1, 50.12, 30.1, 30.12))
+        self.assertIn("ix_processed_agent_data_location", await plan_index_names(self.connection, query))
+
+    async def test_user_time_range_query_uses_composite_index(self):
+        query = select(processed_agent_data).where(
+            processed_agent_data.c.user_id == 900_001,
+            processed_agent_data.c.timestamp >= datetime(2024, 1, 1, 1),
+            processed_agent_data.c.timestamp < datetime(2024, 1, 1, 1, 5),
+        )
+        self.assertIn(
+            "ix_processed_agent_data_user_id_timestamp",
+            await plan_index_names(self.connection, query),
+        )
+
+    async def test_time_range_query_prunes_partitions(self):
+        query = select(processed_agent_data).where(
+            processed_agent_data.c.timestamp >= datetime(2024, 1, 1, 1),
+            processed_agent_data.c.timestamp < datetime(2024, 1, 1, 2),
+        )
+        scanned = {
+            node["Relation Name"] for node in await explain(self.connection, query)
+            if "Relation Name" in node
+        }
+        self.assertEqual(scanned, {"processed_agent_data_p2024_01"})
+
+
+if __name__ == "__main__":
+    unittest.main()
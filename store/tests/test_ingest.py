@@ -0,0 +1,72 @@
+import unittest
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from ingest import CopyBuffer, copy_chunk, parse_ndjson_line
+from main import app, engine, processed_agent_data
+from migrations import apply_migrations
+from partitions import ensure_partitions
+from tiles import apply_tile_deltas
+
+
+class TestCopyIngest(unittest.IsolatedAsyncioTestCase):
+    """
+    Needs the PostgreSQL database from config.py. Everything runs inside one
+    transaction that is rolled back, so existing data is left untouched.
+    """
+
+    async def asyncSetUp(self):
+        try:
+            self.connection = await engine.connect()
+        except OSError as e:
+            self.skipTest(f"PostgreSQL is not available: {e}")
+        self.transaction = await self.connection.begin()
+        await self.connection.run_sync(apply_migrations)
+        await self.connection.run_sync(ensure_partitions, datetime(2024, 1, 1), datetime(2024, 2, 1), "month")
+
+    async def asyncTearDown(self):
+        await self.transaction.rollback()
+        await self.connection.close()
+        await engine.dispose()
+
+    async def copy(self, *lines):
+        """COPY the NDJSON lines as the upload endpoint does; their stored timestamps."""
+        chunk = CopyBuffer()
+        for line in lines:
+            chunk.add(parse_ndjson_line(line))
+        data, _, tiles = chunk.take()
+        await apply_tile_deltas(self.connection, tiles)
+        driver_connection = (await self.connection.get_raw_connection()).driver_connection
+        await copy_chunk(driver_connection, data)
+        query = select(processed_agent_data.c.timestamp).where(processed_agent_data.c.user_id == 900_100)
+        return (await self.connection.execute(query.order_by(processed_agent_data.c.id))).scalars().all()
+
+    async def test_timestamps_with_offset_are_stored_in_utc(self):
+        line = (
+            '{"road_state": "good", "user_id": 900100, "x": 0, "y": 0, "z": 0,'
+            ' "latitude": 50.45, "longitude": 30.52, "timestamp": "2024-01-10T12:00:00+02:00"}'
+        )
+        self.assertEqual(await self.copy(line), [datetime(2024, 1, 10, 10, 0)])
+
+    async def test_z_suffixed_timestamps_mixed_with_naive_ones(self):
+        lines = [
+            '{"road_state": "poor", "user_id": 900100, "x": 0, "y": 0, "z": 1,'
+            ' "latitude": 50.45, "longitude": 30.52, "timestamp": "2024-01-10T12:00:00Z"}',
+            '{"road_state": "good", "user_id": 900100, "x": 0, "y": 0, "z": 0,'
+            ' "latitude": 50.45, "longitude": 30.52, "timestamp": "2024-01-10T11:00:00"}',
+        ]
+        self.assertEqual(await self.copy(*lines), [datetime(2024, 1, 10, 12, 0), datetime(2024, 1, 10, 11, 0)])
+
+
+class TestCopyUploadRejects(unittest.TestCase):
+    def test_invalid_utf8_rejects_only_its_line(self):
+        # Every line is rejected, so nothing reaches the database
+        body = b'{"road_state": "good\xff"}\n\n{"road_state": "good"}\n'
+        response = TestClient(app).post("/processed_agent_data/copy", content=body)
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report["accepted"], report["rejected"]), (0, 2))
+        self.assertEqual([error["line"] for error in report["errors"]], [1, 3])
+        self.assertIn("utf-8", report["errors"][0]["error"])
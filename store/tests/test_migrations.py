@@ -0,0 +1,53 @@
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from sqlalchemy import text
+
+import migrations
+from main import engine
+from migrations import apply_migrations
+from partitions import list_partitions
+
+
+class TestPartitionLegacyRows(unittest.IsolatedAsyncioTestCase):
+    """
+    Needs the PostgreSQL database from config.py. Everything runs inside one
+    transaction that is rolled back, so existing data is left untouched.
+    """
+
+    async def asyncSetUp(self):
+        try:
+            self.connection = await engine.connect()
+        except OSError as e:
+            self.skipTest(f"PostgreSQL is not available: {e}")
+        self.transaction = await self.connection.begin()
+        await self.connection.run_sync(apply_migrations)
+        await self.connection.execute(text("CREATE TABLE processed_agent_data_legacy (timestamp TIMESTAMP)"))
+        await self.connection.execute(
+            text("INSERT INTO processed_agent_data_legacy VALUES (:timestamp)"),
+            [
+                {"timestamp": datetime(2021, 3, 5)},
+                {"timestamp": datetime(2021, 3, 20)},
+                {"timestamp": datetime(2021, 7, 1)},
+                {"timestamp": None},
+                {"timestamp": datetime(2999, 1, 1)},
+            ],
+        )
+
+    async def asyncTearDown(self):
+        await self.transaction.rollback()
+        await self.connection.close()
+        await engine.dispose()
+
+    async def test_only_periods_with_rows_get_partitions(self):
+        with mock.patch.object(migrations, "PARTITION_INTERVAL", "month"):
+            await self.connection.run_sync(migrations._partition_legacy_rows)
+        names = [name for name, _, _ in await self.connection.run_sync(list_partitions)]
+
+        self.assertIn("processed_agent_data_p2021_03", names)
+        self.assertIn("processed_agent_data_p2021_07", names)
+        for month in range(4, 7):
+            self.assertNotIn(f"processed_agent_data_p2021_{month:02}", names)
+        # A far-future timestamp is left to the default partition
+        self.assertFalse([name for name in names if name.startswith("processed_agent_data_p2999")])
@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+
+from track import TrackSimplifier, simplify_track
+
+
+def zigzag(count: int):
+    """A track of count points turning every 50 points, road_state changing every 300."""
+    headings = np.repeat(np.tile([0.0, np.pi / 2], count // 100 + 1), 50)[:count]
+    latitudes = 50.0 + np.cumsum(np.cos(headings)) * 1e-4
+    longitudes = 30.0 + np.cumsum(np.sin(headings)) * 1e-4
+    road_states = ["good" if index // 300 % 2 == 0 else "poor" for index in range(count)]
+    return latitudes, longitudes, road_states, list(range(count))
+
+
+class TestTrackSimplifier(unittest.TestCase):
+    def simplify(self, track, chunk: int, max_points: int) -> TrackSimplifier:
+        simplifier = TrackSimplifier(tolerance=1.0, max_points=max_points)
+        for start in range(0, len(track[0]), chunk):
+            simplifier.add(*(column[start:start + chunk] for column in track))
+            # Only the kept points are carried between chunks
+            self.assertLessEqual(len(simplifier.road_states), 4 * max_points)
+        return simplifier
+
+    def test_chunks_give_the_same_points_as_the_whole_track(self):
+        track = zigzag(2000)
+        latitudes, longitudes, road_states, timestamps = self.simplify(track, chunk=128, max_points=1000).result()
+        kept = simplify_track(track[0], track[1], track[2], 1.0, 1000)
+        self.assertEqual(timestamps, kept.tolist())
+        self.assertEqual(road_states, [track[2][index] for index in kept])
+        np.testing.assert_array_equal(latitudes, track[0][kept])
+
+    def test_memory_stays_bounded_and_transitions_are_kept(self):
+        track = zigzag(20000)
+        simplifier = self.simplify(track, chunk=500, max_points=100)
+        _, _, road_states, timestamps = simplifier.result()
+        self.assertEqual(simplifier.source_points, 20000)
+        self.assertLessEqual(len(timestamps), 100)
+        self.assertEqual(timestamps[0], 0)
+        self.assertEqual(timestamps[-1], 19999)
+        # Within budget, transitions outrank every other point
+        simplifier = self.simplify(zigzag(6000), chunk=500, max_points=100)
+        _, _, _, timestamps = simplifier.result()
+        self.assertTrue(set(range(300, 6000, 300)).issubset(timestamps))
@@ -0,0 +1,191 @@
+import math
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    MetaData,
+    SmallInteger,
+    String,
+    Table,
+    func,
+    select,
+)
+from sqlalchemy.dialects.postgresql import insert
+
+# Zoom levels (slippy map tiles, as used by MapView) kept in road_quality_tiles.
+# Requests for other zooms are rolled up from the nearest finer level.
+# Changing this list needs a migration that rebuilds road_quality_tiles.
+TILE_ZOOM_LEVELS = (8, 11, 14, 17)
+MAX_LATITUDE = 85.0511287798
+
+metadata = MetaData()
+road_quality_tiles = Table(
+    "road_quality_tiles",
+    metadata,
+    Column("zoom", SmallInteger, primary_key=True),
+    Column("tile_x", Integer, primary_key=True),
+    Column("tile_y", Integer, primary_key=True),
+    Column("road_state", String, primary_key=True),
+    Column("count", BigInteger),
+    Column("sum_abs_z", Float),
+    Column("last_seen", DateTime),
+)
+
+
+def tile_for(latitude: float, longitude: float, zoom: int) -> Tuple[int, int]:
+    """Web Mercator tile (x, y) containing the point at the given zoom."""
+    n = 1 << zoom
+    latitude = max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))
+    x = int((longitude + 180.0) / 360.0 * n)
+    lat_rad = math.radians(latitude)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+class TileAccumulator:
+    """Collects per-tile count, sum |z| and last-seen deltas for a batch of rows."""
+
+    def __init__(self):
+        self._deltas: Dict[Tuple[int, int, int, str], List] = {}
+
+    def add(self, road_state: str, z: float, latitude: float, longitude: float,
+            timestamp: Optional[datetime], sign: int = 1):
+        if latitude is None or longitude is None:
+            return
+        for zoom in TILE_ZOOM_LEVELS:
+            tile_x, tile_y = tile_for(latitude, longitude, zoom)
+            delta = self._deltas.setdefault((zoom, tile_x, tile_y, road_state), [0, 0.0, None])
+            delta[0] += sign
+            delta[1] += sign * abs(z or 0.0)
+            if sign > 0 and timestamp is not None and (delta[2] is None or timestamp > delta[2]):
+                delta[2] = timestamp
+
+    def add_rows(self, rows: Iterable[Dict[str, Any]], sign: int = 1):
+        for row in rows:
+            self.add(row["road_state"], row["z"], row["latitude"], row["longitude"], row["timestamp"], sign)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        # Sorted so concurrent batches lock tile rows in the same order
+        return [
+            {
+                "zoom": zoom, "tile_x": tile_x, "tile_y": tile_y, "road_state": road_state,
+                "count": count, "sum_abs_z": sum_abs_z, "last_seen": last_seen,
+            }
+            for (zoom, tile_x, tile_y, road_state), (count, sum_abs_z, last_seen)
+            in sorted(self._deltas.items())
+        ]
+
+
+async def apply_tile_deltas(connection, accumulator: TileAccumulator):
+    """Upsert the accumulated deltas into road_quality_tiles on the caller's transaction."""
+    rows = accumulator.rows()
+    if not rows:
+        return
+    query = insert(road_quality_tiles)
+    query = query.on_conflict_do_update(
+        index_elements=["zoom", "tile_x", "tile_y", "road_state"],
+        set_={
+            "count": road_quality_tiles.c.count + query.excluded.count,
+            "sum_abs_z": road_quality_tiles.c.sum_abs_z + query.excluded.sum_abs_z,
+            "last_seen": func.greatest(road_quality_tiles.c.last_seen, query.excluded.last_seen),
+        },
+    )
+    await connection.execute(query, rows)
+
+
+def tile_aggregate_sql(source_table: str, sign: int = 1) -> str:
+    """
+    INSERT ... SELECT that adds (sign=1) or subtracts (sign=-1) all rows of
+    source_table to road_quality_tiles, using the same projection as tile_for.
+    Used to keep the summary right when whole partitions are dropped.
+    """
+    levels = ", ".join(str(level) for level in TILE_ZOOM_LEVELS)
+    last_seen = "max(timestamp)" if sign > 0 else "NULL::timestamp"
+    return f"""
+        INSERT INTO road_quality_tiles AS tiles (zoom, tile_x, tile_y, road_state, count, sum_abs_z, last_seen)
+        SELECT zoom, tile_x, tile_y, road_state,
+               {sign} * count(*), {sign} * sum(abs(coalesce(z, 0))), {last_seen}
+        FROM (
+            SELECT
+                levels.zoom, p.road_state, p.z, p.timestamp,
+                LEAST(GREATEST(
+                    floor((p.longitude + 180) / 360 * (1 << levels.zoom))::int, 0
+                ), (1 << levels.zoom) - 1) AS tile_x,
+                LEAST(GREATEST(
+                    floor((1 - asinh(tan(radians(
+                        LEAST(GREATEST(p.latitude, -{MAX_LATITUDE}), {MAX_LATITUDE})
+                    ))) / pi()) / 2 * (1 << levels.zoom))::int, 0
+                ), (1 << levels.zoom) - 1) AS tile_y
+            FROM {source_table} p
+            CROSS JOIN unnest(ARRAY[{levels}]) AS levels(zoom)
+            WHERE p.latitude IS NOT NULL AND p.longitude IS NOT NULL
+        ) AS located
+        GROUP BY zoom, tile_x, tile_y, road_state
+        ON CONFLICT (zoom, tile_x, tile_y, road_state) DO UPDATE SET
+            count = tiles.count + excluded.count,
+            sum_abs_z = tiles.sum_abs_z + excluded.sum_abs_z,
+            last_seen = GREATEST(tiles.last_seen, excluded.last_seen)
+    """
+
+
+def source_zoom(zoom: int) -> int:
+    """The maintained zoom level a request for `zoom` is answered from."""
+    finer = [level for level in TILE_ZOOM_LEVELS if level >= zoom]
+    return min(finer) if finer else max(TILE_ZOOM_LEVELS)
+
+
+def tile_query(zoom: int, bbox: Optional[Tuple[float, float, float, float]] = None):
+    """
+    Per-tile, per-road_state aggregates at `zoom`, rolled up from the nearest
+    maintained level by shifting tile coordinates. bbox is
+    (min_latitude, max_latitude, min_longitude, max_longitude).
+    """
+    level = source_zoom(zoom)
+    shift = max(level - zoom, 0)
+    tile_x = road_quality_tiles.c.tile_x.op(">>")(shift)
+    tile_y = road_quality_tiles.c.tile_y.op(">>")(shift)
+    query = select(
+        tile_x.label("tile_x"),
+        tile_y.label("tile_y"),
+        road_quality_tiles.c.road_state,
+        func.sum(road_quality_tiles.c.count).cast(BigInteger).label("count"),
+        func.sum(road_quality_tiles.c.sum_abs_z).label("sum_abs_z"),
+        func.max(road_quality_tiles.c.last_seen).label("last_seen"),
+    ).where(road_quality_tiles.c.zoom == level, road_quality_tiles.c.count > 0)
+    if bbox is not None:
+        min_latitude, max_latitude, min_longitude, max_longitude = bbox
+        # Tile y grows southwards
+        min_x, min_y = tile_for(max_latitude, min_longitude, level)
+        max_x, max_y = tile_for(min_latitude, max_longitude, level)
+        query = query.where(
+            road_quality_tiles.c.tile_x.between(min_x, max_x),
+            road_quality_tiles.c.tile_y.between(min_y, max_y),
+        )
+    return query.group_by(tile_x, tile_y, road_quality_tiles.c.road_state), min(zoom, level)
+
+
+def merge_tile_rows(zoom: int, rows) -> List[Dict[str, Any]]:
+    """Fold per-road_state rows into one entry per tile."""
+    tiles: Dict[Tuple[int, int], Dict[str, Any]] = {}
+    for row in rows:
+        tile = tiles.setdefault(
+            (row.tile_x, row.tile_y),
+            {"zoom": zoom, "tile_x": row.tile_x, "tile_y": row.tile_y,
+             "counts": {}, "count": 0, "sum_abs_z": 0.0, "last_seen": None},
+        )
+        tile["counts"][row.road_state] = row.count
+        tile["count"] += row.count
+        tile["sum_abs_z"] += row.sum_abs_z
+        if row.last_seen is not None and (tile["last_seen"] is None or row.last_seen > tile["last_seen"]):
+            tile["last_seen"] = row.last_seen
+    result = []
+    for tile in tiles.values():
+        sum_abs_z = tile.pop("sum_abs_z")
+        tile["mean_abs_z"] = sum_abs_z / tile["count"] if tile["count"] else None
+        result.append(tile)
+    return result
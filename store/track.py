@@ -0,0 +1,126 @@
+import math
+from typing import List, Sequence
+
+import numpy as np
+
+# Metres per degree of latitude; longitude degrees are scaled by cos(latitude)
+METERS_PER_DEGREE = 111_320.0
+
+
+def project(latitudes: np.ndarray, longitudes: np.ndarray):
+    """Equirectangular projection to metres around the track's mean latitude."""
+    scale = math.cos(math.radians(float(np.mean(latitudes))))
+    return longitudes * METERS_PER_DEGREE * scale, latitudes * METERS_PER_DEGREE
+
+
+def significance(xs: np.ndarray, ys: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Ramer–Douglas–Peucker over the whole track. Returns, for every point, the
+    distance at which RDP split on it (inf for the endpoints, 0 for points
+    dropped at `tolerance`). Keeping the points with significance > tolerance
+    is plain RDP; keeping the N most significant ones fits a point budget.
+    Distances for each segment are computed in one vectorized pass.
+    """
+    count = len(xs)
+    result = np.zeros(count)
+    if count == 0:
+        return result
+    result[0] = result[-1] = np.inf
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = xs[last] - xs[first], ys[last] - ys[first]
+        px, py = xs[first + 1:last] - xs[first], ys[first + 1:last] - ys[first]
+        length = math.hypot(dx, dy)
+        if length == 0.0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(dx * py - dy * px) / length
+        index = int(np.argmax(distances))
+        distance = float(distances[index])
+        if distance <= tolerance:
+            continue
+        split = first + 1 + index
+        result[split] = distance
+        stack.append((first, split))
+        stack.append((split, last))
+    return result
+
+
+def simplify_track(latitudes: np.ndarray, longitudes: np.ndarray, road_states: Sequence[str],
+                   tolerance: float, max_points: int) -> np.ndarray:
+    """
+    Indices of the points to keep, in track order: RDP at `tolerance` metres,
+    always keeping road_state changes, then trimmed to the `max_points` most
+    significant points.
+    """
+    if len(latitudes) <= 2:
+        return np.arange(len(latitudes))
+    xs, ys = project(latitudes, longitudes)
+    scores = significance(xs, ys, tolerance)
+    states = np.asarray(road_states)
+    transitions = np.flatnonzero(states[1:] != states[:-1]) + 1
+    # Transitions rank below the endpoints but above any RDP split
+    scores[transitions] = np.maximum(scores[transitions], np.finfo(float).max)
+    kept = np.flatnonzero(scores > tolerance)
+    if len(kept) > max_points:
+        kept = np.sort(kept[np.argsort(-scores[kept], kind="stable")[:max_points]])
+    return kept
+
+
+class TrackSimplifier:
+    """
+    simplify_track over a track that arrives in chunks, in bounded memory.
+    Each chunk is simplified on its own, starting from the last kept point
+    (a chunk's last point is always kept), and only the kept points are
+    carried over. When more than 4 * max_points pile up they are simplified
+    down to 2 * max_points; the final result simplifies them once more.
+    """
+
+    def __init__(self, tolerance: float, max_points: int):
+        self.tolerance = tolerance
+        self.max_points = max_points
+        self.source_points = 0
+        self.latitudes = np.empty(0)
+        self.longitudes = np.empty(0)
+        self.road_states: List[str] = []
+        self.timestamps: List = []
+
+    def add(self, latitudes: np.ndarray, longitudes: np.ndarray, road_states: Sequence[str], timestamps: Sequence):
+        self.source_points += len(latitudes)
+        # The previous chunk's last point continues the track
+        start = max(len(self.road_states) - 1, 0)
+        anchor = len(self.road_states) - start
+        latitudes = np.concatenate((self.latitudes[start:], latitudes))
+        longitudes = np.concatenate((self.longitudes[start:], longitudes))
+        road_states = self.road_states[start:] + list(road_states)
+        timestamps = self.timestamps[start:] + list(timestamps)
+        kept = simplify_track(latitudes, longitudes, road_states, self.tolerance, len(latitudes))[anchor:]
+        self._keep(
+            np.concatenate((self.latitudes, latitudes[kept])),
+            np.concatenate((self.longitudes, longitudes[kept])),
+            self.road_states + [road_states[index] for index in kept],
+            self.timestamps + [timestamps[index] for index in kept],
+        )
+        if len(self.road_states) > 4 * self.max_points:
+            self._simplify(2 * self.max_points)
+
+    def result(self):
+        """Latitudes, longitudes, road states and timestamps of the kept points."""
+        self._simplify(self.max_points)
+        return self.latitudes, self.longitudes, self.road_states, self.timestamps
+
+    def _simplify(self, max_points: int):
+        kept = simplify_track(self.latitudes, self.longitudes, self.road_states, self.tolerance, max_points)
+        self._keep(
+            self.latitudes[kept],
+            self.longitudes[kept],
+            [self.road_states[index] for index in kept],
+            [self.timestamps[index] for index in kept],
+        )
+
+    def _keep(self, latitudes, longitudes, road_states, timestamps):
+        self.latitudes, self.longitudes = latitudes, longitudes
+        self.road_states, self.timestamps = road_states, timestamps
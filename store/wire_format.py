@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Any, Dict, List
+
+import msgpack
+
+# Wire formats for processed agent data. JSON stays the default; MessagePack
+# uses the compact positional schema shared with the agent, edge and hub:
+#   [road_state, user_id, x, y, z, latitude, longitude, timestamp(, idempotency_key)]
+# with the timestamp as a MessagePack Timestamp (naive values are UTC).
+JSON = "json"
+MSGPACK = "msgpack"
+CONTENT_TYPES = {JSON: "application/json", MSGPACK: "application/msgpack"}
+
+
+def wire_format_for(content_type: str) -> str:
+    """Wire format named by a Content-Type header; JSON if none or unknown."""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack"):
+        return MSGPACK
+    return JSON
+
+
+def unpack_timestamp(value) -> datetime:
+    if isinstance(value, msgpack.Timestamp):
+        return value.to_datetime().replace(tzinfo=None)
+    return value
+
+
+def processed_agent_data_from_msgpack(values: List[Any]) -> Dict[str, Any]:
+    """Positional MessagePack record -> the nested shape of ProcessedAgentData."""
+    if not isinstance(values, (list, tuple)) or len(values) not in (8, 9):
+        raise ValueError("Expected an array of 8 or 9 values")
+    road_state, user_id, x, y, z, latitude, longitude, timestamp = values[:8]
+    return {
+        "road_state": road_state,
+        "agent_data": {
+            "user_id": user_id,
+            "accelerometer": {"x": x, "y": y, "z": z},
+            "gps": {"latitude": latitude, "longitude": longitude},
+            "timestamp": unpack_timestamp(timestamp),
+        },
+        "idempotency_key": values[8] if len(values) == 9 else None,
+    }
+
+
+def decode_batch(body: bytes) -> List[Dict[str, Any]]:
+    """A MessagePack array of positional records as ProcessedAgentData dicts."""
+    records = msgpack.unpackb(body, timestamp=0, use_list=True)
+    if not isinstance(records, list):
+        raise ValueError("Expected an array of records")
+    return [processed_agent_data_from_msgpack(record) for record in records]
+